@@ -0,0 +1,339 @@
+import argparse
+import contextlib
+import time
+from concurrent.futures import Future
+import numpy
+from candles import HistoryWindow, as_rows
+from indicators.base import IndicatorsHandler
+from order_pipeline import ORDER_METHODS
+from strategies.base import default_params
+
+
+# история прогоняется кусками: строки куска один раз переводятся в списки float
+CHUNK = 4096
+
+TRADE = numpy.dtype([
+    ("bar", "<i8"),
+    ("timestamp", "<i8"),
+    ("side", "i1"),
+    ("price", "<f8"),
+    ("amount", "<f8"),
+    ("fee", "<f8"),
+    ("position", "<f8"),
+    ("cash", "<f8"),
+])
+
+
+class _NullWriter:
+
+    def write(self, s):
+        pass
+
+    def flush(self):
+        pass
+
+
+class SimulatedExchange:
+    """
+    Биржа для бэктеста с тем же интерфейсом ордеров, что у коннектора Bitmex.
+
+    Рыночный ордер исполняется сразу по цене закрытия текущей свечи, сдвинутой
+    на slippage в худшую сторону, с комиссией fee от объёма. Ордер ставится
+    после закрытия свечи, поэтому её диапазон для лимитного ордера уже в
+    прошлом: ордер лучше цены закрытия (покупка не ниже, продажа не выше)
+    исполняется сразу по цене закрытия, остальные ждут следующих свечей.
+    Открытый лимитный ордер исполняется на первой свече, которая до него дошла,
+    по своей цене или по цене открытия, если свеча открылась уже за ним
+    (гэп), или снимается cancel_order/cancel_orders/cancel_all. Все ордера
+    хранятся в orders по id, у исполненных и снятых меняется только статус.
+    """
+
+    def __init__(self, initial_cash=10000.0, fee=0.00075, slippage=0.0):
+        self.initial_cash = initial_cash
+        self.fee = fee
+        self.slippage = slippage
+        self.cash = initial_cash
+        self.position = 0.0
+        self._trades = numpy.zeros(64, dtype=TRADE)
+        self._n_trades = 0
+        self._call_handlers = []
+        # все ордера по id и открытые из них
+        self.orders = {}
+        self._open = {}
+        self._next_id = 0
+        # текущая свеча [timestamp, open, high, low, close, volume] и её номер, выставляет Backtest
+        self._bar = None
+        self._bar_index = -1
+
+    def register_call_handler(self, handler):
+        self._call_handlers.append(handler)
+
+    def notify_call_handlers(self, method_name, params, result):
+        for handler in self._call_handlers:
+            handler(method_name, params, result)
+
+    @property
+    def trades(self):
+        return self._trades[:self._n_trades]
+
+    def create_order(self, symbol, order_type, side, amount, price=None, params=None):
+        bar = self._bar
+        if order_type == "Market":
+            shift = self.slippage if side == "buy" else -self.slippage
+            price = bar[4] * (1 + shift)
+            status = "closed"
+        elif order_type == "Limit":
+            price = bar[4] if price is None else price
+            marketable = price >= bar[4] if side == "buy" else price <= bar[4]
+            status = "closed" if marketable else "open"
+        else:
+            raise ValueError(f"order type {order_type} is not supported in backtest")
+        # цена сделки: для лимитного ордера - закрытие, а не его (худшая) цена
+        average = None
+        if status == "closed":
+            average = bar[4] if order_type == "Limit" else price
+            self._fill(side, amount, average)
+        order = {
+            "id": str(self._next_id),
+            "timestamp": bar[0],
+            "symbol": symbol,
+            "type": order_type.lower(),
+            "side": side,
+            "price": price,
+            "average": average,
+            "amount": amount,
+            "filled": amount if status == "closed" else 0.0,
+            "remaining": 0.0 if status == "closed" else amount,
+            "status": status,
+        }
+        self._next_id += 1
+        self.orders[order["id"]] = order
+        if status == "open":
+            self._open[order["id"]] = order
+        self.notify_call_handlers("create_order", dict(symbol=symbol, order_type=order_type, side=side, amount=amount), order)
+        return order
+
+    def create_market_order(self, symbol, side, amount):
+        return self.create_order(symbol, "Market", side, amount)
+
+    def create_limit_order(self, symbol, side, amount, price=None):
+        return self.create_order(symbol, "Limit", side, amount, price)
+
+    def cancel_order(self, id, symbol):
+        canceled = self._cancel([id])
+        return canceled[0] if canceled else None
+
+    def create_orders(self, orders):
+        return [self.create_order(**order) for order in orders]
+
+    def cancel_orders(self, ids):
+        return self._cancel(ids)
+
+    def cancel_all(self, symbol=None):
+        return self._cancel([id for id, order in self._open.items() if symbol is None or order["symbol"] == symbol])
+
+    def check_filled(self, order_id, symbol):
+        order = self.orders.get(order_id)
+        if order is None:
+            return None
+        return {"status": order["status"], "filled": order["filled"], "remaining": order["remaining"]}
+
+    def _cancel(self, ids):
+        canceled = []
+        for id in ids:
+            order = self._open.pop(id, None)
+            if order is None:
+                continue
+            order["status"] = "canceled"
+            self.notify_call_handlers("cancel_order", dict(id=id, symbol=order["symbol"]), order)
+            canceled.append(order)
+        return canceled
+
+    def _set_bar(self, bar, index):
+        """Новая свеча: исполняются открытые лимитные ордера, до цены которых она дошла"""
+        self._bar = bar
+        self._bar_index = index
+        if not self._open:
+            return
+        open_ = bar[1]
+        for id, order in list(self._open.items()):
+            price = order["price"]
+            if order["side"] == "buy":
+                if bar[3] > price:
+                    continue
+                price = min(price, open_)
+            else:
+                if bar[2] < price:
+                    continue
+                price = max(price, open_)
+            del self._open[id]
+            self._fill(order["side"], order["amount"], price)
+            order.update(status="closed", filled=order["amount"], remaining=0.0, average=price)
+
+    def _fill(self, side, amount, price):
+        qty = amount if side == "buy" else -amount
+        fee = abs(amount) * price * self.fee
+        self.cash -= qty * price + fee
+        self.position += qty
+        if self._n_trades == len(self._trades):
+            self._trades = numpy.concatenate((self._trades, numpy.zeros(len(self._trades), dtype=TRADE)))
+        self._trades[self._n_trades] = (
+            self._bar_index, self._bar[0], 1 if qty > 0 else -1, price, abs(amount), fee, self.position, self.cash
+        )
+        self._n_trades += 1
+
+
+class _ResolvedOrders:
+    """
+    API для стратегий с ASYNC_ORDERS: методы ORDER_METHODS возвращают, как
+    OrderPipeline, Future, но ордер исполняется сразу на текущей свече,
+    и Future уже готов - бэктест остаётся детерминированным.
+    """
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    def __getattr__(self, name):
+        attr = getattr(self.exchange, name)
+        if name not in ORDER_METHODS:
+            return attr
+
+        def submit(*args, **kwargs):
+            future = Future()
+            try:
+                future.set_result(attr(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return submit
+
+
+class BacktestResult:
+
+    def __init__(self, timestamps, equity, trades, elapsed):
+        self.timestamps = timestamps
+        self.equity = equity
+        self.trades = trades
+        self.elapsed = elapsed
+
+    @property
+    def pnl(self):
+        return float(self.equity[-1] - self.equity[0]) if len(self.equity) else 0.0
+
+    @property
+    def max_drawdown(self):
+        if not len(self.equity):
+            return 0.0
+        return float(numpy.max(numpy.maximum.accumulate(self.equity) - self.equity))
+
+    def summary(self):
+        return {
+            "bars": len(self.equity),
+            "trades": len(self.trades),
+            "pnl": self.pnl,
+            "max_drawdown": self.max_drawdown,
+            "final_equity": float(self.equity[-1]) if len(self.equity) else None,
+            "elapsed": self.elapsed,
+        }
+
+
+class Backtest:
+    """
+    Прогон стратегии (без изменений в ней) по истории свечей.
+
+    Стратегия получает тот же вызов handle_data_candle(api, data, indi), что и
+    в Executor, но api - SimulatedExchange, а data["candles"] - окно
+    WINDOW_LENGTH свечей, скользящее по истории без копирования. Стратегии
+    с ASYNC_ORDERS получают, как в Executor, Future вместо результата ордера.
+    quiet глушит print в стратегии на время прогона (sys.stdout процесса).
+    """
+
+    def __init__(self, strategy_cls, candles, strat_params=None, symbol="XBTUSD",
+                 initial_cash=10000.0, fee=0.00075, slippage=0.0, quiet=True):
+        self.strategy_cls = strategy_cls
+        self.candles = as_rows(candles)
+        self.strat_params = dict(default_params(strategy_cls), **(strat_params or {}))
+        self.symbol = symbol
+        self.exchange_kwargs = dict(initial_cash=initial_cash, fee=fee, slippage=slippage)
+        self.quiet = quiet
+
+    def run(self):
+        started = time.perf_counter()
+        rows = self.candles
+        strategy = self.strategy_cls(self.strat_params)
+        exchange = SimulatedExchange(**self.exchange_kwargs)
+        api = _ResolvedOrders(exchange) if getattr(strategy, "ASYNC_ORDERS", False) else exchange
+        window = HistoryWindow(rows, strategy.WINDOW_LENGTH)
+        indicators_handler = IndicatorsHandler(strategy.INDICATORS, history=strategy.WINDOW_LENGTH)
+        data = {"symbol": self.symbol, "candles": window, "indicators": indicators_handler._cache}
+        warm_up = strategy.WINDOW_LENGTH - 1
+        handle = strategy.handle_data_candle
+        push = indicators_handler.push
+        advance = window.advance
+
+        out = contextlib.redirect_stdout(_NullWriter()) if self.quiet else contextlib.nullcontext()
+        with out:
+            i = 0
+            for start in range(0, len(rows), CHUNK):
+                for row in rows[start:start + CHUNK].tolist():
+                    advance()
+                    push(window, row)
+                    if i >= warm_up:
+                        exchange._set_bar(row, i)
+                        handle(api, data, indicators_handler)
+                    i += 1
+
+        return BacktestResult(rows[:, 0], self._equity(exchange), exchange.trades, time.perf_counter() - started)
+
+    def _equity(self, exchange):
+        """Кривая капитала по свечам: позиция и кэш кусочно-постоянны между сделками"""
+        closes = self.candles[:, 4]
+        trades = exchange.trades
+        if not len(trades):
+            return numpy.full(len(closes), exchange.initial_cash)
+        k = numpy.searchsorted(trades["bar"], numpy.arange(len(closes)), side="right") - 1
+        traded = k >= 0
+        k = numpy.maximum(k, 0)
+        position = numpy.where(traded, trades["position"][k], 0.0)
+        cash = numpy.where(traded, trades["cash"][k], exchange.initial_cash)
+        return cash + position * closes
+
+
+def load_history(symbol, tf, start=None, end=None, exchange=None, cache_dir=None):
+    """
+    История из локального кэша свечей (см. connectors/ohlcv_cache.py).
+    По умолчанию - каталог, в который пишет коннектор Bitmex (CACHE_DIR, CACHE_NAME).
+    """
+    from connectors.ohlcv_cache import OHLCVCache
+    if exchange is None or cache_dir is None:
+        from connectors.bitmex.bitmex import Bitmex
+        exchange = exchange or Bitmex.CACHE_NAME
+        cache_dir = cache_dir or Bitmex.CACHE_DIR
+    cache = OHLCVCache(cache_dir, exchange)
+    history = cache.read(symbol, tf, 0 if start is None else start, 2 ** 62 if end is None else end)
+    if not len(history):
+        raise ValueError(f"no cached {tf} candles for {symbol} in {cache.path(symbol, tf)}")
+    return history
+
+
+def _parse_params(pairs):
+    params = {}
+    for pair in pairs:
+        k, v = pair.split("=", 1)
+        params[k] = int(v) if v.lstrip("-").isdigit() else v
+    return params
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бэктест стратегии по кэшу свечей")
+    parser.add_argument("strategy", help="модуль в strategies/, например strat1")
+    parser.add_argument("symbol", help="символ как в кэше, например BTC/USD")
+    parser.add_argument("--exchange", default=None, help="каталог кэша биржи (по умолчанию как у коннектора)")
+    parser.add_argument("--timeframe", default=None)
+    parser.add_argument("--param", action="append", default=[], help="NAME=VALUE")
+    args = parser.parse_args()
+
+    strategy_cls = __import__("strategies." + args.strategy, fromlist=["Strategy"]).Strategy
+    history = load_history(args.symbol, args.timeframe or strategy_cls.TIMEFRAME, exchange=args.exchange)
+    result = Backtest(strategy_cls, history, _parse_params(args.param), symbol=args.symbol).run()
+    print(result.summary())
@@ -0,0 +1,147 @@
+"""
+Сравнение публикации ордеров в RabbitMQ: синхронно из потока websocket
+(как было) и через RabbitPublisher.
+
+Брокер по умолчанию - локальная заглушка с задержкой на каждый basic_publish
+(имитация записи в сокет / ожидания confirm) и обрывом связи каждые
+--fail-every сообщений. С --host публикуется в настоящий RabbitMQ.
+
+    python -m benchmarks.bench_rabbit_publisher
+    python -m benchmarks.bench_rabbit_publisher --messages 20000 --publish-delay 0.0002 --confirm
+"""
+import argparse
+import json
+import time
+import pika
+from connectors.bitmex.rabbit_publisher import RabbitPublisher
+
+
+class FakeChannel:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def exchange_declare(self, exchange, exchange_type):
+        pass
+
+    def queue_declare(self, queue):
+        pass
+
+    def confirm_delivery(self):
+        self.broker.confirm = True
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        broker = self.broker
+        if broker.fail_every and broker.attempts and broker.attempts % broker.fail_every == 0:
+            broker.attempts += 1
+            raise pika.exceptions.StreamLostError("connection reset by stand-in broker")
+        broker.attempts += 1
+        time.sleep(broker.delay * (2 if broker.confirm else 1))
+        broker.received.append(json.loads(body)["n"])
+
+
+class FakeBroker:
+    def __init__(self, delay, fail_every=0):
+        self.delay = delay
+        self.fail_every = fail_every
+        self.confirm = False
+        self.attempts = 0
+        self.received = []
+        self.connections = 0
+
+    def connect(self):
+        self.connections += 1
+        return self
+
+    # pika.BlockingConnection
+    def channel(self):
+        return FakeChannel(self)
+
+    def close(self):
+        pass
+
+
+CONF = {"host": "localhost", "exchange": "bench_ws_bitmex", "queue": "bench_ws_bitmex", "routing_key": "bench_ws_bitmex"}
+
+
+def message(n):
+    return {"n": n, "exchange": "bitmex", "source": "WS", "id": "00000000-%012d" % n, "price": 10000.5,
+            "symbol": "XBTUSD", "side": "Buy", "type": "Limit", "status": "New", "filled": 0, "remain": 100}
+
+
+def bench_sync(args, broker):
+    channel = broker.connect().channel()
+    blocked = []
+    started = time.perf_counter()
+    for n in range(args.messages):
+        t = time.perf_counter()
+        while True:
+            try:
+                channel.basic_publish(CONF["exchange"], CONF["routing_key"], json.dumps(message(n)))
+                break
+            except pika.exceptions.AMQPError:
+                channel = broker.connect().channel()
+        blocked.append(time.perf_counter() - t)
+        if args.rate:
+            time.sleep(1 / args.rate)
+    return {"elapsed": time.perf_counter() - started, "blocked": blocked}
+
+
+def bench_publisher(args, factory):
+    publisher = RabbitPublisher(CONF, max_queue=args.max_queue, batch_size=args.batch_size,
+                                confirm=args.confirm, connection_factory=factory)
+    publisher.RECONNECT_DELAY = 0.001
+    publisher.start()
+    blocked = []
+    started = time.perf_counter()
+    for n in range(args.messages):
+        t = time.perf_counter()
+        publisher.publish(message(n))
+        blocked.append(time.perf_counter() - t)
+        if args.rate:
+            time.sleep(1 / args.rate)
+    publisher.stop(timeout=600)
+    return {"elapsed": time.perf_counter() - started, "blocked": blocked, "stats": publisher.stats,
+            "latency": publisher.latency}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(name, result):
+    blocked = result["blocked"]
+    print("%s: %.2fs, %.0f msg/s, ws thread blocked p50 %.1fus p99 %.1fus max %.1fus" % (
+        name, result["elapsed"], len(blocked) / result["elapsed"],
+        percentile(blocked, 0.5) * 1e6, percentile(blocked, 0.99) * 1e6, max(blocked) * 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RabbitMQ publishing benchmark")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--publish-delay", type=float, default=0.0001, help="stand-in broker delay per publish, s")
+    parser.add_argument("--fail-every", type=int, default=1000, help="stand-in broker drops connection every N publishes")
+    parser.add_argument("--rate", type=float, default=0, help="producer rate, msg/s (0 - as fast as possible)")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-queue", type=int, default=10000)
+    parser.add_argument("--confirm", action="store_true")
+    parser.add_argument("--host", help="real RabbitMQ host instead of the stand-in")
+    args = parser.parse_args()
+
+    if args.host:
+        CONF["host"] = args.host
+        result = bench_publisher(args, lambda: pika.BlockingConnection(pika.ConnectionParameters(args.host)))
+        report("publisher", result)
+        print(result["stats"], result["latency"])
+    else:
+        broker = FakeBroker(args.publish_delay, args.fail_every)
+        report("sync", bench_sync(args, broker))
+        assert sorted(set(broker.received)) == list(range(args.messages))
+
+        broker = FakeBroker(args.publish_delay, args.fail_every)
+        result = bench_publisher(args, broker.connect)
+        report("publisher", result)
+        print(result["stats"])
+        print("latency: mean %.1fms max %.1fms" % (result["latency"]["mean"] * 1e3, result["latency"]["max"] * 1e3))
+        lost = args.messages - result["stats"]["dropped"] - len(set(broker.received))
+        print("connections %s, lost %s" % (broker.connections, lost))
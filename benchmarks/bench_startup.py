@@ -0,0 +1,78 @@
+"""
+Время запуска execute.py: импорт по модулям (python -X importtime) и время
+от старта процесса до первого показанного окна. Каждый замер - в новом
+процессе, берётся лучший из --repeat.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --top 20 --json startup.json
+
+Для времени до окна нужен дисплей; без него замер пропускается.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+
+FIRST_WINDOW = """
+import time, tkinter as tk
+import execute
+root = tk.Tk()
+app = execute.Application(master=root)
+def mapped(event):
+    print(time.time(), flush=True)
+    root.destroy()
+root.bind("<Map>", mapped)
+root.mainloop()
+"""
+
+
+def import_times(module):
+    """{модуль: (собственное время, с вложенными), мкс} для import module в новом процессе"""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                         capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def time_to_first_window():
+    """Секунды от запуска процесса до события <Map> главного окна или None без дисплея"""
+    started = time.time()
+    result = subprocess.run([sys.executable, "-c", FIRST_WINDOW], capture_output=True, text=True)
+    if result.returncode:
+        return None
+    return float(result.stdout.split()[-1]) - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="execute.py startup benchmark")
+    parser.add_argument("--module", default="execute")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="save results to this file")
+    args = parser.parse_args()
+
+    times = min((import_times(args.module) for _ in range(args.repeat)),
+                key=lambda t: t.get(args.module, (0, 0))[1])
+    total = times.get(args.module, (0, 0))[1]
+    print("import %s: %.1f ms" % (args.module, total / 1e3))
+    print("%10s %10s  module" % ("self ms", "cumul ms"))
+    for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda kv: -kv[1][1])[:args.top]:
+        print("%10.1f %10.1f  %s" % (self_us / 1e3, cumulative_us / 1e3, name))
+
+    windows = [time_to_first_window() for _ in range(args.repeat)]
+    window = None if None in windows else min(windows)
+    print("time to first window: %s" % ("n/a (no display)" if window is None else "%.1f ms" % (window * 1e3)))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"module": args.module, "import_ms": total / 1e3, "first_window_ms": window and window * 1e3,
+                       "modules": {k: {"self_ms": v[0] / 1e3, "cumulative_ms": v[1] / 1e3} for k, v in times.items()}},
+                      f, indent=2)
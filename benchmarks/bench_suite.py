@@ -0,0 +1,282 @@
+"""
+Набор бенчмарков без сети: индикаторы, IndicatorsHandler.update_candles,
+постраничная загрузка свечей fetch_last_candles, стакан ws_market_with_depth
+BitMEXWSOrder.__on_message на пачках сообщений и накладные расходы
+метрик (metrics.Histogram). Биржа - FakeCcxt
+(benchmarks/fake_exchange.py), данные детерминированы seed.
+
+Результаты пишутся в JSON (по умолчанию benchmarks/results/<commit>.json),
+--compare сравнивает с результатом другого коммита:
+
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --only indicators update_candles
+    python -m benchmarks.bench_suite --compare benchmarks/results/7a309fa.json
+
+Имена метрик оканчиваются единицей: _us, _ms - меньше лучше, _per_s - больше лучше.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy
+from benchmarks.fake_exchange import FakeCcxt, OfflineBitmex, TF_MS
+from benchmarks.bench_ws_ingest import synthetic_stream
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# замедление, которое --compare считает регрессией
+REGRESSION = 0.15
+
+
+def best_of(func, repeat=5, number=1):
+    """Лучшее из repeat время одного вызова func, сек (каждый замер - number вызовов)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - started) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_indicators(args):
+    from candles import CandleBuffer
+    from indicators.sma import sma, Sma
+    from indicators.bollinger_bands import bollinger_bands, BollingerBands
+    rows = FakeCcxt(seed=args.seed).candles(TF_MS["1m"], 0, 10000)
+    # пакетные функции - по окну стратегии: списком строк и CandleBuffer
+    window = rows[-500:]
+    buffer = CandleBuffer(len(window))
+    buffer.extend(window)
+
+    def stream(indicator):
+        def run():
+            for row in rows:
+                indicator.update(row)
+        return run
+
+    return {
+        "sma_batch_rows_us": best_of(lambda: sma(window, 27), number=1000) * 1e6,
+        "sma_batch_buffer_us": best_of(lambda: sma(buffer, 27), number=1000) * 1e6,
+        "bollinger_batch_rows_us": best_of(lambda: bollinger_bands(window, 20, 2), number=1000) * 1e6,
+        "bollinger_batch_buffer_us": best_of(lambda: bollinger_bands(buffer, 20, 2), number=1000) * 1e6,
+        "sma_stream_update_us": best_of(stream(Sma(27))) / len(rows) * 1e6,
+        "bollinger_stream_update_us": best_of(stream(BollingerBands(20, 2))) / len(rows) * 1e6,
+    }
+
+
+def bench_update_candles(args):
+    from candles import CandleBuffer
+    from indicators.base import IndicatorsHandler
+    config = {
+        "sma1": ("sma", 10), "sma1_prev": ("sma", 10, 1), "sma2": ("sma", 27), "sma2_prev": ("sma", 27, 1),
+        "bb": ("bollinger_bands", 20, 2),
+    }
+    window, bars = 500, 2000
+    rows = FakeCcxt(seed=args.seed).candles(TF_MS["1m"], 0, window + bars)
+
+    def run():
+        candles = CandleBuffer(window)
+        candles.extend(rows[:window])
+        handler = IndicatorsHandler(config, history=window)
+        handler.update_candles(candles)
+        started = time.perf_counter()
+        for row in rows[window:]:
+            candles.append(row)
+            handler.update_candles(candles)
+        return time.perf_counter() - started
+
+    return {"per_bar_us": min(run() for _ in range(5)) / bars * 1e6}
+
+
+def bench_fetch_last_candles(args):
+    count = 5000
+    result = {}
+    for latency in (0.0, args.latency):
+        for concurrency in (1, 4):
+            exchange = OfflineBitmex(latency=latency, seed=args.seed)
+            exchange.fetch_concurrency = concurrency
+            elapsed = best_of(lambda: exchange.fetch_last_candles("XBTUSD", "1m", count), repeat=3)
+            assert exchange.last_fetch_stats["pages"] == count // exchange.limit
+            result["latency_%dms_concurrency_%d_ms" % (latency * 1e3, concurrency)] = elapsed * 1e3
+    return result
+
+
+def _book_messages(levels, updates, seed):
+    rng = numpy.random.default_rng(seed)
+    partial = [
+        {"symbol": "XBTUSD", "id": i, "side": "Sell" if i < levels else "Buy",
+         "size": int(rng.integers(1, 10000)), "price": 10000.0 + (levels - i) * 0.5}
+        for i in range(2 * levels)
+    ]
+    burst = []
+    for i in rng.integers(0, 2 * levels, updates):
+        burst.append(("update", [{"symbol": "XBTUSD", "id": int(i), "side": partial[i]["side"],
+                                  "size": int(rng.integers(1, 10000))}]))
+    return partial, burst
+
+
+def bench_ws_market_with_depth(args):
+    exchange = OfflineBitmex(seed=args.seed)
+    partial, burst = _book_messages(2500, 20000, args.seed)
+    exchange.on_orderbook_message("XBTUSD", {"action": "partial", "data": partial})
+
+    def apply_burst():
+        for action, data in burst:
+            exchange.on_orderbook_message("XBTUSD", {"action": action, "data": data})
+
+    return {
+        "depth_5_us": best_of(lambda: exchange.ws_market_with_depth("XBTUSD", 5), number=10000) * 1e6,
+        "depth_25_us": best_of(lambda: exchange.ws_market_with_depth("XBTUSD", 25), number=10000) * 1e6,
+        "update_burst_msg_per_s": len(burst) / best_of(apply_burst),
+    }
+
+
+class _Publisher:
+    def __init__(self):
+        self.published = 0
+
+    def publish(self, msg):
+        self.published += 1
+        return True
+
+
+def bench_ws_on_message(args):
+    from connectors.bitmex.ws_ingest import WSIngest
+    from connectors.bitmex.ws_orders import BitMEXWSOrder
+    stream = synthetic_stream(args.messages, args.seed)
+
+    def client():
+        # без подключения: только то, что нужно обработчику сообщений
+        ws = BitMEXWSOrder.__new__(BitMEXWSOrder)
+        ws.logger = logging.getLogger("bench_suite.ws_orders")
+        ws.logger.setLevel(logging.WARNING)
+        ws.tables = {}
+        ws.ingest = WSIngest(ws.table, ws.logger)
+        ws.publisher = _Publisher()
+        return ws
+
+    def run(burst):
+        """Время обработки каждой пачки из burst сообщений, пришедших разом"""
+        ws = client()
+        on_message = ws._BitMEXWSOrder__on_message
+        drains = []
+        for i in range(0, len(stream), burst):
+            started = time.perf_counter()
+            for raw in stream[i:i + burst]:
+                on_message(None, raw)
+            drains.append(time.perf_counter() - started)
+        return drains
+
+    result = {"msg_per_s": len(stream) / min(sum(run(len(stream))) for _ in range(3))}
+    for burst in (100, 1000):
+        drains = min((run(burst) for _ in range(3)), key=sum)
+        result["burst_%d_drain_p99_ms" % burst] = float(numpy.percentile(drains, 99)) * 1e3
+    return result
+
+
+def bench_metrics(args):
+    import metrics
+    n = 100000
+    histogram = metrics.Histogram()
+
+    def bare():
+        for _ in range(n):
+            pass
+
+    def spans():
+        for _ in range(n):
+            with histogram.time():
+                pass
+
+    def records():
+        for i in range(n):
+            histogram.record(i * 1e-7)
+
+    loop = best_of(bare)
+    return {
+        "span_overhead_us": (best_of(spans) - loop) / n * 1e6,
+        "record_us": (best_of(records) - loop) / n * 1e6,
+    }
+
+
+BENCHMARKS = {
+    "indicators": bench_indicators,
+    "update_candles": bench_update_candles,
+    "fetch_last_candles": bench_fetch_last_candles,
+    "ws_market_with_depth": bench_ws_market_with_depth,
+    "ws_on_message": bench_ws_on_message,
+    "metrics": bench_metrics,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old, new):
+    """Строки сравнения и число регрессий больше REGRESSION"""
+    lines, regressions = [], 0
+    for bench, metrics in new["results"].items():
+        for name, value in metrics.items():
+            before = old["results"].get(bench, {}).get(name)
+            if not before:
+                continue
+            # во сколько раз стало быстрее
+            speedup = value / before if name.endswith("_per_s") else before / value
+            mark = ""
+            if speedup < 1 - REGRESSION:
+                regressions += 1
+                mark = "  REGRESSION"
+            lines.append("%-22s %-40s %12.3f -> %12.3f  x%.2f%s" % (bench, name, before, value, speedup, mark))
+    return lines, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="offline benchmark suite")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated REST latency, s")
+    parser.add_argument("--messages", type=int, default=20000, help="websocket messages per run")
+    parser.add_argument("--json", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="previous results file")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = BENCHMARKS[name](args)
+        for metric, value in results[name].items():
+            print("%-22s %-40s %12.3f" % (name, metric, value))
+
+    report = {
+        "commit": commit,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+    }
+    path = args.json or os.path.join(RESULTS_DIR, commit + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print("saved", path)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        lines, regressions = compare(old, report)
+        print("\ncompared with %s (%s)" % (old.get("commit"), args.compare))
+        print("\n".join(lines))
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,138 @@
+"""
+Скорость разбора сообщений BitMEX websocket (таблица order): прежний
+обработчик BitMEXWSOrder.__on_message и WSIngest, сообщений в секунду.
+
+Поток сообщений - записанный (по сообщению JSON в строке, --record) или
+синтетический: partial, затем insert / update / delete ордеров.
+
+    python -m benchmarks.bench_ws_ingest
+    python -m benchmarks.bench_ws_ingest --record ws_orders.ndjson --repeat 20
+"""
+import argparse
+import json
+import logging
+import random
+import time
+from connectors.bitmex.table_store import TableStore
+from connectors.bitmex.ws_ingest import JSON_BACKEND, WSIngest
+
+
+def order(n, rnd):
+    return {
+        "orderID": "00000000-0000-0000-0000-%012d" % n, "clOrdID": "", "account": 1, "symbol": "XBTUSD",
+        "side": rnd.choice(("Buy", "Sell")), "orderQty": 100, "price": 10000 + rnd.randrange(-500, 500) * 0.5,
+        "stopPx": None, "ordType": "Limit", "ordStatus": "New", "triggered": "", "leavesQty": 100, "cumQty": 0,
+        "timestamp": "2020-01-01T00:00:00.000Z",
+    }
+
+
+def synthetic_stream(count, seed=0):
+    rnd = random.Random(seed)
+    keys = ["orderID"]
+    live = [order(n, rnd) for n in range(50)]
+    stream = [{"table": "order", "action": "partial", "keys": keys, "data": live}]
+    live = [o["orderID"] for o in live]
+    n = len(live)
+    while len(stream) < count:
+        r = rnd.random()
+        if r < 0.3 or not live:
+            o = order(n, rnd)
+            n += 1
+            live.append(o["orderID"])
+            stream.append({"table": "order", "action": "insert", "data": [o]})
+        elif r < 0.9:
+            id = rnd.choice(live)
+            if rnd.random() < 0.3:
+                live.remove(id)
+                update = {"orderID": id, "ordStatus": "Filled", "leavesQty": 0, "cumQty": 100}
+            else:
+                update = {"orderID": id, "price": 10000 + rnd.randrange(-500, 500) * 0.5}
+            stream.append({"table": "order", "action": "update", "data": [update]})
+        else:
+            id = live.pop(rnd.randrange(len(live)))
+            stream.append({"table": "order", "action": "delete", "data": [{"orderID": id}]})
+    return [json.dumps(m) for m in stream]
+
+
+class Tables:
+    def __init__(self):
+        self.tables = {}
+
+    def __call__(self, name):
+        store = self.tables.get(name)
+        if store is None:
+            store = self.tables[name] = TableStore(name)
+        return store
+
+
+def legacy(tables, logger):
+    """Тело прежнего __on_message (без публикации)"""
+    def on_message(message):
+        updated_orders = []
+        message = json.loads(message)
+        logger.debug(json.dumps(message))
+        table = message["table"] if "table" in message else None
+        action = message["action"] if "action" in message else None
+        if "subscribe" in message:
+            logger.debug("Subscribed to %s." % message["subscribe"])
+        elif action:
+            store = tables(table)
+            if action == "partial":
+                logger.debug("%s: partial" % table)
+                store.partial(message["data"], message["keys"])
+                updated_orders = message["data"]
+            elif action == "insert":
+                logger.debug("%s: inserting %s" % (table, message["data"]))
+                store.insert(message["data"])
+                updated_orders = message["data"]
+            elif action == "update":
+                logger.debug("%s: updating %s" % (table, message["data"]))
+                for updateData in message["data"]:
+                    item = store.get(updateData)
+                    if item is None:
+                        continue
+                    item.update(updateData)
+                    if any([x in updateData for x in ["ordStatus", "cumQty", "leavesQty"]]):
+                        updated_orders.append(item)
+                    if table == "order" and item["leavesQty"] <= 0:
+                        store.remove(item)
+            elif action == "delete":
+                logger.debug("%s: deleting %s" % (table, message["data"]))
+                store.delete(message["data"])
+        return updated_orders
+    return on_message
+
+
+def run(name, make, stream, repeat):
+    best = None
+    for _ in range(repeat):
+        on_message = make()
+        started = time.perf_counter()
+        published = 0
+        for raw in stream:
+            published += len(on_message(raw))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print("%-8s %10.0f msg/s (%s messages, %s published)" % (name, len(stream) / best, len(stream), published))
+    return len(stream) / best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BitMEX websocket ingest benchmark")
+    parser.add_argument("--record", help="recorded stream, one JSON message per line")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.record:
+        with open(args.record) as f:
+            stream = [line for line in f if line.strip()]
+    else:
+        stream = synthetic_stream(args.messages)
+
+    logger = logging.getLogger("bench_ws_ingest")
+    logger.setLevel(logging.INFO)
+    print("json backend:", JSON_BACKEND)
+    before = run("before", lambda: legacy(Tables(), logger), stream, args.repeat)
+    after = run("after", lambda: WSIngest(Tables(), logger).feed, stream, args.repeat)
+    print("speedup x%.2f" % (after / before))
@@ -0,0 +1,124 @@
+"""
+Детерминированная биржа без сети для бенчмарков и тестов коннектора.
+
+FakeCcxt повторяет те методы ccxt.bitmex, которые вызывает Bitmex: свечи
+fetch_ohlcv считаются от номера свечи (timestamp // длительность) и seed,
+поэтому одни и те же запросы всегда возвращают одни и те же данные, а
+страницы стыкуются без дублей. latency - задержка каждого запроса, сек.
+
+OfflineBitmex - коннектор Bitmex поверх FakeCcxt, без кэша свечей на диске
+и без лимитов частоты запросов.
+"""
+import itertools
+import math
+import time
+import numpy
+from connectors.bitmex.bitmex import Bitmex
+
+
+TF_MS = {"1m": 60000, "5m": 300000, "15m": 900000, "30m": 1800000, "1h": 3600000, "4h": 14400000}
+
+
+class FakeCcxt:
+    CHUNK = 4096
+
+    def __init__(self, latency=0.0, seed=0):
+        self.latency = latency
+        self.seed = seed
+        self.requests = 0
+        self.orders = {}
+        self._ids = itertools.count(1)
+        self._noise = {}
+
+    def _call(self):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _noise_chunk(self, chunk):
+        noise = self._noise.get(chunk)
+        if noise is None:
+            rng = numpy.random.default_rng([self.seed, chunk])
+            noise = self._noise[chunk] = rng.normal(0.0, 1.0, (self.CHUNK, 3))
+        return noise
+
+    def candles(self, tf_ms, first, count):
+        """count свечей начиная с номера first: [[timestamp, open, high, low, close, volume], ...]"""
+        rows = []
+        for i in range(first, first + count):
+            noise = self._noise_chunk(i // self.CHUNK)[i % self.CHUNK]
+            base = 10000.0 + 500.0 * math.sin(i / 700.0) + 50.0 * math.sin(i / 37.0)
+            open_ = base + 10.0 * noise[0]
+            close = base + 10.0 * noise[1]
+            spread = 5.0 + abs(noise[2]) * 5.0
+            rows.append([i * tf_ms, open_, max(open_, close) + spread, min(open_, close) - spread, close,
+                         100.0 + abs(noise[2]) * 1000.0])
+        return rows
+
+    # ccxt
+    def load_markets(self):
+        return {}
+
+    def market_id(self, symbol):
+        return {"BTC/USD": "XBTUSD"}.get(symbol, symbol)
+
+    def fetch_time(self):
+        self._call()
+        return int(time.time() * 1000)
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=500):
+        self._call()
+        tf_ms = TF_MS[timeframe]
+        last = int(time.time() * 1000) // tf_ms  # текущая, ещё не закрытая свеча
+        first = last - limit + 1 if since is None else -(-since // tf_ms)
+        return self.candles(tf_ms, first, max(0, min(limit, last - first + 1)))
+
+    def publicGetInstrumentActive(self, params=None):
+        self._call()
+        return [{"symbol": "XBTUSD"}, {"symbol": "ETHUSD"}]
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self._call()
+        order = {
+            "id": str(next(self._ids)), "symbol": symbol, "type": type.lower(), "side": side,
+            "amount": float(amount), "price": price, "status": "open", "filled": 0.0, "remaining": float(amount),
+        }
+        self.orders[order["id"]] = order
+        return dict(order)
+
+    def cancel_order(self, id, symbol=None, params=None):
+        self._call()
+        order = self.orders[id]
+        order["status"] = "canceled"
+        return dict(order)
+
+    def fetch_order(self, id, symbol=None, params=None):
+        self._call()
+        return dict(self.orders[id])
+
+    def parse_orders(self, response):
+        return [{"id": o["orderID"], "symbol": "BTC/USD", "price": o.get("price")} for o in response]
+
+    def privatePostOrderBulk(self, params):
+        self._call()
+        return [dict(o, orderID=str(next(self._ids))) for o in params["orders"]]
+
+    def privateDeleteOrder(self, params):
+        self._call()
+        return [{"orderID": id} for id in params["orderID"]]
+
+    def privateDeleteOrderAll(self, params):
+        self._call()
+        return []
+
+
+class OfflineBitmex(Bitmex):
+    CACHE_DIR = None
+    REST_RATE = REST_BURST = ORDER_RATE = ORDER_BURST = 1e9
+
+    def __init__(self, latency=0.0, seed=0):
+        self._fake = FakeCcxt(latency, seed)
+        super().__init__()
+
+    def define_api(self):
+        self.api = self._fake
@@ -0,0 +1,222 @@
+import time
+import numpy
+
+
+COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+
+class CandleBuffer:
+    """
+    Окно свечей фиксированной ёмкости в колоночном виде (float64 на каждую колонку).
+
+    Каждая колонка хранится дважды подряд (длина 2 * capacity), запись идёт в обе
+    половины, поэтому последние N значений любой колонки всегда лежат непрерывно
+    и отдаются как view без копирования. Доступ по строкам (candles[-1][4])
+    сохранён для совместимости со стратегиями.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = numpy.zeros((len(COLUMNS), 2 * capacity), dtype=numpy.float64)
+        self._head = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    def __getitem__(self, key):
+        return self.rows()[key]
+
+    def __repr__(self):
+        return f"CandleBuffer(capacity={self.capacity}, len={self._len})"
+
+    def clear(self):
+        self._head = 0
+        self._len = 0
+
+    def copy(self):
+        other = CandleBuffer(self.capacity)
+        other.extend(self.rows())
+        return other
+
+    def window(self, n=None):
+        """View формы (6, n) на последние n свечей"""
+        n = self._len if n is None else min(n, self._len)
+        end = self._head + self.capacity
+        return self._data[:, end - n:end]
+
+    def rows(self, n=None):
+        """View формы (n, 6): строки в формате ccxt [timestamp, open, high, low, close, volume]"""
+        return self.window(n).T
+
+    def column(self, name, n=None):
+        return self.window(n)[COLUMNS.index(name)]
+
+    def closes(self, n=None):
+        return self.window(n)[4]
+
+    @property
+    def timestamp(self):
+        return self.window()[0]
+
+    @property
+    def open(self):
+        return self.window()[1]
+
+    @property
+    def high(self):
+        return self.window()[2]
+
+    @property
+    def low(self):
+        return self.window()[3]
+
+    @property
+    def close(self):
+        return self.window()[4]
+
+    @property
+    def volume(self):
+        return self.window()[5]
+
+    @property
+    def last_timestamp(self):
+        if not self._len:
+            return None
+        return self._data[0, self._head + self.capacity - 1]
+
+    def append(self, row):
+        i = self._head
+        self._data[:, i] = row[:6]
+        self._data[:, i + self.capacity] = row[:6]
+        self._head = (i + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+
+    def extend(self, rows):
+        rows = as_rows(rows)
+        n = len(rows)
+        if not n:
+            return
+        cap = self.capacity
+        if n >= cap:
+            rows = rows[-cap:].T
+            self._data[:, :cap] = rows
+            self._data[:, cap:] = rows
+            self._head = 0
+            self._len = cap
+            return
+        idx = (self._head + numpy.arange(n)) % cap
+        self._data[:, idx] = rows.T
+        self._data[:, idx + cap] = rows.T
+        self._head = (self._head + n) % cap
+        self._len = min(self._len + n, cap)
+
+    def replace_last(self, row):
+        i = (self._head - 1) % self.capacity
+        self._data[:, i] = row[:6]
+        self._data[:, i + self.capacity] = row[:6]
+
+    def update(self, rows):
+        """
+        Вливает свечи в окно: более старые, чем последняя свеча, пропускаются,
+        свеча с тем же временем перезаписывается. Возвращает число добавленных свечей.
+        """
+        rows = as_rows(rows)
+        last = self.last_timestamp
+        if last is not None and len(rows):
+            rows = rows[rows[:, 0] >= last]
+            if len(rows) and rows[0, 0] == last:
+                self.replace_last(rows[0])
+                rows = rows[1:]
+        self.extend(rows)
+        return len(rows)
+
+
+class HistoryWindow(CandleBuffer):
+    """
+    Окно из capacity свечей, скользящее по уже загруженной истории (бэктест).
+    Колонки истории используются как есть, сдвиг окна на свечу - это сдвиг индексов,
+    без копирования данных.
+    """
+
+    def __init__(self, history, capacity):
+        self.capacity = capacity
+        self._data = numpy.ascontiguousarray(as_rows(history).T)
+        self._head = -capacity
+        self._len = 0
+
+    def advance(self):
+        self._head += 1
+        if self._len < self.capacity:
+            self._len += 1
+
+    def append(self, row):
+        raise TypeError("HistoryWindow is read-only, use advance()")
+
+    extend = replace_last = update = append
+
+    def clear(self):
+        self._head = -self.capacity
+        self._len = 0
+
+
+class CandleFeed:
+    """
+    Окно свечей символа, синхронизируемое с биржей.
+
+    В режиме delta_sync с биржи запрашиваются только свечи новее последней
+    сохранённой; полное окно перезапрашивается при первом запуске и при разрыве
+    (пропущенные свечи или простой дольше окна). last_fetched - сколько свечей
+    пришло с биржи за последнюю синхронизацию.
+    """
+
+    def __init__(self, exchange_api, symbol, timeframe, window_length, delta_sync=True):
+        self.exchange_api = exchange_api
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.window_length = window_length
+        self.delta_sync = delta_sync
+        self.candles = CandleBuffer(window_length)
+        self.tf_ms = exchange_api.timeframes[timeframe][1] * 60 * 1000
+        self.last_fetched = 0
+        self.full_refetches = 0
+
+    def sync(self):
+        """Возвращает число новых свечей в окне"""
+        last = self.candles.last_timestamp
+        fetched = 0
+        if self.delta_sync and last is not None:
+            since = int(last) + self.tf_ms
+            if (time.time() * 1000 - since) / self.tf_ms <= self.window_length:
+                new = self.exchange_api.fetch_candles_since(self.symbol, self.timeframe, since)
+                fetched = len(new)
+                if not new or new[0][0] == since:
+                    self.last_fetched = fetched
+                    return self.candles.update(new)
+            self.full_refetches += 1
+            self.candles.clear()
+        rows = self.exchange_api.fetch_last_candles(self.symbol, self.timeframe, self.window_length)
+        self.last_fetched = fetched + len(rows)
+        return self.candles.update(rows)
+
+
+def as_rows(rows):
+    """Свечи в любом из форматов (строки ccxt, CandleBuffer, записи OHLCVCache) -> массив (n, 6)"""
+    if isinstance(rows, CandleBuffer):
+        return rows.rows()
+    if isinstance(rows, numpy.ndarray) and rows.dtype.names:
+        return numpy.column_stack([rows[name].astype(numpy.float64) for name in rows.dtype.names[:len(COLUMNS)]])
+    if not len(rows):
+        return numpy.empty((0, len(COLUMNS)), dtype=numpy.float64)
+    return numpy.asarray(rows, dtype=numpy.float64)
+
+
+def closes(data):
+    """Цены закрытия окна как numpy-массив; для CandleBuffer без копирования"""
+    if isinstance(data, CandleBuffer):
+        return data.close
+    return numpy.fromiter((row[4] for row in data), dtype=numpy.float64, count=len(data))
@@ -0,0 +1,321 @@
+from datetime import datetime
+import logging
+import threading
+import time
+import numpy as np
+from matplotlib import dates, ticker
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from mpl_finance import candlestick_ohlc
+from chart_data import aggregate, bucket_size, bucket_starts, decimate, indicator_columns
+
+
+MS_IN_DAY = 24 * 60 * 60 * 1000
+
+logger = logging.getLogger(__name__)
+
+
+def to_datenum(timestamps):
+    """Время свечей (мс) -> даты matplotlib в локальном времени, без datetime на каждую свечу"""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if not len(timestamps):
+        return timestamps
+    first = dates.date2num(datetime.fromtimestamp(timestamps[0] / 1e3))
+    return first + (timestamps - timestamps[0]) / MS_IN_DAY
+
+
+class Chart:
+    """
+    График свечей с индикаторами, живущий всё время работы приложения.
+
+    Фигура и холст создаются один раз. update(data) добавляет артисты только
+    для новых свечей, удаляет ушедшие из окна, перерисовывает изменившиеся
+    (обычно последнюю) и меняет данные линий индикаторов. Последняя свеча и
+    линии индикаторов - animated: если новых свечей нет и масштаб не меняется,
+    они дорисовываются поверх сохранённого фона (blit) без полной отрисовки.
+
+    Свечей на графике не больше, чем помещается по ширине осей (PX_PER_BAR
+    пикселей на свечу): длинная история объединяется в более крупные свечи,
+    линии индикаторов прореживаются с сохранением минимумов и максимумов.
+    zoom() меняет число показываемых последних свечей (visible); полное
+    разрешение возвращается, когда они помещаются по ширине.
+
+    График рисуется в буфер Agg (rgba()) и не трогает Tk, поэтому может
+    работать в фоновом потоке (ChartRenderer).
+    """
+
+    COLORUP = "g"
+    COLORDOWN = "r"
+    ALPHA = 0.8
+    PX_PER_BAR = 3
+    MIN_VISIBLE = 20
+    ZOOM = 1.25
+
+    def __init__(self, figsize=(6, 4), dpi=100):
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.xaxis.set_major_formatter(dates.DateFormatter("%H:%M"))
+        self.ax.xaxis.set_major_locator(ticker.MaxNLocator(8))
+        self.ax.tick_params(axis="x", labelrotation=30)
+        self.ax.set_title("Текущая котировка")
+        self.ax.set_xlabel("Date")
+        self.ax.set_ylabel("Price")
+        self.ax.grid()
+        self.figure.tight_layout()
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+        self._background = None
+        self._data = None
+        self.symbol = None
+        self.visible = None
+        self.bucket = 1
+        self.tf_ms = 60 * 1000
+        self.width = 0.5 / (24 * 60)
+        self.full_draws = 0
+        self.blits = 0
+        self._clear()
+
+    def _clear(self):
+        for line, rect in getattr(self, "_bars", []):
+            line.remove()
+            rect.remove()
+        for line in getattr(self, "_lines", {}).values():
+            line.remove()
+        self._ts = np.empty(0, dtype=np.float64)
+        self._x = np.empty(0, dtype=np.float64)
+        self._ohlc = np.empty((0, 4), dtype=np.float64)
+        self._bars = []
+        self._lines = {}
+        self._legend = ()
+
+    def max_bars(self):
+        return int(self.ax.bbox.width // self.PX_PER_BAR)
+
+    def update(self, data):
+        self._data = data
+        candles = data["candles"]
+        ts = np.asarray(candles.timestamp, dtype=np.float64)
+        start = 0 if self.visible is None else max(0, len(ts) - self.visible)
+        ts = ts[start:]
+        ohlc = np.column_stack((candles.open[start:], candles.high[start:], candles.low[start:], candles.close[start:]))
+        full = self._background is None
+        if data.get("symbol") != self.symbol:
+            self.symbol = data.get("symbol")
+            self._clear()
+            full = True
+        if len(ts) > 1:
+            self.tf_ms = np.diff(ts).min()
+        bucket = bucket_size(len(ts), self.max_bars())
+        if bucket != self.bucket:
+            self.bucket = bucket
+            self._clear()
+            full = True
+        raw_ts = ts
+        if bucket > 1:
+            ts, ohlc, _ = aggregate(ts, ohlc, bucket * self.tf_ms)
+
+        # свечи, ушедшие из окна слева
+        drop = int(np.searchsorted(self._ts, ts[0] if len(ts) else np.inf))
+        if drop:
+            for line, rect in self._bars[:drop]:
+                line.remove()
+                rect.remove()
+            del self._bars[:drop]
+            self._ts, self._x, self._ohlc = self._ts[drop:], self._x[drop:], self._ohlc[drop:]
+            full = True
+        # оставшиеся должны совпадать с началом нового окна, иначе строим заново
+        old = len(self._ts)
+        if old > len(ts) or not np.array_equal(self._ts, ts[:old]):
+            self._clear()
+            old = 0
+            full = True
+
+        for i in np.flatnonzero((self._ohlc != ohlc[:old]).any(axis=1)):
+            self._set_bar(self._bars[i], ohlc[i])
+            # blit дорисовывает только последнюю свечу, остальные - в фоне
+            if i != old - 1:
+                full = True
+        self._ohlc = ohlc
+
+        if len(ts) > old:
+            if not old:
+                self.width = 0.6 * self.bucket * self.tf_ms / MS_IN_DAY
+            # крупная свеча рисуется посередине своей корзины
+            x = to_datenum(ts[old:] + (self.bucket - 1) * self.tf_ms / 2)
+            lines, patches = candlestick_ohlc(self.ax, np.column_stack((x, ohlc[old:])), width=self.width,
+                                              colorup=self.COLORUP, colordown=self.COLORDOWN, alpha=self.ALPHA)
+            if self._bars:
+                for artist in self._bars[-1]:
+                    artist.set_animated(False)
+            self._bars.extend(zip(lines, patches))
+            for artist in self._bars[-1]:
+                artist.set_animated(True)
+            self._ts, self._x = ts, np.concatenate((self._x, x))
+            full = True
+
+        raw_x = None
+        for name, values in data.get("indicators", {}).items():
+            # значения выровнены по последним свечам окна
+            count = min(len(values), len(raw_ts))
+            if count < 2:
+                continue
+            if raw_x is None:
+                raw_x = to_datenum(raw_ts)
+            columns = indicator_columns(list(values)[len(values) - count:])
+            x = raw_x[-count:]
+            keep = None
+            if self.bucket > 1:
+                starts = bucket_starts(raw_ts[-count:], self.bucket * self.tf_ms)
+            for i in range(columns.shape[1]):
+                label = name if columns.shape[1] == 1 else "%s[%s]" % (name, i)
+                y = columns[:, i]
+                if self.bucket > 1:
+                    keep = decimate(y, starts)
+                line = self._lines.get(label)
+                if line is None:
+                    line = self._lines[label] = self.ax.plot([], [], label=label, animated=True)[0]
+                line.set_data((x, y) if keep is None else (x[keep], y[keep]))
+        if tuple(self._lines) != self._legend:
+            self._legend = tuple(self._lines)
+            if self._lines:
+                self.ax.legend()
+            elif self.ax.get_legend():
+                self.ax.get_legend().remove()
+            full = True
+
+        full = self._set_limits() or full
+        if full:
+            self.full_draws += 1
+            self.canvas.draw()
+        else:
+            self.blits += 1
+            self._blit()
+
+    def rgba(self):
+        """(ширина, высота, байты RGBA) текущего кадра"""
+        width, height = self.canvas.get_width_height()
+        return width, height, bytes(self.canvas.buffer_rgba())
+
+    def zoom(self, zoom_in):
+        if self._data is None:
+            return
+        total = len(self._data["candles"])
+        visible = self.visible or total
+        visible = visible / self.ZOOM if zoom_in else visible * self.ZOOM
+        visible = max(self.MIN_VISIBLE, int(visible))
+        self.visible = None if visible >= total else visible
+        self.update(self._data)
+
+    def _set_bar(self, bar, row):
+        open, high, low, close = row
+        line, rect = bar
+        color = self.COLORUP if close >= open else self.COLORDOWN
+        line.set_ydata((low, high))
+        line.set_color(color)
+        rect.set_y(min(open, close))
+        rect.set_height(abs(close - open))
+        rect.set_facecolor(color)
+        rect.set_edgecolor(color)
+        rect.set_alpha(self.ALPHA)
+
+    def _set_limits(self):
+        """Подгоняет масштаб под окно; True если он изменился"""
+        if not len(self._x):
+            return False
+        xlim = (self._x[0] - self.width, self._x[-1] + self.width)
+        low, high = np.nanmin(self._ohlc[:, 2]), np.nanmax(self._ohlc[:, 1])
+        margin = (high - low) * 0.05 or abs(high) * 0.01 or 1
+        ylim = self.ax.get_ylim()
+        changed = xlim != self.ax.get_xlim()
+        # по цене масштаб меняется только если свечи вышли за пределы
+        if low < ylim[0] or high > ylim[1] or changed:
+            self.ax.set_ylim(low - margin, high + margin)
+            changed = True
+        if changed:
+            self.ax.set_xlim(*xlim)
+        return changed
+
+    def _animated(self):
+        artists = list(self._bars[-1]) if self._bars else []
+        return artists + list(self._lines.values())
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for artist in self._animated():
+            self.ax.draw_artist(artist)
+
+    def _blit(self):
+        self.canvas.restore_region(self._background)
+        for artist in self._animated():
+            self.ax.draw_artist(artist)
+        self.canvas.blit(self.ax.bbox)
+
+
+class ChartRenderer:
+    """
+    Отрисовка Chart в отдельном потоке. submit(data) только запоминает
+    последние данные: если они приходят быстрее, чем рисуется кадр,
+    промежуточные пропускаются (coalesced). Готовый кадр забирает поток Tk
+    через take_frame() и лишь копирует его в PhotoImage.
+    """
+
+    def __init__(self, chart=None):
+        self.chart = chart or Chart()
+        self.rendered = 0
+        self.coalesced = 0
+        self.render_time = 0.0
+        self._cond = threading.Condition()
+        self._pending = None
+        self._zoom = []
+        self._frame = None
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="chart-renderer", daemon=True)
+        self._thread.start()
+
+    def submit(self, data):
+        with self._cond:
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = data
+            self._cond.notify()
+
+    def zoom(self, zoom_in):
+        with self._cond:
+            self._zoom.append(zoom_in)
+            self._cond.notify()
+
+    def take_frame(self):
+        """Последний готовый кадр (ширина, высота, байты RGBA) или None, если нового нет"""
+        with self._cond:
+            frame, self._frame = self._frame, None
+        return frame
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None and not self._zoom:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                data, self._pending = self._pending, None
+                zoom, self._zoom = self._zoom, []
+            started = time.perf_counter()
+            try:
+                if data is not None:
+                    self.chart.update(data)
+                for zoom_in in zoom:
+                    self.chart.zoom(zoom_in)
+                frame = self.chart.rgba()
+            except Exception:
+                logger.exception("chart render failed")
+                continue
+            self.render_time = time.perf_counter() - started
+            self.rendered += 1
+            with self._cond:
+                self._frame = frame
@@ -0,0 +1,77 @@
+import math
+import numpy as np
+
+
+def bucket_size(count, max_bars):
+    """Сколько свечей объединять в одну, чтобы на графике было не больше max_bars"""
+    return max(1, math.ceil(count / max(1, max_bars)))
+
+
+def bucket_starts(timestamps, bucket_ms):
+    """
+    Индексы первых свечей каждой корзины. Корзины выровнены по времени
+    (timestamp // bucket_ms), поэтому при добавлении свечей меняется только
+    последняя корзина, а при сдвиге окна - только первая.
+    """
+    keys = np.asarray(timestamps, dtype=np.float64) // bucket_ms
+    if not len(keys):
+        return np.empty(0, dtype=np.intp)
+    return np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+
+
+def aggregate(timestamps, ohlc, bucket_ms):
+    """
+    Свечи (timestamps, массив n x 4 open/high/low/close) -> свечи крупнее по
+    корзинам bucket_ms: время начала корзины, open первой, max high, min low,
+    close последней. Возвращает (время, ohlc, индексы начала корзин).
+    """
+    ohlc = np.asarray(ohlc, dtype=np.float64)
+    starts = bucket_starts(timestamps, bucket_ms)
+    if not len(starts):
+        return np.empty(0), np.empty((0, 4)), starts
+    ends = np.append(starts[1:], len(ohlc)) - 1
+    result = np.empty((len(starts), 4))
+    result[:, 0] = ohlc[starts, 0]
+    result[:, 1] = np.fmax.reduceat(ohlc[:, 1], starts)
+    result[:, 2] = np.fmin.reduceat(ohlc[:, 2], starts)
+    result[:, 3] = ohlc[ends, 3]
+    ts = np.asarray(timestamps, dtype=np.float64)[starts] // bucket_ms * bucket_ms
+    return ts, result, starts
+
+
+def _first_match(values, groups, sizes, targets):
+    """Индекс первого значения, равного targets[g], в каждой группе g"""
+    hits = np.flatnonzero(values == np.repeat(targets, sizes))
+    _, first = np.unique(groups[hits], return_index=True)
+    return hits[first]
+
+
+def decimate(values, starts):
+    """
+    Индексы точек ряда, сохраняющих минимум и максимум каждой корзины
+    (корзины начинаются с индексов starts), в порядке следования. Линия по ним
+    выглядит как исходная при ширине корзины не больше пикселя.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(starts) >= len(values):
+        return np.arange(len(values))
+    sizes = np.diff(np.append(starts, len(values)))
+    groups = np.repeat(np.arange(len(starts)), sizes)
+    lows = _first_match(values, groups, sizes, np.fmin.reduceat(values, starts))
+    highs = _first_match(values, groups, sizes, np.fmax.reduceat(values, starts))
+    return np.unique(np.concatenate((lows, highs)))
+
+
+def indicator_columns(values):
+    """
+    Значения индикатора из IndicatorsHandler (числа, None до прогрева или
+    списки для многолинейных, как у bollinger_bands) -> массив n x k
+    """
+    try:
+        columns = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # None до прогрева
+        last = next((v for v in reversed(values) if v is not None), None)
+        empty = [np.nan] * len(last) if isinstance(last, (list, tuple)) else np.nan
+        columns = np.array([empty if v is None else v for v in values], dtype=np.float64)
+    return columns.reshape(len(values), -1)
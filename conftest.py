@@ -0,0 +1,41 @@
+import time
+import pytest
+
+
+class FakeExchange:
+    """
+    Биржа для тестов executor и headless с фиксированными часами: время биржи
+    всегда NOW (fetch_time_offset считается от него), свечи 1m закрыты до NOW,
+    поэтому первый бар готов независимо от того, когда запущен тест.
+    """
+
+    NOW = 1700000040 // 60 * 60
+    timeframes = {"1m": [None, 1]}
+
+    def __init__(self, count=40):
+        self.rows = [[(self.NOW - 60 * (count - i)) * 1000, 10.0 + i, 11.0 + i, 9.0 + i, 10.5 + i, 1.0]
+                     for i in range(count)]
+        self.orders = []
+        self.fetches = 0
+
+    def register_call_handler(self, handler):
+        pass
+
+    def fetch_time_offset(self):
+        return self.NOW - time.time()
+
+    def fetch_last_candles(self, symbol, tf, count):
+        self.fetches += 1
+        return self.rows[-count:]
+
+    def fetch_candles_since(self, symbol, tf, since):
+        self.fetches += 1
+        return [row for row in self.rows if row[0] >= since]
+
+    def create_market_order(self, symbol, side, amount):
+        self.orders.append((symbol, side, amount))
+
+
+@pytest.fixture
+def fake_exchange():
+    return FakeExchange()
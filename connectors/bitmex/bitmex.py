@@ -2,10 +2,18 @@
 import json
 import ccxt
 import time
+import email.utils
 import os
 from collections import deque
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from connectors.ohlcv_cache import OHLCVCache, to_rows
+from connectors.request_scheduler import RequestScheduler, TokenBucket
+from connectors.bitmex.orderbook import OrderBookL2
+from connectors.bitmex.ws_ingest import loads
 
+logger = logging.getLogger(__name__)
 
 
 def sentry(func):
@@ -21,8 +29,50 @@ def sentry(func):
 round_ = lambda x: round(float(x) * 2) / 2
 
 
-class Bitmex:
-    # PUBLIC
+def load_keys():
+    if os.path.exists(".keys/bitmex.json"):
+        with open(".keys/bitmex.json") as f:
+            return json.load(f)
+
+
+def _stitch_pages(pages, tf_ms, start=None):
+    """
+    Склейка страниц свечей по порядку: (строки, число дублей, число пропущенных свечей).
+    С start пропущенными считаются и свечи между start и первой полученной.
+    """
+    rows = []
+    last = None if start is None else start - tf_ms
+    duplicates = missing = 0
+    for page in pages:
+        for row in page:
+            if last is not None:
+                if row[0] <= last:
+                    duplicates += 1
+                    continue
+                missing += (row[0] - last) // tf_ms - 1
+            rows.append(row)
+            last = row[0]
+    return rows, duplicates, missing
+
+
+class BitmexBase:
+    """
+    Общая часть синхронного (Bitmex) и асинхронного (AsyncBitmex) коннекторов
+    без REST-запросов: настройки, websocket и стакан, обработчики вызовов,
+    convert и сборка запросов ордеров. Объект ccxt создаёт define_api
+    наследника, сетевые методы у каждого свои.
+    """
+    # каталог кэша свечей на диске; None - всегда запрашивать биржу
+    CACHE_DIR = ".cache/ohlcv"
+    # testnet BitMEX; от него зависит и каталог кэша (CACHE_NAME), который читает backtest.load_history
+    TEST = True
+    CACHE_NAME = "bitmex-test" if TEST else "bitmex"
+    # лимиты REST BitMEX: 120 запросов в минуту на все маршруты,
+    # плюс 10 в секунду на создание и отмену ордеров
+    REST_RATE = 120 / 60
+    REST_BURST = 120
+    ORDER_RATE = 10
+    ORDER_BURST = 10
     timeframes = {
         "1m": [lambda x: x.second % 60 == 0, 1],
         "5m": [lambda x: x.minute % 5 == 0 and x.second % 60 == 0, 5],
@@ -32,16 +82,37 @@ class Bitmex:
         "4h": [lambda x: x.hour % 4 == 0 and x.minute % 60 == 0, 240],
     }
 
+    def __init__(self):
+        self.test = self.TEST
+        self.ws_endpoint = "wss://www.bitmex.com/realtime"
+        self.wss = {}
+        self.books = {}
+        self._books_lock = threading.Lock()
+        self.api = None
+        self.limit = 500
+        self.define_api()
+        self.name_converter = {("XBTUSD", "BTC/USD")}
+        self.limit = 500
+        # сколько страниц свечей запрашивать одновременно
+        self.fetch_concurrency = 4
+        self.last_fetch_stats = None
+        self._call_handlers = []
+        self.cache = None
+        if self.CACHE_DIR:
+            self.cache = OHLCVCache(self.CACHE_DIR, self.CACHE_NAME)
+        # все запросы к REST API идут через общую очередь с лимитами биржи
+        self.requests = RequestScheduler(
+            buckets={
+                "rest": TokenBucket(self.REST_RATE, self.REST_BURST),
+                "order": TokenBucket(self.ORDER_RATE, self.ORDER_BURST),
+            },
+            kinds={"order": (0, ("rest", "order")), "cancel": (0, ("rest", "order")), "read": (1, ("rest",))},
+            throttle_errors=(ccxt.DDoSProtection,),
+        )
+
     def define_api(self):
-        if os.path.exists(".keys/bitmex.json"):
-            with open(".keys/bitmex.json") as f:
-                data = json.load(f)
-                self.api = ccxt.bitmex(
-                    {"apiKey": data.get("api_key"), "secret": data.get("secret")}
-                )
-                if self.test:
-                    if 'test' in self.api.urls:
-                        self.api.urls['api'] = self.api.urls['test']
+        """Создаёт self.api - объект ccxt (синхронный или async_support)"""
+        raise NotImplementedError
 
     def add_ws(self, symbols):
         if os.path.exists(".keys/bitmex.json"):
@@ -59,22 +130,12 @@ class Bitmex:
                             # time.sleep(1)
                             ws.get_instrument()
                             self.wss[s] = ws
+                            self._attach_orderbook(s, ws)
                         except websocket.WebSocketTimeoutException:
                             print("ws connection error")
                             return False
         return True
 
-    def __init__(self):
-        self.test = True
-        self.ws_endpoint = "wss://www.bitmex.com/realtime"
-        self.wss = {}
-        self.api = None
-        self.limit = 500
-        self.define_api()
-        self.name_converter = {("XBTUSD", "BTC/USD")}
-        self.limit = 500
-        self._call_handlers = []
-
     def register_call_handler(self, handler):
         self._call_handlers.append(handler)
 
@@ -102,35 +163,136 @@ class Bitmex:
                 return pair[1]
         return symbol
 
-    # ORDERS
-    def create_order(self, symbol, order_type, side, amount, price=None, params=None):
+    def _attach_orderbook(self, symbol, ws):
         """
-        https://www.bitmex.com/api/explorer/#!/Order/Order_new
+        Стакан symbol ведётся по сообщениям orderBookL2 самого websocket ws:
+        обработчик сокета оборачивается, и после него каждое сообщение стакана
+        применяется к self.books[symbol]. Начальное состояние - один снимок
+        market_depth() (partial мог прийти до подключения обработчика).
         """
+        app = ws.ws
+        on_message = app.on_message
+
+        def hook(*args):
+            on_message(*args)
+            message = args[-1]
+            if '"orderBookL2' not in message:
+                return
+            message = loads(message)
+            if message.get("table") == "orderBookL2" and "action" in message:
+                self.on_orderbook_message(symbol, message)
+
+        app.on_message = hook
+        with self._books_lock:
+            if symbol not in self.books:
+                book = self.books[symbol] = OrderBookL2()
+                book.apply("partial", [dict(level) for level in ws.market_depth()])
+
+    def on_orderbook_message(self, symbol, message):
+        """Сообщение orderBookL2 из websocket: обновляет стакан символа инкрементально"""
+        with self._books_lock:
+            book = self.books.get(symbol)
+            if book is None:
+                if message["action"] != "partial":
+                    # дельты до снимка не к чему применять
+                    return
+                book = self.books[symbol] = OrderBookL2()
+            book.apply(message["action"], message["data"])
+
+    def ws_market_with_depth(self, symbol, depth=5):
+        """depth лучших продаж (по убыванию цены), затем depth лучших покупок (по убыванию)"""
+        with self._books_lock:
+            book = self.books.get(symbol)
+            if book is not None:
+                return book.asks(depth)[::-1] + book.bids(depth)
+        # стакан не ведётся по сообщениям - собираем из снимка websocket
+        book = OrderBookL2()
+        book.apply("partial", self.wss[symbol].market_depth())
+        return book.asks(depth)[::-1] + book.bids(depth)
+
+    # PRIVATE
+    def _get_balance(self):
+        if self.wss:
+            ws = next(iter(self.wss.values()))
+            if ws.ws.sock.connected:
+                funds = ws.funds()
+                return funds
 
+    def _price_for_non_price_order(self, symbol, side):
+        with self._books_lock:
+            book = self.books.get(symbol)
+            if book is not None:
+                level = book.best_bid if side == "buy" else book.best_ask
+                return level["price"] if level else None
+        ws = self.wss[symbol]
+        price = None
+        if ws.ws.sock.connected:
+            if side == "buy":
+                price = self.ws_market_with_depth(symbol, 1)[1]["price"]
+            if side == "sell":
+                price = self.ws_market_with_depth(symbol, 1)[0]["price"]
+        return price
+
+    def _order_request(self, symbol, order_type, side, amount, price=None, params=None):
         symbol = self.convert(symbol)
         price = round_(price) if price else None
         print(
             f"symbol={symbol}, type={order_type}, side={side}, amount={amount}, price={price}, params={params}"
         )
+        request = dict(symbol=symbol, type=order_type, side=side, amount=int(amount), price=price)
         if params:
-            order = self.api.create_order(
-                symbol=symbol,
-                type=order_type,
-                side=side,
-                amount=int(amount),
-                price=price,
-                params=params,
-            )
-        else:
-            order = self.api.create_order(
-                symbol=symbol,
-                type=order_type,
-                side=side,
-                amount=int(amount),
-                price=price,
+            request["params"] = params
+        return request
+
+    def _notify_canceled(self, canceled):
+        for result in canceled:
+            self.notify_call_handlers("cancel_order", dict(id=result["id"], symbol=result["symbol"]), result)
+        return canceled
+
+    def _bulk_order(self, request):
+        """Запрос _order_request -> ордер в формате BitMEX для /order/bulk"""
+        order = {
+            "symbol": self.api.market_id(request["symbol"]),
+            "side": request["side"].capitalize(),
+            "orderQty": request["amount"],
+            "ordType": request["type"],
+        }
+        if request["price"] is not None:
+            order["price"] = request["price"]
+        order.update(request.get("params", {}))
+        return order
+
+
+class Bitmex(BitmexBase):
+    # PUBLIC
+    def define_api(self):
+        keys = load_keys()
+        if keys:
+            self.api = ccxt.bitmex(
+                # частоту запросов ограничивает self.requests, а не ccxt
+                {"apiKey": keys.get("api_key"), "secret": keys.get("secret"), "enableRateLimit": False}
             )
-        self.notify_call_handlers("create_order", dict(symbol=symbol, order_type=order_type, side=side, amount=amount), order)
+            if self.test:
+                if 'test' in self.api.urls:
+                    self.api.urls['api'] = self.api.urls['test']
+
+    def __init__(self):
+        super().__init__()
+        self._page_pool = None
+        self._page_pool_size = 0
+
+    def _request(self, kind, func, *args, key=None, **kwargs):
+        """func(*args, **kwargs) через очередь запросов; kind - order, cancel или read"""
+        return self.requests.call(kind, func, *args, key=key, **kwargs)
+
+    # ORDERS
+    def create_order(self, symbol, order_type, side, amount, price=None, params=None):
+        """
+        https://www.bitmex.com/api/explorer/#!/Order/Order_new
+        """
+        request = self._order_request(symbol, order_type, side, amount, price, params)
+        order = self._request("order", self.api.create_order, **request)
+        self.notify_call_handlers("create_order", dict(symbol=request["symbol"], order_type=order_type, side=side, amount=amount), order)
         return order
 
     def create_market_order(self, symbol, side, amount):
@@ -158,7 +320,7 @@ class Bitmex:
     def create_stop_order(self, symbol, side, amount, stopPx):
         params = {"stopPx": round_(stopPx)}
         order_type = "Stop"
-        order = self.create_order(symbol, order_type, side, amount, params)
+        order = self.create_order(symbol, order_type, side, amount, None, params)
         return order
 
     def create_limit_order(self, symbol, side, amount, price=None):
@@ -174,36 +336,79 @@ class Bitmex:
 
     def cancel_order(self, id, symbol):
         symbol = self.convert(symbol)
-        return self.api.cancel_order(id, symbol)
+        result = self._request("cancel", self.api.cancel_order, id, symbol)
+        self.notify_call_handlers("cancel_order", dict(id=id, symbol=symbol), result)
+        return result
 
-    # END ORDERS
+    def create_orders(self, orders):
+        """
+        Несколько ордеров одним запросом (POST /order/bulk), например вход, стоп и
+        тейк-профит вместе. orders - словари с аргументами create_order:
+        symbol, order_type, side, amount и необязательные price, params.
+
+        >>> create_orders([
+        ...     dict(symbol="XBTUSD", order_type="Limit", side="buy", amount=10, price=9000),
+        ...     dict(symbol="XBTUSD", order_type="Stop", side="sell", amount=10, params={"stopPx": 8900}),
+        ... ])
+        """
+        requests = [self._order_request(**order) for order in orders]
+        response = self._request("order", self._post_order_bulk, requests)
+        created = self.api.parse_orders(response)
+        for order, request, result in zip(orders, requests, created):
+            self.notify_call_handlers("create_order", dict(symbol=request["symbol"], order_type=order["order_type"], side=order["side"], amount=order["amount"]), result)
+        return created
+
+    def cancel_orders(self, ids):
+        """Отмена нескольких ордеров одним запросом (DELETE /order со списком orderID)"""
+        response = self._request("cancel", self.api.privateDeleteOrder, {"orderID": list(ids)})
+        return self._notify_canceled(self.api.parse_orders(response))
+
+    def cancel_all(self, symbol=None):
+        """Отмена всех открытых ордеров (по символу, если задан) одним запросом"""
+        response = self._request("cancel", self._delete_order_all, symbol)
+        return self._notify_canceled(self.api.parse_orders(response))
 
-    def ws_market_with_depth(self, symbol, depth=5):
-        # переписать через heap
-        orderbook = self.wss[symbol].market_depth()
-        sell = sorted(
-            [o for o in orderbook if o["side"] == "Sell"], key=lambda x: -x["price"]
-        )
-        buy = sorted(
-            [o for o in orderbook if o["side"] == "Buy"], key=lambda x: -x["price"]
-        )
-        return sell[-depth:] + buy[:depth]
+    # END ORDERS
 
     def fetch_last_candles(self, symbol, tf, count):
-        symbol = self.convert(symbol)
-        temp_lst = []
-        minute = self.timeframes[tf][1]
-        start = int(time.time()) * 1000 - (count + 1) * minute * 60 * 1000
-        while len(temp_lst) < count + 1:
-            candles = self.api.fetch_ohlcv(
-                symbol, timeframe=tf, since=start, limit=self.limit
-            )
-            temp_lst += candles
-            start += len(candles) * minute * 60 * 1000
-        return temp_lst[:-1]
+        """Последние count закрытых свечей"""
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        now = int(time.time() * 1000)
+        end = now - now % tf_ms  # начало текущей, ещё не закрытой свечи
+        return self._fetch_candles(symbol, tf, end - count * tf_ms, end)
+
+    def fetch_candles_since(self, symbol, tf, since):
+        """
+        Только закрытые свечи начиная с since (мс), для дозагрузки уже имеющегося окна.
+        Незакрытая текущая свеча отбрасывается, как и в fetch_last_candles.
+        """
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        now = int(time.time() * 1000)
+        return self._fetch_candles(symbol, tf, since, now - now % tf_ms)
+
+    def fetch_time_offset(self):
+        """
+        Смещение часов биржи относительно локальных, сек (время биржи - локальное).
+        Если fetch_time не поддерживается, берётся заголовок Date (точность до секунды)
+        ответа на лёгкий запрос последней свечи.
+        """
+        def measure():
+            # время замеряется внутри запроса, без ожидания в очереди
+            started = time.time()
+            try:
+                server = self.api.fetch_time() / 1000
+            except ccxt.NotSupported:
+                self.api.fetch_ohlcv(self.convert("XBTUSD"), timeframe="1m", limit=1)
+                date = (self.api.last_response_headers or {}).get("Date")
+                if not date:
+                    return 0.0
+                server = email.utils.parsedate_to_datetime(date).timestamp()
+            return server - (started + time.time()) / 2
+
+        return self._request("read", measure, key=("time_offset",))
 
     def fetch_markets(self):
-        return [r["symbol"] for r in self.api.publicGetInstrumentActive()]
+        return [r["symbol"] for r in self._request("read", self.api.publicGetInstrumentActive, key=("markets",))]
 
     def check_filled(self, order_id, symbol):
         """
@@ -229,26 +434,71 @@ class Bitmex:
             print(f"  [*] filled: {order['filled']} remaining: {order['remaining']}")"""
 
     # PRIVATE
-    def _get_balance(self):
-        if self.wss:
-            ws = next(iter(self.wss.values()))
-            if ws.ws.sock.connected:
-                funds = ws.funds()
-                return funds
+    def _post_order_bulk(self, requests):
+        self.api.load_markets()
+        return self.api.privatePostOrderBulk({"orders": [self._bulk_order(r) for r in requests]})
+
+    def _delete_order_all(self, symbol):
+        params = {}
+        if symbol:
+            self.api.load_markets()
+            params["symbol"] = self.api.market_id(self.convert(symbol))
+        return self.api.privateDeleteOrderAll(params)
+
+    def _fetch_candles(self, symbol, tf, start, end):
+        """Свечи со start <= timestamp < end: из локального кэша, если он включён"""
+        symbol = self.convert(symbol)
+        if self.cache is None:
+            return self._fetch_range(symbol, tf, start, end)
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        return to_rows(self.cache.fetch(symbol, tf, start, end, tf_ms, self._fetch_range))
 
-    def _price_for_non_price_order(self, symbol, side):
-        ws = self.wss[symbol]
-        price = None
-        if ws.ws.sock.connected:
-            if side == "buy":
-                price = self.ws_market_with_depth(ws, 1)[1]["price"]
-            if side == "sell":
-                price = self.ws_market_with_depth(ws, 1)[0]["price"]
-        return price
+    def _fetch_range(self, symbol, tf, start, end):
+        """
+        Страницы по self.limit свечей: since каждой известен заранее, поэтому они
+        запрашиваются параллельно (не больше fetch_concurrency одновременно)
+        и склеиваются по порядку с проверкой дублей и пропусков.
+        """
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        page_ms = self.limit * tf_ms
+        bounds = [(since, min(since + page_ms, end)) for since in range(start, end, page_ms)]
+        if len(bounds) > 1 and self.fetch_concurrency > 1:
+            if self._page_pool is None or self._page_pool_size != self.fetch_concurrency:
+                # fetch_concurrency поменяли после первой загрузки - пул пересоздаётся
+                if self._page_pool is not None:
+                    self._page_pool.shutdown(wait=False)
+                self._page_pool = ThreadPoolExecutor(self.fetch_concurrency, thread_name_prefix="bitmex-pages")
+                self._page_pool_size = self.fetch_concurrency
+            pages = list(self._page_pool.map(lambda b: self._fetch_page(symbol, tf, *b), bounds))
+        else:
+            pages = [self._fetch_page(symbol, tf, *b) for b in bounds]
+        rows, duplicates, missing = _stitch_pages(pages, tf_ms, start)
+        self.last_fetch_stats = {"pages": len(pages), "duplicates": duplicates, "missing": missing}
+        if duplicates or missing:
+            logger.warning("%s %s: %s duplicate and %s missing candles in [%s, %s)",
+                           symbol, tf, duplicates, missing, start, end)
+        return rows
+
+    def _fetch_page(self, symbol, tf, start, end):
+        # если биржа отдала страницу короче limit, дозапрашиваем остаток
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        temp_lst = []
+        while start < end:
+            candles = self._request(
+                "read", self.api.fetch_ohlcv, symbol, timeframe=tf, since=start, limit=self.limit,
+                key=("ohlcv", symbol, tf, start, self.limit),
+            )
+            if not candles:
+                break
+            temp_lst += candles
+            if candles[-1][0] + tf_ms <= start:
+                break
+            start = candles[-1][0] + tf_ms
+        return [c for c in temp_lst if c[0] < end]
 
     def _check_order(self, order_id, symbol):
         try:
-            order = self.api.fetch_order(id=order_id, symbol=symbol)
+            order = self._request("read", self.api.fetch_order, id=order_id, symbol=symbol, key=("order", order_id))
         # здесь должен быть ccxt.base.errors.OrderNotFound
         except ccxt.OrderNotFound:
             print("Order not found")
@@ -0,0 +1,238 @@
+import asyncio
+import email.utils
+import threading
+import time
+import aiohttp
+import ccxt
+import ccxt.async_support as ccxt_async
+from connectors.bitmex.bitmex import BitmexBase, load_keys, logger, round_, _stitch_pages
+from connectors.ohlcv_cache import to_rows
+
+
+class AsyncBitmex(BitmexBase):
+    """
+    Асинхронный вариант коннектора на ccxt.async_support с тем же набором
+    публичных методов (сетевые методы - корутины). Все запросы идут через одну
+    keep-alive сессию aiohttp, поэтому сотни одновременных запросов из одного
+    event loop не требуют потока на вызов.
+
+    Синхронными остаются только методы из SYNC_METHODS - они из BitmexBase
+    и не обращаются к REST API (стакан websocket, обработчики вызовов).
+    Синхронных сетевых путей Bitmex здесь нет. Файлы кэша свечей читаются
+    и пишутся в пуле потоков loop.
+
+    Запросы идут через ту же очередь RequestScheduler (self.requests.acall),
+    что и у Bitmex: приоритет ордеров, объединение одинаковых чтений, лимиты
+    биржи. Встроенный ограничитель ccxt (enableRateLimit) выключен.
+    """
+
+    # максимум одновременных соединений в сессии
+    CONNECTIONS = 100
+    SYNC_METHODS = frozenset((
+        "define_api", "add_ws", "register_call_handler", "notify_call_handlers", "ws_exit",
+        "ws_get_balance", "convert", "on_orderbook_message", "ws_market_with_depth",
+    ))
+
+    def __init__(self):
+        self._session = None
+        super().__init__()
+
+    def define_api(self):
+        keys = load_keys() or {}
+        self.api = ccxt_async.bitmex(
+            {"apiKey": keys.get("api_key"), "secret": keys.get("secret"), "enableRateLimit": False}
+        )
+        if self.test:
+            if 'test' in self.api.urls:
+                self.api.urls['api'] = self.api.urls['test']
+
+    async def _call(self, kind, method, *args, key=None, **kwargs):
+        """await self.api.method(*args, **kwargs) через очередь запросов; kind - order, cancel или read"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.CONNECTIONS, keepalive_timeout=60, enable_cleanup_closed=True)
+            )
+            self.api.session = self._session
+        return await self.requests.acall(kind, getattr(self.api, method), *args, key=key, **kwargs)
+
+    async def close(self):
+        await self.api.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # ORDERS
+    async def create_order(self, symbol, order_type, side, amount, price=None, params=None):
+        request = self._order_request(symbol, order_type, side, amount, price, params)
+        order = await self._call("order", "create_order", **request)
+        self.notify_call_handlers("create_order", dict(symbol=request["symbol"], order_type=order_type, side=side, amount=amount), order)
+        return order
+
+    async def create_market_order(self, symbol, side, amount):
+        return await self.create_order(symbol, "Market", side, amount)
+
+    async def create_stoplimit_order(self, symbol, side, amount, price, stopPx):
+        return await self.create_order(symbol, "StopLimit", side, amount, price, {"stopPx": round_(stopPx)})
+
+    async def create_takeprofitlimit_order(self, symbol, side, amount, price, stopPx):
+        return await self.create_order(symbol, "LimitIfTouched", side, amount, price, {"stopPx": round_(stopPx)})
+
+    async def create_stop_order(self, symbol, side, amount, stopPx):
+        return await self.create_order(symbol, "Stop", side, amount, None, {"stopPx": round_(stopPx)})
+
+    async def create_limit_order(self, symbol, side, amount, price=None):
+        if not price:
+            price = self._price_for_non_price_order(symbol, side)
+        return await self.create_order(symbol, "Limit", side, amount, price)
+
+    async def cancel_order(self, id, symbol):
+        symbol = self.convert(symbol)
+        result = await self._call("cancel", "cancel_order", id, symbol)
+        self.notify_call_handlers("cancel_order", dict(id=id, symbol=symbol), result)
+        return result
+
+    async def create_orders(self, orders):
+        requests = [self._order_request(**order) for order in orders]
+        await self._call("read", "load_markets")
+        response = await self._call("order", "privatePostOrderBulk", {"orders": [self._bulk_order(r) for r in requests]})
+        created = self.api.parse_orders(response)
+        for order, request, result in zip(orders, requests, created):
+            self.notify_call_handlers("create_order", dict(symbol=request["symbol"], order_type=order["order_type"], side=order["side"], amount=order["amount"]), result)
+        return created
+
+    async def cancel_orders(self, ids):
+        response = await self._call("cancel", "privateDeleteOrder", {"orderID": list(ids)})
+        return self._notify_canceled(self.api.parse_orders(response))
+
+    async def cancel_all(self, symbol=None):
+        params = {}
+        if symbol:
+            await self._call("read", "load_markets")
+            params["symbol"] = self.api.market_id(self.convert(symbol))
+        response = await self._call("cancel", "privateDeleteOrderAll", params)
+        return self._notify_canceled(self.api.parse_orders(response))
+
+    # END ORDERS
+
+    async def fetch_last_candles(self, symbol, tf, count):
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        now = int(time.time() * 1000)
+        end = now - now % tf_ms
+        return await self._fetch_candles(symbol, tf, end - count * tf_ms, end)
+
+    async def fetch_candles_since(self, symbol, tf, since):
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        now = int(time.time() * 1000)
+        return await self._fetch_candles(symbol, tf, since, now - now % tf_ms)
+
+    async def fetch_time_offset(self):
+        started = time.time()
+        try:
+            server = await self._call("read", "fetch_time") / 1000
+        except ccxt.NotSupported:
+            await self._call("read", "fetch_ohlcv", self.convert("XBTUSD"), timeframe="1m", limit=1)
+            date = (self.api.last_response_headers or {}).get("Date")
+            if not date:
+                return 0.0
+            server = email.utils.parsedate_to_datetime(date).timestamp()
+        return server - (started + time.time()) / 2
+
+    async def fetch_markets(self):
+        return [r["symbol"] for r in await self._call("read", "publicGetInstrumentActive", key=("markets",))]
+
+    async def check_filled(self, order_id, symbol):
+        order = await self._check_order(order_id, self.convert(symbol))
+        if not order:
+            return None
+        return {
+            "status": order["status"],
+            "filled": order["filled"],
+            "remaining": order["remaining"],
+        }
+
+    # PRIVATE
+    async def _fetch_candles(self, symbol, tf, start, end):
+        symbol = self.convert(symbol)
+        if self.cache is None:
+            return await self._fetch_range(symbol, tf, start, end)
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        loop = asyncio.get_running_loop()
+        # файлы кэша (mmap, запись, блокировка) - в пуле потоков, не в event loop
+        replace = await loop.run_in_executor(None, self.cache.stale, symbol, tf, start, end, tf_ms)
+        for since, until in await loop.run_in_executor(None, self.cache.missing, symbol, tf, start, end, tf_ms):
+            rows = await self._fetch_range(symbol, tf, since, until)
+            await loop.run_in_executor(None, self.cache.write, symbol, tf, rows, replace, since, until)
+        return await loop.run_in_executor(None, lambda: to_rows(self.cache.read(symbol, tf, start, end)))
+
+    async def _fetch_range(self, symbol, tf, start, end):
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        page_ms = self.limit * tf_ms
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+
+        async def page(since):
+            async with semaphore:
+                return await self._fetch_page(symbol, tf, since, min(since + page_ms, end))
+
+        pages = await asyncio.gather(*(page(since) for since in range(start, end, page_ms)))
+        rows, duplicates, missing = _stitch_pages(pages, tf_ms, start)
+        self.last_fetch_stats = {"pages": len(pages), "duplicates": duplicates, "missing": missing}
+        if duplicates or missing:
+            logger.warning("%s %s: %s duplicate and %s missing candles in [%s, %s)",
+                           symbol, tf, duplicates, missing, start, end)
+        return rows
+
+    async def _fetch_page(self, symbol, tf, start, end):
+        tf_ms = self.timeframes[tf][1] * 60 * 1000
+        temp_lst = []
+        while start < end:
+            candles = await self._call("read", "fetch_ohlcv", symbol, timeframe=tf, since=start, limit=self.limit,
+                                       key=("ohlcv", symbol, tf, start, self.limit))
+            if not candles:
+                break
+            temp_lst += candles
+            if candles[-1][0] + tf_ms <= start:
+                break
+            start = candles[-1][0] + tf_ms
+        return [c for c in temp_lst if c[0] < end]
+
+    async def _check_order(self, order_id, symbol):
+        try:
+            return await self._call("read", "fetch_order", id=order_id, symbol=symbol, key=("order", order_id))
+        except ccxt.OrderNotFound:
+            logger.warning("order %s not found", order_id)
+            return None
+
+
+class BitmexSync:
+    """
+    Синхронный фасад над AsyncBitmex для Executor и стратегий: event loop живёт
+    в отдельном потоке, корутины коннектора выполняются в нём, а вызывающий поток
+    ждёт результат. Несетевые атрибуты (timeframes, register_call_handler, ...)
+    отдаются как есть.
+    """
+
+    def __init__(self, connector=None):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="bitmex-async", daemon=True)
+        self._thread.start()
+        self.connector = connector or self._run(self._create())
+
+    @staticmethod
+    async def _create():
+        # aiohttp-сессия должна создаваться внутри loop
+        return AsyncBitmex()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def __getattr__(self, name):
+        attr = getattr(self.connector, name)
+        if asyncio.iscoroutinefunction(attr):
+            def call(*args, **kwargs):
+                return self._run(attr(*args, **kwargs))
+            return call
+        return attr
+
+    def close(self):
+        self._run(self.connector.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,96 @@
+from bisect import bisect_left, insort
+
+
+class OrderBookL2:
+    """
+    Стакан orderBookL2 одного символа, обновляемый сообщениями websocket
+    (partial/insert/update/delete) без полной пересортировки.
+
+    Уровни хранятся по id (как их присылает BitMEX), цены каждой стороны -
+    в отсортированном списке, поэтому лучшая цена берётся за O(1), а k лучших
+    уровней за O(k). Уровни - словари в формате BitMEX (id, side, size, price).
+    """
+
+    def __init__(self):
+        self.levels = {}
+        # цены по возрастанию и уровень на каждой цене
+        self._prices = {"Buy": [], "Sell": []}
+        self._by_price = {"Buy": {}, "Sell": {}}
+
+    def __len__(self):
+        return len(self.levels)
+
+    def clear(self):
+        self.levels.clear()
+        for side in ("Buy", "Sell"):
+            self._prices[side].clear()
+            self._by_price[side].clear()
+
+    def apply(self, action, data):
+        if action == "partial":
+            self.clear()
+            for level in data:
+                self.levels[level["id"]] = level
+                self._by_price[level["side"]][level["price"]] = level
+            for side in ("Buy", "Sell"):
+                self._prices[side] = sorted(self._by_price[side])
+        elif action == "insert":
+            for level in data:
+                self._insert(dict(level))
+        elif action == "update":
+            for update in data:
+                level = self.levels.get(update["id"])
+                if level is None:
+                    continue
+                if "price" in update and update["price"] != level["price"]:
+                    self._remove(level)
+                    level.update(update)
+                    self._insert(level)
+                else:
+                    level.update(update)
+        elif action == "delete":
+            for delete in data:
+                level = self.levels.get(delete["id"])
+                if level is not None:
+                    self._remove(level)
+        else:
+            raise ValueError("Unknown action: %s" % action)
+
+    def _insert(self, level):
+        old = self.levels.get(level["id"])
+        if old is not None:
+            self._remove(old)
+        side, price = level["side"], level["price"]
+        self.levels[level["id"]] = level
+        if price not in self._by_price[side]:
+            insort(self._prices[side], price)
+        self._by_price[side][price] = level
+
+    def _remove(self, level):
+        side, price = level["side"], level["price"]
+        del self.levels[level["id"]]
+        if self._by_price[side].get(price) is level:
+            del self._by_price[side][price]
+            prices = self._prices[side]
+            del prices[bisect_left(prices, price)]
+
+    @property
+    def best_bid(self):
+        prices = self._prices["Buy"]
+        return self._by_price["Buy"][prices[-1]] if prices else None
+
+    @property
+    def best_ask(self):
+        prices = self._prices["Sell"]
+        return self._by_price["Sell"][prices[0]] if prices else None
+
+    def bids(self, depth):
+        """depth лучших заявок на покупку, от лучшей (самой дорогой)"""
+        by_price = self._by_price["Buy"]
+        prices = self._prices["Buy"]
+        return [by_price[p] for p in reversed(prices[-depth:])] if depth else []
+
+    def asks(self, depth):
+        """depth лучших заявок на продажу, от лучшей (самой дешёвой)"""
+        by_price = self._by_price["Sell"]
+        return [by_price[p] for p in self._prices["Sell"][:depth]]
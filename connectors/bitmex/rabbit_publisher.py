@@ -0,0 +1,211 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+import pika
+
+
+class RabbitPublisher:
+    """
+    Публикация сообщений в RabbitMQ в отдельном потоке.
+
+    publish() только кладёт сообщение в ограниченную очередь и не ждёт брокера,
+    поэтому медленный брокер не тормозит чтение websocket. Поток публикации
+    забирает сообщения пачками до batch_size, при confirm включает publisher
+    confirms канала. При потере связи пачка не выбрасывается: поток
+    переподключается с нарастающей паузой и публикует её заново.
+
+    Если очередь полна, publish() ждёт до put_timeout (backpressure_waits),
+    затем сообщение отбрасывается (dropped). Счётчики - в stats, задержка от
+    publish() до отправки брокеру - в latency (последняя, средняя, максимальная).
+
+    Любая ошибка при подключении или публикации (не только AMQPError, но и
+    OSError сокета) не останавливает поток: он переподключается и повторяет
+    пачку. Сообщение, которое нельзя сериализовать в JSON, повторять
+    бесполезно - оно откладывается в rejected (последние MAX_REJECTED)
+    и считается в stats["rejected"].
+
+    stop() ждёт отправки очереди не дольше timeout, затем поток бросает
+    оставшиеся сообщения. Соединение pika (BlockingConnection не потокобезопасен)
+    закрывает только сам поток публикации, выходя из цикла.
+    """
+
+    RECONNECT_DELAY = 0.5
+    MAX_RECONNECT_DELAY = 10
+    MAX_REJECTED = 100
+    CONNECTION_ERRORS = (pika.exceptions.AMQPError, OSError)
+
+    def __init__(self, conf, max_queue=10000, batch_size=100, confirm=False, put_timeout=0.05,
+                 connection_factory=None):
+        self.conf = conf
+        self.batch_size = batch_size
+        self.confirm = confirm
+        self.put_timeout = put_timeout
+        self.connection_factory = connection_factory or (
+            lambda: pika.BlockingConnection(pika.ConnectionParameters(conf["host"]))
+        )
+        self.logger = logging.getLogger(__name__)
+        self.queue = queue.Queue(max_queue)
+        self.stats = {
+            "queued": 0,
+            "published": 0,
+            "batches": 0,
+            "backpressure_waits": 0,
+            "dropped": 0,
+            "reconnects": 0,
+            "errors": 0,
+            "rejected": 0,
+        }
+        self._stats_lock = threading.Lock()
+        self.rejected = deque(maxlen=self.MAX_REJECTED)
+        self.latency = {"last": None, "mean": None, "max": None}
+        self._latency_sum = 0.0
+        self._connection = None
+        self._channel = None
+        self._thread = None
+        self._abort = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="rabbit-publisher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Останавливает поток, предварительно дождавшись публикации очереди (не дольше timeout)"""
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            self._abort.set()
+        if self._thread is None:
+            self._close()
+            return
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            # поток сам закроет соединение, как только вернётся в цикл
+            self._abort.set()
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def _count(self, name, n=1):
+        # publish() вызывается из потока websocket, остальное - из потока публикации
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def publish(self, msg):
+        item = (time.perf_counter(), msg)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self._count("backpressure_waits")
+            try:
+                self.queue.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("queued")
+        return True
+
+    def _connect(self):
+        connection = self.connection_factory()
+        channel = connection.channel()
+        channel.exchange_declare(exchange=self.conf["exchange"], exchange_type="fanout")
+        channel.queue_declare(queue=self.conf["queue"])
+        if self.confirm:
+            channel.confirm_delivery()
+        self._connection = connection
+        self._channel = channel
+
+    def _close(self):
+        connection, self._connection, self._channel = self._connection, None, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _next_batch(self):
+        item = self.queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _serialize(self, batch):
+        """[(enqueued, body)]; несериализуемые сообщения уходят в rejected"""
+        serialized = []
+        for enqueued, msg in batch:
+            try:
+                serialized.append((enqueued, json.dumps(msg)))
+            except (TypeError, ValueError) as e:
+                self._count("rejected")
+                self.rejected.append(msg)
+                self.logger.error("rabbit message rejected: %r", e)
+        return serialized
+
+    def _publish_batch(self, batch):
+        properties = pika.BasicProperties(content_type="application/json")
+        for enqueued, body in batch:
+            self._channel.basic_publish(
+                exchange=self.conf["exchange"],
+                routing_key=self.conf["routing_key"],
+                body=body,
+                properties=properties,
+            )
+        now = time.perf_counter()
+        for enqueued, _ in batch:
+            latency = now - enqueued
+            self._latency_sum += latency
+            if self.latency["max"] is None or latency > self.latency["max"]:
+                self.latency["max"] = latency
+        with self._stats_lock:
+            self.stats["published"] += len(batch)
+            self.stats["batches"] += 1
+            published = self.stats["published"]
+        self.latency["last"] = now - batch[-1][0]
+        self.latency["mean"] = self._latency_sum / published
+
+    def _loop(self):
+        try:
+            self._publish_loop()
+        finally:
+            self._close()
+
+    def _publish_loop(self):
+        delay = self.RECONNECT_DELAY
+        while not self._abort.is_set():
+            batch = self._next_batch()
+            if batch is None:
+                break
+            batch = self._serialize(batch)
+            while batch and not self._abort.is_set():
+                try:
+                    if self._channel is None:
+                        self._connect()
+                    self._publish_batch(batch)
+                    delay = self.RECONNECT_DELAY
+                    break
+                except Exception as e:
+                    # с confirm пачка могла уйти частично - повтор даст дубли, но не потери
+                    self._count("errors")
+                    self._count("reconnects")
+                    if isinstance(e, self.CONNECTION_ERRORS):
+                        self.logger.error("rabbit publish failed: %r, reconnecting in %ss", e, delay)
+                    else:
+                        self.logger.exception("rabbit publish failed, reconnecting in %ss", delay)
+                    self._close()
+                    self._abort.wait(delay)
+                    delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
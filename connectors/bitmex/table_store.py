@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+
+class TableStore:
+    """
+    Таблица BitMEX websocket (order, position, trade, ...): строки в словаре
+    по кортежу значений ключевых полей (keys приходят в partial), поэтому
+    insert/update/delete - O(1) вместо поиска по списку.
+
+    Порядок вставки сохраняется. При max_len таблица ограничивается
+    последними max_len строками (старые вытесняются по одной).
+    """
+
+    def __init__(self, name, keys=None, max_len=None):
+        self.name = name
+        self.keys = list(keys or [])
+        self.max_len = max_len
+        self._rows = OrderedDict()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows.values())
+
+    def values(self):
+        return list(self._rows.values())
+
+    def key(self, row):
+        return tuple(row[k] for k in self.keys)
+
+    def get(self, match):
+        """Строка с теми же значениями ключевых полей, что у match, или None"""
+        return self._rows.get(self.key(match))
+
+    def partial(self, data, keys=None):
+        if keys is not None:
+            self.keys = list(keys)
+        self.insert(data)
+
+    def insert(self, data):
+        for row in data:
+            self._rows[self.key(row)] = row
+        if self.max_len is not None:
+            while len(self._rows) > self.max_len:
+                self._rows.popitem(last=False)
+
+    def update(self, data):
+        """Обновлённые строки; строки, которых ещё нет (до partial), пропускаются"""
+        updated = []
+        for match in data:
+            row = self._rows.get(self.key(match))
+            if row is None:
+                continue
+            row.update(match)
+            updated.append(row)
+        return updated
+
+    def delete(self, data):
+        deleted = []
+        for match in data:
+            row = self._rows.pop(self.key(match), None)
+            if row is not None:
+                deleted.append(row)
+        return deleted
+
+    def remove(self, row):
+        self._rows.pop(self.key(row), None)
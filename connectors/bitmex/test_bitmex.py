@@ -1,78 +1,92 @@
 import pytest
 import time
-from exp2 import bitmex, timeframes
-import pandas as pd
-import numpy as np
+from benchmarks.fake_exchange import OfflineBitmex, TF_MS
 
 
-def test_len_of_warm_up_deq_greater_limit():
+@pytest.fixture
+def bitmex():
+    return OfflineBitmex()
+
+
+def test_len_of_warm_up_deq_greater_limit(bitmex):
     assert len(bitmex.fetch_last_candles("XBTUSD", "5m", 1380)) == 1380
+    assert bitmex.last_fetch_stats == {"pages": 3, "duplicates": 0, "missing": 0}
 
 
-def test_numpy_mean_std():
-    a = bitmex.fetch_last_candles("XBTUSD", "5m", 1380)
-    btc_data = list(map(lambda x: x[4], a))
-    btc_data1 = pd.DataFrame(
-        list(a), columns=["timestamp", "open", "high", "low", "close", "volume"]
-    )
-    assert btc_data1["close"].mean() == np.mean(btc_data)
-    assert btc_data1["close"].std(ddof=0) == np.std(btc_data)
+def test_pages_are_stitched_without_gaps(bitmex):
+    candles = bitmex.fetch_last_candles("XBTUSD", "5m", 1380)
+    steps = {b[0] - a[0] for a, b in zip(candles, candles[1:])}
+    assert steps == {TF_MS["5m"]}
+    assert OfflineBitmex().fetch_last_candles("XBTUSD", "5m", 1380) == candles
 
 
-def test_len_of_warm_up_deq():
-    assert len(bitmex.fetch_last_candles("XBTUSD", "5m", 380)) == 380
+def test_gap_before_first_candle_is_missing(bitmex):
+    # по одной странице, чтобы первой запрашивалась первая
+    bitmex.fetch_concurrency = 1
+    fetch_ohlcv = bitmex.api.fetch_ohlcv
+    cutoff = []
 
+    def late_listing(symbol, timeframe="1m", since=None, limit=500):
+        if not cutoff:
+            # первые 10 свечей диапазона биржа не отдаёт (инструмент ещё не торговался)
+            cutoff.append(since + 10 * TF_MS[timeframe])
+        return [c for c in fetch_ohlcv(symbol, timeframe, since, limit) if c[0] >= cutoff[0]]
 
-def test_actual_last_candle_in_warm_up_deq_greater_limit():
-    tf = "5m"
-    last_candle = bitmex.fetch_last_candles("XBTUSD", tf, 505)[-1]
-    tf = timeframes[tf][1]
-    assert time.time() - last_candle[0] < tf * 60 * 1000
+    bitmex.api.fetch_ohlcv = late_listing
+    assert len(bitmex.fetch_last_candles("XBTUSD", "5m", 1380)) == 1370
+    assert bitmex.last_fetch_stats == {"pages": 3, "duplicates": 0, "missing": 10}
 
 
-def test_actual_last_candle_in_warm_up_deq():
-    tf = "5m"
-    last_candle = bitmex.fetch_last_candles("XBTUSD", tf, 35)[-1]
-    tf = timeframes[tf][1]
-    assert time.time() - last_candle[0] < tf * 60 * 1000
+def test_page_pool_follows_fetch_concurrency(bitmex):
+    bitmex.fetch_last_candles("XBTUSD", "5m", 1380)
+    pool = bitmex._page_pool
+    bitmex.fetch_concurrency = 2
+    assert len(bitmex.fetch_last_candles("XBTUSD", "5m", 1380)) == 1380
+    assert bitmex._page_pool is not pool and bitmex._page_pool._max_workers == 2
+
+
+def test_len_of_warm_up_deq(bitmex):
+    assert len(bitmex.fetch_last_candles("XBTUSD", "5m", 380)) == 380
 
 
-def test_actual_last_candle():
-    tf = "5m"
-    last_candle = bitmex.fetch_last_candles("XBTUSD", tf, 1)[-1]
-    tf = timeframes[tf][1]
-    assert time.time() - last_candle[0] < tf * 60 * 1000
+@pytest.mark.parametrize("count", [505, 35, 1])
+def test_actual_last_candle(bitmex, count):
+    tf_ms = TF_MS["5m"]
+    last_candle = bitmex.fetch_last_candles("XBTUSD", "5m", count)[-1]
+    # последняя закрытая свеча: начало не раньше двух периодов назад, сама уже закрыта
+    assert 0 < time.time() * 1000 - last_candle[0] < 2 * tf_ms
+    assert last_candle[0] + tf_ms <= time.time() * 1000
 
 
-def test_market_order_create():
+def test_market_order_create(bitmex):
     order = bitmex.create_market_order("XBTUSD", "buy", 2)
     bitmex.create_market_order("XBTUSD", "sell", 2)
     assert order["type"] == "market"
     assert order["amount"] == 2.0
 
 
-def test_limit_order_create():
+def test_limit_order_create(bitmex):
     order = bitmex.create_limit_order("XBTUSD", "buy", 2, 1000)
     bitmex.api.cancel_order(order["id"], "XBTUSD")
     assert order["type"] == "limit"
     assert order["amount"] == 2.0
 
 
-def test_takeptofitlimit_order_create():
+def test_takeptofitlimit_order_create(bitmex):
     order = bitmex.create_takeprofitlimit_order("XBTUSD", "sell", 2, 20000, 19000)
     bitmex.api.cancel_order(order["id"], "XBTUSD")
     assert order["type"] == "limitiftouched"
     assert order["amount"] == 2.0
 
 
-def test_stoplimit_order_create():
+def test_stoplimit_order_create(bitmex):
     order = bitmex.create_stoplimit_order("XBTUSD", "buy", 2, 20000, 21000)
     bitmex.api.cancel_order(order["id"], "XBTUSD")
     assert order["type"] == "stoplimit"
     assert order["amount"] == 2.0
 
 
-def test_check_filled():
+def test_check_filled(bitmex):
     order = bitmex.create_stoplimit_order("XBTUSD", "buy", 2, 20000, 21000)
     status = bitmex.check_filled(order["id"], "XBTUSD")
     bitmex.api.cancel_order(order["id"], "XBTUSD")
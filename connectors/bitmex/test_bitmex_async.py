@@ -0,0 +1,114 @@
+import asyncio
+import inspect
+import threading
+import time
+from connectors.ohlcv_cache import OHLCVCache
+from connectors.bitmex.bitmex import Bitmex
+from connectors.bitmex.bitmex_async import AsyncBitmex, BitmexSync
+
+TF_MS = 60000
+
+
+class _AsyncCcxt:
+    """ccxt.async_support: все сетевые методы - корутины"""
+
+    def __init__(self):
+        self.calls = []
+        self.session = None
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=500):
+        self.calls.append("fetch_ohlcv")
+        await asyncio.sleep(0)
+        last = int(time.time() * 1000) // TF_MS
+        first = -(-since // TF_MS)
+        return [[i * TF_MS, 1.0, 2.0, 0.5, 1.5, 10.0] for i in range(first, min(first + limit, last + 1))]
+
+    async def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self.calls.append("create_order")
+        return {"id": "1", "symbol": symbol, "type": type.lower(), "side": side, "amount": float(amount)}
+
+    async def fetch_order(self, id, symbol=None):
+        self.calls.append("fetch_order")
+        return {"status": "open", "filled": 0.0, "remaining": 2.0}
+
+    async def close(self):
+        pass
+
+
+class _Connector(AsyncBitmex):
+    CACHE_DIR = None
+
+    def define_api(self):
+        self.api = _AsyncCcxt()
+
+
+def test_inherited_methods_are_coroutines_or_offline():
+    for name, attr in inspect.getmembers(AsyncBitmex, inspect.isfunction):
+        if name.startswith("_") or name in AsyncBitmex.SYNC_METHODS:
+            continue
+        assert inspect.iscoroutinefunction(attr), name
+    # синхронные сетевые пути Bitmex не наследуются
+    assert not issubclass(AsyncBitmex, Bitmex)
+    assert not any(hasattr(AsyncBitmex, name) for name in ("_request", "_post_order_bulk", "_delete_order_all"))
+
+
+def test_candles_and_orders_on_the_event_loop():
+    async def main():
+        connector = _Connector()
+        connector.limit = 100
+        candles = await connector.fetch_last_candles("XBTUSD", "1m", 350)
+        order = await connector.create_market_order("XBTUSD", "buy", 2)
+        status = await connector.check_filled(order["id"], "XBTUSD")
+        await connector.close()
+        return connector, candles, order, status
+
+    connector, candles, order, status = asyncio.run(main())
+    assert len(candles) == 350
+    assert {b[0] - a[0] for a, b in zip(candles, candles[1:])} == {TF_MS}
+    assert connector.last_fetch_stats == {"pages": 4, "duplicates": 0, "missing": 0}
+    assert order["type"] == "market" and status["remaining"] == 2.0
+    # все запросы прошли через очередь RequestScheduler
+    assert connector.requests.executed == len(connector.api.calls) == 6
+
+
+def test_orderbook_quotes_without_rest(monkeypatch):
+    connector = _Connector()
+    connector.on_orderbook_message("XBTUSD", {"action": "partial", "data": [
+        {"id": 1, "side": "Buy", "price": 9000.0, "size": 1}, {"id": 2, "side": "Sell", "price": 9001.0, "size": 1},
+    ]})
+    assert [l["price"] for l in connector.ws_market_with_depth("XBTUSD", 1)] == [9001.0, 9000.0]
+    assert connector._price_for_non_price_order("XBTUSD", "sell") == 9001.0
+    assert connector.api.calls == []
+
+
+def test_cache_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(_Connector, "CACHE_DIR", str(tmp_path))
+    io_threads = []
+    read = OHLCVCache.read
+
+    def spy(self, *args):
+        io_threads.append(threading.current_thread())
+        return read(self, *args)
+
+    monkeypatch.setattr(OHLCVCache, "read", spy)
+
+    async def main():
+        connector = _Connector()
+        candles = await connector.fetch_last_candles("XBTUSD", "1m", 30)
+        await connector.close()
+        return candles
+
+    candles = asyncio.run(main())
+    assert len(candles) == 30
+    # asyncio.run крутит loop в текущем потоке, файлы кэша - в пуле
+    assert io_threads and threading.current_thread() not in io_threads
+
+
+def test_sync_facade_runs_coroutines_on_its_loop():
+    facade = BitmexSync(_Connector())
+    try:
+        candles = facade.fetch_last_candles("XBTUSD", "1m", 20)
+        assert len(candles) == 20 and isinstance(candles, list)
+        assert facade.convert("XBTUSD") == "BTC/USD"
+    finally:
+        facade.close()
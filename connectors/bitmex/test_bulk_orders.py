@@ -0,0 +1,59 @@
+from connectors.bitmex.bitmex import Bitmex
+
+
+class _Api:
+    def __init__(self):
+        self.calls = []
+
+    def load_markets(self):
+        pass
+
+    def market_id(self, symbol):
+        return {"BTC/USD": "XBTUSD"}[symbol]
+
+    def parse_orders(self, response):
+        return [{"id": o.get("orderID", str(i)), "symbol": "BTC/USD", "price": o.get("price")} for i, o in enumerate(response)]
+
+    def privatePostOrderBulk(self, params):
+        self.calls.append(("bulk", params))
+        return params["orders"]
+
+    def cancel_order(self, id, symbol):
+        self.calls.append(("cancel", id, symbol))
+        return {"id": id, "symbol": symbol, "status": "canceled"}
+
+    def privateDeleteOrder(self, params):
+        self.calls.append(("delete", params))
+        return [{"orderID": id} for id in params["orderID"]]
+
+
+def test_bracket_is_one_request_with_a_notification_per_leg(monkeypatch):
+    monkeypatch.setattr(Bitmex, "CACHE_DIR", None)
+    exchange = Bitmex()
+    exchange.api = _Api()
+    notified = []
+    exchange.register_call_handler(lambda method, params, result: notified.append((method, params.get("order_type"))))
+    exchange.create_orders([
+        dict(symbol="XBTUSD", order_type="Limit", side="buy", amount=10, price=9000.3),
+        dict(symbol="XBTUSD", order_type="Stop", side="sell", amount=10, params={"stopPx": 8900}),
+        dict(symbol="XBTUSD", order_type="LimitIfTouched", side="sell", amount=10, price=9500, params={"stopPx": 9400}),
+    ])
+    assert len(exchange.api.calls) == 1
+    orders = exchange.api.calls[0][1]["orders"]
+    assert orders[0] == {"symbol": "XBTUSD", "side": "Buy", "orderQty": 10, "ordType": "Limit", "price": 9000.5}
+    assert orders[1] == {"symbol": "XBTUSD", "side": "Sell", "orderQty": 10, "ordType": "Stop", "stopPx": 8900}
+    assert notified == [("create_order", "Limit"), ("create_order", "Stop"), ("create_order", "LimitIfTouched")]
+
+    assert [o["id"] for o in exchange.cancel_orders(["a", "b"])] == ["a", "b"]
+    assert exchange.api.calls[-1] == ("delete", {"orderID": ["a", "b"]})
+    assert [n[0] for n in notified[3:]] == ["cancel_order", "cancel_order"]
+
+
+def test_single_cancel_notifies_like_bulk(monkeypatch):
+    monkeypatch.setattr(Bitmex, "CACHE_DIR", None)
+    exchange = Bitmex()
+    exchange.api = _Api()
+    notified = []
+    exchange.register_call_handler(lambda method, params, result: notified.append((method, params)))
+    assert exchange.cancel_order("a", "XBTUSD")["status"] == "canceled"
+    assert notified == [("cancel_order", {"id": "a", "symbol": "BTC/USD"})]
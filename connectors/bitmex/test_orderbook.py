@@ -0,0 +1,97 @@
+import random
+from connectors.bitmex.orderbook import OrderBookL2
+
+
+def _level(i, side, price, size=10):
+    return {"symbol": "XBTUSD", "id": i, "side": side, "price": price, "size": size}
+
+
+def _naive_depth(levels, depth):
+    sell = sorted([o for o in levels if o["side"] == "Sell"], key=lambda x: -x["price"])
+    buy = sorted([o for o in levels if o["side"] == "Buy"], key=lambda x: -x["price"])
+    return sell[-depth:] + buy[:depth]
+
+
+def test_incremental_book_matches_full_sort():
+    rnd = random.Random(3)
+    levels = {i: _level(i, "Buy" if i < 500 else "Sell", 9000 + i * 0.5) for i in range(1000)}
+    book = OrderBookL2()
+    book.apply("partial", [dict(v) for v in levels.values()])
+    next_id = 1000
+    for _ in range(2000):
+        op = rnd.random()
+        if op < 0.4:
+            i = rnd.choice(list(levels))
+            levels[i]["size"] = rnd.randint(1, 100)
+            book.apply("update", [{"id": i, "side": levels[i]["side"], "size": levels[i]["size"]}])
+        elif op < 0.7 and len(levels) > 10:
+            i = rnd.choice(list(levels))
+            level = levels.pop(i)
+            book.apply("delete", [{"id": i, "side": level["side"]}])
+        else:
+            side = rnd.choice(["Buy", "Sell"])
+            price = 9249.75 + rnd.randint(-300, 300) * 0.5 + (-0.25 if side == "Buy" else 0.25)
+            if any(v["price"] == price for v in levels.values()):
+                continue
+            levels[next_id] = _level(next_id, side, price, rnd.randint(1, 100))
+            book.apply("insert", [dict(levels[next_id])])
+            next_id += 1
+        expected = _naive_depth(list(levels.values()), 5)
+        assert book.asks(5)[::-1] + book.bids(5) == expected
+    assert len(book) == len(levels)
+
+
+def test_best_prices_and_empty_book():
+    book = OrderBookL2()
+    assert book.best_bid is None and book.best_ask is None and book.bids(3) == []
+    book.apply("partial", [_level(1, "Buy", 100), _level(2, "Buy", 99), _level(3, "Sell", 101)])
+    assert book.best_bid["price"] == 100 and book.best_ask["price"] == 101
+    book.apply("delete", [{"id": 1, "side": "Buy"}])
+    assert book.best_bid["price"] == 99
+
+
+class _App:
+    def __init__(self):
+        self.messages = []
+
+    def on_message(self, ws, message):
+        self.messages.append(message)
+
+
+class _WS:
+    """BitMEXWebsocket: свой обработчик сообщений и снимок стакана"""
+
+    def __init__(self, levels):
+        self.ws = _App()
+        self.levels = levels
+        self.snapshots = 0
+
+    def market_depth(self):
+        self.snapshots += 1
+        return self.levels
+
+
+def test_ws_market_with_depth_follows_websocket_deltas(monkeypatch):
+    import json
+    from connectors.bitmex.bitmex import Bitmex
+    monkeypatch.setattr(Bitmex, "CACHE_DIR", None)
+    exchange = Bitmex()
+    ws = _WS([_level(1, "Buy", 9000), _level(2, "Buy", 9000.5), _level(3, "Sell", 9001), _level(4, "Sell", 9002)])
+    exchange.wss["XBTUSD"] = ws
+    exchange._attach_orderbook("XBTUSD", ws)
+    assert [l["price"] for l in exchange.ws_market_with_depth("XBTUSD", 1)] == [9001, 9000.5]
+
+    def send(action, data):
+        ws.ws.on_message(None, json.dumps({"table": "orderBookL2", "action": action, "data": data}))
+
+    send("insert", [_level(5, "Buy", 9000.75)])
+    send("delete", [{"symbol": "XBTUSD", "id": 3, "side": "Sell"}])
+    send("update", [{"symbol": "XBTUSD", "id": 4, "side": "Sell", "size": 99}])
+    ws.ws.on_message(None, json.dumps({"table": "trade", "action": "insert", "data": []}))
+    depth = exchange.ws_market_with_depth("XBTUSD", 2)
+    assert [(l["price"], l["size"]) for l in depth] == [(9002, 99), (9000.75, 10), (9000.5, 10)]
+    # снимок берётся один раз при подключении, котировки - из стакана по дельтам
+    assert ws.snapshots == 1
+    # исходный обработчик сокета по-прежнему получает все сообщения
+    assert len(ws.ws.messages) == 4
+    assert exchange._price_for_non_price_order("XBTUSD", "buy") == 9000.75
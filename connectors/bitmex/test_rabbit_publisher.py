@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+import pika
+from connectors.bitmex.rabbit_publisher import RabbitPublisher
+
+CONF = {"host": "localhost", "exchange": "ws_bitmex", "queue": "ws_orders", "routing_key": "ws_orders"}
+
+
+class _Broker:
+    """Соединение pika: первые connect_failures подключений - OSError, publish рвётся раз в fail_every"""
+
+    def __init__(self, connect_failures=0, fail_every=0):
+        self.connect_failures = connect_failures
+        self.fail_every = fail_every
+        self.connections = 0
+        self.attempts = 0
+        self.received = []
+        self.closed_by = []
+
+    def connect(self):
+        self.connections += 1
+        if self.connections <= self.connect_failures:
+            raise OSError("connection refused")
+        return self
+
+    def channel(self):
+        return self
+
+    def close(self):
+        self.closed_by.append(threading.current_thread())
+
+    def exchange_declare(self, exchange, exchange_type):
+        pass
+
+    def queue_declare(self, queue):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.attempts += 1
+        if self.fail_every and self.attempts % self.fail_every == 0:
+            raise pika.exceptions.StreamLostError("connection reset")
+        self.received.append(json.loads(body)["n"])
+
+
+def _publisher(broker, **kwargs):
+    publisher = RabbitPublisher(CONF, connection_factory=broker.connect, **kwargs)
+    publisher.RECONNECT_DELAY = 0.001
+    return publisher.start()
+
+
+def test_reconnects_without_losing_messages():
+    broker = _Broker(connect_failures=2, fail_every=7)
+    publisher = _publisher(broker, batch_size=5)
+    for n in range(100):
+        assert publisher.publish({"n": n})
+    publisher.stop()
+    # повтор пачки после обрыва может дать дубли, но не потери
+    assert sorted(set(broker.received)) == list(range(100))
+    assert publisher.stats["reconnects"] >= 2 + 1
+    assert publisher.stats["published"] >= 100
+
+
+def test_unserializable_message_is_rejected_not_fatal():
+    broker = _Broker()
+    publisher = _publisher(broker)
+    publisher.publish({"n": 0})
+    publisher.publish({"n": 1, "bad": object()})
+    publisher.publish({"n": 2})
+    publisher.stop()
+    assert broker.received == [0, 2]
+    assert publisher.stats["rejected"] == 1
+    assert publisher.rejected[0]["n"] == 1
+    assert not publisher._thread.is_alive()
+
+
+def test_stats_are_consistent_across_threads():
+    broker = _Broker()
+    publisher = _publisher(broker, max_queue=100000)
+
+    def produce(base):
+        for n in range(1000):
+            publisher.publish({"n": base + n})
+
+    threads = [threading.Thread(target=produce, args=(i * 1000,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    publisher.stop()
+    assert publisher.stats["queued"] == publisher.stats["published"] == 4000
+    assert sorted(broker.received) == list(range(4000))
+
+
+def test_stop_is_bounded_when_broker_is_down_and_queue_is_full():
+    broker = _Broker(fail_every=1)
+    publisher = RabbitPublisher(CONF, connection_factory=broker.connect, max_queue=10, put_timeout=0)
+    publisher.RECONNECT_DELAY = publisher.MAX_RECONNECT_DELAY = 0.05
+    publisher.start()
+    while publisher.publish({"n": 0}):
+        pass
+    started = time.monotonic()
+    publisher.stop(timeout=0.2)
+    assert time.monotonic() - started < 1
+    publisher._thread.join(1)
+    assert not publisher._thread.is_alive()
+    # соединение закрывал только поток публикации
+    assert broker.closed_by and threading.current_thread() not in broker.closed_by
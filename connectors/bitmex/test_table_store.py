@@ -0,0 +1,17 @@
+from connectors.bitmex.table_store import TableStore
+
+
+def test_keyed_update_and_delete():
+    store = TableStore("order")
+    store.partial([{"orderID": "a", "leavesQty": 2}, {"orderID": "b", "leavesQty": 3}], ["orderID"])
+    updated = store.update([{"orderID": "x", "leavesQty": 0}, {"orderID": "b", "leavesQty": 1}])
+    assert updated == [{"orderID": "b", "leavesQty": 1}]
+    assert store.delete([{"orderID": "a"}]) == [{"orderID": "a", "leavesQty": 2}]
+    assert store.values() == [{"orderID": "b", "leavesQty": 1}]
+
+
+def test_bounded_retention_keeps_newest_rows():
+    store = TableStore("trade", keys=["id"], max_len=3)
+    store.insert([{"id": i} for i in range(5)])
+    store.insert([{"id": 5}])
+    assert [row["id"] for row in store] == [3, 4, 5]
@@ -0,0 +1,16 @@
+import json
+from connectors.bitmex.table_store import TableStore
+from connectors.bitmex.ws_ingest import WSIngest
+
+
+def test_order_updates_are_published_and_filled_orders_removed():
+    tables = {}
+    ingest = WSIngest(lambda name: tables.setdefault(name, TableStore(name)))
+    partial = {"table": "order", "action": "partial", "keys": ["orderID"],
+               "data": [{"orderID": "a", "leavesQty": 2, "cumQty": 0}, {"orderID": "b", "leavesQty": 3, "cumQty": 0}]}
+    assert len(ingest.feed(json.dumps(partial))) == 2
+    update = {"table": "order", "action": "update",
+              "data": [{"orderID": "a", "price": 1.5}, {"orderID": "b", "leavesQty": 0, "cumQty": 3}]}
+    assert ingest.feed(json.dumps(update)) == [{"orderID": "b", "leavesQty": 0, "cumQty": 3}]
+    assert tables["order"].values() == [{"orderID": "a", "leavesQty": 2, "cumQty": 0, "price": 1.5}]
+    assert ingest.feed(json.dumps({"subscribe": "order", "success": True})) == []
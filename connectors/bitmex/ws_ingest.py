@@ -0,0 +1,104 @@
+import json
+import logging
+
+try:
+    import orjson
+
+    loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    try:
+        import ujson
+
+        loads = ujson.loads
+        JSON_BACKEND = "ujson"
+    except ImportError:
+        loads = json.loads
+        JSON_BACKEND = "json"
+
+
+# изменения этих полей ордера отправляются дальше (в RabbitMQ)
+ORDER_FIELDS = ("ordStatus", "cumQty", "leavesQty")
+
+
+class WSIngest:
+    """
+    Разбор сообщений BitMEX websocket: декодирование самым быстрым доступным
+    JSON (orjson, ujson, json) и применение к таблицам через заранее
+    построенную таблицу обработчиков по (table, action).
+
+    table - функция имя -> TableStore. feed(raw) возвращает строки ордеров,
+    которые нужно опубликовать. Отладочные сообщения строятся только если
+    у logger включён DEBUG.
+    """
+
+    def __init__(self, table, logger=None):
+        self.table = table
+        self.logger = logger or logging.getLogger(__name__)
+        self._actions = {
+            "partial": self._partial,
+            "insert": self._insert,
+            "update": self._update,
+            "delete": self._delete,
+        }
+        # обработчики конкретных таблиц важнее обработчиков действий
+        self._handlers = {("order", "update"): self._update_order}
+
+    def handler(self, table, action):
+        handler = self._handlers.get((table, action)) or self._actions.get(action)
+        if handler is None:
+            raise ValueError("Unknown action: %s" % action)
+        # следующие сообщения этой таблицы находят обработчик одним поиском
+        self._handlers[table, action] = handler
+        return handler
+
+    def feed(self, raw):
+        message = loads(raw)
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug("%s", raw)
+        action = message.get("action")
+        if not action:
+            if debug and "subscribe" in message:
+                self.logger.debug("Subscribed to %s.", message["subscribe"])
+            return []
+        table = message.get("table")
+        if debug:
+            self.logger.debug("%s: %s %s", table, action, message.get("data"))
+        return self.handler(table, action)(self.table(table), message)
+
+    @staticmethod
+    def _partial(store, message):
+        # ключи приходят в partial, по ним ищутся строки в update/delete
+        store.partial(message["data"], message["keys"])
+        return message["data"]
+
+    @staticmethod
+    def _insert(store, message):
+        store.insert(message["data"])
+        return message["data"]
+
+    @staticmethod
+    def _update(store, message):
+        store.update(message["data"])
+        return []
+
+    @staticmethod
+    def _update_order(store, message):
+        updated = []
+        for update in message["data"]:
+            item = store.get(update)
+            if item is None:
+                continue  # ордера ещё нет (update пришёл раньше partial)
+            item.update(update)
+            if any(field in update for field in ORDER_FIELDS):
+                updated.append(item)
+            # исполненные и отменённые ордера убираются из таблицы
+            if item["leavesQty"] <= 0:
+                store.remove(item)
+        return updated
+
+    @staticmethod
+    def _delete(store, message):
+        store.delete(message["data"])
+        return []
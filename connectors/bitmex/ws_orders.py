@@ -7,8 +7,10 @@ import urllib
 import math
 import time
 import hmac, hashlib
-import pika
 import os
+from connectors.bitmex.rabbit_publisher import RabbitPublisher
+from connectors.bitmex.table_store import TableStore
+from connectors.bitmex.ws_ingest import WSIngest
 
 NAMESPACE = "ws_orders"
 
@@ -48,21 +50,12 @@ def get_json_from_file(filename):
         return json.load(f)
 
 
-# Utility method for finding an item in the store..
-def findItemByKeys(keys, table, matchData):
-    for item in table:
-        matched = True
-        for key in keys:
-            if item[key] != matchData[key]:
-                matched = False
-        if matched:
-            return item
-
-
 class BitMEXWSOrder:
 
     # Don't grow a table larger than this amount. Helps cap memory usage.
     MAX_TABLE_LEN = 200
+    # Tables that are never trimmed because we'd lose valuable state.
+    UNBOUNDED_TABLES = ("order", "orderBookL2")
     ENDPOINT = "wss://www.bitmex.com/realtime?subscribe=order"
 
     def __init__(self, rabbitmq_conf=None):
@@ -73,11 +66,18 @@ class BitMEXWSOrder:
         self._define_api()
 
         self.RM_CONF = rabbitmq_conf
+        self.publisher = None
         if rabbitmq_conf:
-            self._connect_rabbitmq()
-
-        self.data = []
-        self.keys = []
+            # Publishing runs on its own thread so a slow broker never stalls the socket.
+            self.publisher = RabbitPublisher(
+                rabbitmq_conf,
+                max_queue=rabbitmq_conf.get("max_queue", 10000),
+                batch_size=rabbitmq_conf.get("batch_size", 100),
+                confirm=rabbitmq_conf.get("confirm", False),
+            ).start()
+
+        self.tables = {}
+        self.ingest = WSIngest(self.table, self.logger)
         self.exited = False
 
         # We can subscribe right in the connection querystring, so let's build that.
@@ -89,18 +89,6 @@ class BitMEXWSOrder:
 
         self.wst.join()
 
-    def _connect_rabbitmq(self):
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(self.RM_CONF["host"])
-        )
-        channel = connection.channel()
-        channel.exchange_declare(
-            exchange=self.RM_CONF["exchange"], exchange_type="fanout"
-        )
-        channel.queue_declare(queue=self.RM_CONF["queue"])
-        self.rm_connection = connection
-        self.rm_channel = channel
-
     def _define_api(self):
         if os.path.exists("keys/bitmex_key.json"):
             with open("keys/bitmex_key.json") as f:
@@ -116,6 +104,20 @@ class BitMEXWSOrder:
         """Call this to exit - will close websocket."""
         self.exited = True
         self.ws.close()
+        if self.publisher:
+            self.publisher.stop()
+
+    @property
+    def data(self):
+        """Current rows of the order table."""
+        return self.table("order").values()
+
+    def table(self, name):
+        store = self.tables.get(name)
+        if store is None:
+            max_len = None if name in self.UNBOUNDED_TABLES else self.MAX_TABLE_LEN
+            store = self.tables[name] = TableStore(name, max_len=max_len)
+        return store
 
     def get_orders(self):
         self.logger.info("get_orders:")
@@ -142,15 +144,9 @@ class BitMEXWSOrder:
         msg["filled"] = order["cumQty"]
         msg["remain"] = order["leavesQty"]
 
-        self.logger.info("rabbit msg " + str(msg))
-        if self.RM_CONF:
-            properties = pika.BasicProperties(content_type="application/json")
-            self.rm_channel.basic_publish(
-                exchange=self.RM_CONF["exchange"],
-                routing_key=self.RM_CONF["routing_key"],
-                body=json.dumps(msg),
-                properties=properties,
-            )
+        self.logger.info("rabbit msg %s", msg)
+        if self.publisher:
+            self.publisher.publish(msg)
 
     #
     # End Public Methods
@@ -220,74 +216,8 @@ class BitMEXWSOrder:
     def __on_message(self, ws, message):
         """Handler for parsing WS messages."""
         t = time.time()
-        updated_orders = []
-
-        message = json.loads(message)
-        self.logger.debug(json.dumps(message))
-
-        table = message["table"] if "table" in message else None
-        action = message["action"] if "action" in message else None
         try:
-            if "subscribe" in message:
-                self.logger.debug("Subscribed to %s." % message["subscribe"])
-            elif action:
-
-                # There are four possible actions from the WS:
-                # 'partial' - full table image
-                # 'insert'  - new row
-                # 'update'  - update row
-                # 'delete'  - delete row
-                if action == "partial":
-                    self.logger.debug("%s: partial" % table)
-                    self.data += message["data"]
-
-                    updated_orders = message["data"]
-
-                    # Keys are communicated on partials to let you know how to uniquely identify
-                    # an item. We use it for updates.
-                    self.keys = message["keys"]
-                elif action == "insert":
-                    self.logger.debug("%s: inserting %s" % (table, message["data"]))
-                    self.data += message["data"]
-
-                    updated_orders = message["data"]
-
-                    # Limit the max length of the table to avoid excessive memory usage.
-                    # Don't trim orders because we'll lose valuable state if we do.
-                    if (
-                        table not in ["order", "orderBookL2"]
-                        and len(self.data) > self.MAX_TABLE_LEN
-                    ):
-                        self.data = self.data[int(self.MAX_TABLE_LEN / 2) :]
-
-                elif action == "update":
-                    self.logger.debug("%s: updating %s" % (table, message["data"]))
-                    # Locate the item in the collection and update it.
-                    for updateData in message["data"]:
-                        item = findItemByKeys(self.keys, self.data, updateData)
-                        if not item:
-                            return  # No item found to update. Could happen before push
-                        item.update(updateData)
-
-                        if any(
-                            [
-                                x in updateData
-                                for x in ["ordStatus", "cumQty" "leavesQty"]
-                            ]
-                        ):
-                            updated_orders.append(item)
-
-                        # Remove cancelled / filled orders
-                        if table == "order" and item["leavesQty"] <= 0:
-                            self.data.remove(item)
-                elif action == "delete":
-                    self.logger.debug("%s: deleting %s" % (table, message["data"]))
-                    # Locate the item in the collection and remove it.
-                    for deleteData in message["data"]:
-                        item = findItemByKeys(self.keys, self.data, deleteData)
-                        self.data.remove(item)
-                else:
-                    raise Exception("Unknown action: %s" % action)
+            updated_orders = self.ingest.feed(message)
         except:
             raise websocket.WebSocketException()
 
@@ -298,7 +228,6 @@ class BitMEXWSOrder:
         """Called on fatal websocket errors. We exit on these."""
         if not self.exited:
             self.logger.error("Error : %s" % error)
-            # self.rm_connection.close()
             # self.__init__()
             raise websocket.WebSocketException(error)
 
@@ -307,8 +236,7 @@ class BitMEXWSOrder:
         self.logger.debug("Websocket Opened.")
 
     def __on_close(self, ws):
-        """Called on websocket close."""
-        self.rm_connection.close()
+        """Called on websocket close. The publisher keeps running for the reconnect."""
         self.logger.info("Websocket Closed")
         raise websocket.WebSocketException()
 
@@ -0,0 +1,209 @@
+import os
+import threading
+from contextlib import contextmanager
+import numpy
+
+try:
+    import fcntl
+except ImportError:  # Windows: только блокировка внутри процесса
+    fcntl = None
+
+
+# запись фиксированной ширины: 8 байт времени + 5 * 8 байт цен/объёма
+RECORD = numpy.dtype([
+    ("timestamp", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+
+def to_records(rows):
+    """Строки ccxt [timestamp, open, high, low, close, volume] -> массив RECORD"""
+    records = numpy.empty(len(rows), dtype=RECORD)
+    if len(rows):
+        arr = numpy.array([[numpy.nan if v is None else v for v in row[:6]] for row in rows], dtype=numpy.float64)
+        records["timestamp"] = arr[:, 0]
+        for i, name in enumerate(RECORD.names[1:], 1):
+            records[name] = arr[:, i]
+    return records
+
+
+def to_rows(records):
+    """Массив RECORD -> строки ccxt [timestamp, open, high, low, close, volume] (списки, как без кэша)"""
+    return [list(row) for row in records.tolist()]
+
+
+class OHLCVCache:
+    """
+    Локальное хранилище закрытых свечей: по файлу на (биржа, символ, таймфрейм),
+    записи отсортированы по времени и читаются через memory map.
+
+    Файл всегда покрывает один непрерывный диапазон времени: с биржи догружаются
+    только куски до первой и после последней сохранённой свечи. Если между
+    кэшем и запрошенным окном разрыв больше самого окна (кэш устарел на недели),
+    догружать разрыв дороже, чем окно: файл заменяется окном (stale, replace).
+
+    Куски, где у биржи свечей нет (до листинга инструмента), запоминаются
+    в файле .empty рядом с данными ([начало, конец) в мс), чтобы не
+    запрашивать их при каждом вызове.
+
+    Файл может писать несколько процессов (headless - процесс на стратегию),
+    поэтому запись идёт под эксклюзивной, а чтение - под разделяемой блокировкой
+    fcntl.flock на файле .lock рядом с данными.
+    """
+
+    def __init__(self, root, exchange):
+        self.root = os.path.join(root, exchange)
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def path(self, symbol, tf):
+        return os.path.join(self.root, symbol.replace("/", "_"), tf + ".ohlcv")
+
+    @contextmanager
+    def _file_lock(self, symbol, tf, exclusive):
+        if fcntl is None:
+            yield
+            return
+        path = self.path(symbol, tf) + ".lock"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _map(self, symbol, tf):
+        path = self.path(symbol, tf)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        cached = self._maps.get(path)
+        if cached and cached[0] == size:
+            return cached[1]
+        records = numpy.memmap(path, dtype=RECORD, mode="r") if size else numpy.empty(0, dtype=RECORD)
+        self._maps[path] = (size, records)
+        return records
+
+    def _empty(self, symbol, tf):
+        """Проверенный пустой кусок [начало, конец) перед первой свечой или None"""
+        try:
+            with open(self.path(symbol, tf) + ".empty") as f:
+                since, until = map(int, f.read().split())
+        except (OSError, ValueError):
+            return None
+        return since, until
+
+    def _mark_empty(self, symbol, tf, since, until):
+        path = self.path(symbol, tf) + ".empty"
+        known = self._empty(symbol, tf)
+        if known is not None and known[0] <= until and since <= known[1]:
+            since, until = min(since, known[0]), max(until, known[1])
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "w") as f:
+            f.write("%d %d" % (since, until))
+        os.replace(tmp, path)
+
+    def bounds(self, symbol, tf):
+        """(первая, последняя) сохранённая свеча или None"""
+        with self._lock, self._file_lock(symbol, tf, False):
+            records = self._map(symbol, tf)
+            if not len(records):
+                return None
+            return int(records["timestamp"][0]), int(records["timestamp"][-1])
+
+    def read(self, symbol, tf, start, end):
+        """Копия записей со start <= timestamp < end"""
+        with self._lock, self._file_lock(symbol, tf, False):
+            records = self._map(symbol, tf)
+            ts = records["timestamp"]
+            lo = numpy.searchsorted(ts, start, side="left")
+            hi = numpy.searchsorted(ts, end, side="left")
+            return numpy.array(records[lo:hi])
+
+    def write(self, symbol, tf, rows, replace=False, since=None, until=None):
+        """
+        Добавить свечи в файл; replace - заменить ими весь файл (см. stale).
+        since, until - запрошенный кусок: если он перед первой свечой файла,
+        его начало без свечей запоминается как пустое.
+        """
+        records = rows if isinstance(rows, numpy.ndarray) else to_records(rows)
+        path = self.path(symbol, tf)
+        with self._lock, self._file_lock(symbol, tf, True):
+            current = self._map(symbol, tf)
+            if replace and os.path.exists(path + ".empty"):
+                os.remove(path + ".empty")
+            if since is not None:
+                head = records["timestamp"][0] if len(records) else until
+                leading = replace or not len(current) or head <= current["timestamp"][0]
+                if leading and since < head:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    self._mark_empty(symbol, tf, since, int(head))
+            if not len(records):
+                return
+            if replace:
+                self._maps.pop(path, None)
+                self._replace(path, records)
+                return
+            if not len(current) or records["timestamp"][0] > current["timestamp"][-1]:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "ab") as f:
+                    f.write(records.tobytes())
+                return
+            merged = numpy.concatenate((records, numpy.array(current)))
+            _, idx = numpy.unique(merged["timestamp"], return_index=True)
+            merged = merged[idx]
+            # mmap нужно отпустить до замены файла (на Windows иначе не заменить)
+            del current
+            self._maps.pop(path, None)
+            self._replace(path, merged)
+
+    @staticmethod
+    def _replace(path, records):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "wb") as f:
+            f.write(records.tobytes())
+        os.replace(tmp, path)
+
+    def stale(self, symbol, tf, start, end, tf_ms):
+        """Разрыв между кэшем и окном [start, end) больше самого окна: файл надо заменить окном"""
+        bounds = self.bounds(symbol, tf)
+        if bounds is None:
+            return False
+        first, last = bounds
+        window = end - start
+        return start - (last + tf_ms) > window or first - end > window
+
+    def missing(self, symbol, tf, start, end, tf_ms):
+        """Куски [since, until) диапазона, которых нет в кэше"""
+        bounds = self.bounds(symbol, tf)
+        empty = self._empty(symbol, tf)
+        if bounds is None:
+            if empty is not None and empty[0] <= start and end <= empty[1]:
+                return []
+            return [(start, end)]
+        if self.stale(symbol, tf, start, end, tf_ms):
+            return [(start, end)]
+        first, last = bounds
+        # проверенный пустой кусок вплотную к первой свече расширяет кэш назад
+        if empty is not None and empty[1] >= first:
+            first = min(first, empty[0])
+        ranges = []
+        if start < first:
+            ranges.append((start, first))
+        if last + tf_ms < end:
+            ranges.append((last + tf_ms, end))
+        return ranges
+
+    def fetch(self, symbol, tf, start, end, tf_ms, fetcher):
+        """
+        Свечи со start <= timestamp < end. Недостающие куски диапазона
+        запрашиваются через fetcher(symbol, tf, since, until) и сохраняются.
+        """
+        replace = self.stale(symbol, tf, start, end, tf_ms)
+        for since, until in self.missing(symbol, tf, start, end, tf_ms):
+            self.write(symbol, tf, fetcher(symbol, tf, since, until), replace, since, until)
+        return self.read(symbol, tf, start, end)
@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity; запрос забирает один токен"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.paused_until = 0.0
+        self._last = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, now):
+        """Через сколько секунд появится токен"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds, now):
+        """Биржа ответила 429: токены обнуляются, запросы ждут seconds"""
+        self._refill(now)
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class _Job:
+    __slots__ = ("kind", "priority", "buckets", "func", "args", "kwargs", "key", "future", "enqueued", "retries", "context",
+                 "loop")
+
+    def __init__(self, kind, priority, buckets, func, args, kwargs, key, loop=None):
+        self.kind = kind
+        self.priority = priority
+        self.buckets = buckets
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.retries = 0
+        # контекст вызывающего потока (contextvars), в нём запрос и выполняется
+        self.context = contextvars.copy_context()
+        # event loop корутины (acall); None - обычная функция в пуле потоков
+        self.loop = loop
+
+
+class RequestScheduler:
+    """
+    Общая очередь запросов к бирже с ограничением частоты.
+
+    kinds - вид запроса -> (приоритет, имена корзин в buckets). Запрос уходит,
+    когда во всех его корзинах есть токен; из ожидающих первым идёт запрос
+    с меньшим приоритетом (ордера и отмены раньше чтения рыночных данных),
+    при равном - по порядку. Запросы с одинаковым key, пока первый не
+    выполнен, получают один и тот же Future (один запрос к бирже).
+
+    Ошибки из throttle_errors (429) ставят корзины запроса на паузу
+    THROTTLE_PAUSE и возвращают запрос в очередь, не больше MAX_RETRIES раз.
+    metrics() - глубина очереди по видам и время ожидания токена.
+
+    Запрос выполняется в контексте (contextvars) потока, который его поставил,
+    поэтому трассировка вызова (OrderPipeline) видна и в потоке пула.
+
+    acall() - то же для корутин (ccxt.async_support): запрос ждёт токен в той
+    же очереди, а корутина запускается задачей в event loop вызывающего.
+    """
+
+    THROTTLE_PAUSE = 5.0
+    MAX_RETRIES = 3
+
+    def __init__(self, buckets, kinds, workers=8, throttle_errors=()):
+        self.buckets = buckets
+        self.kinds = {kind: (priority, [buckets[name] for name in names]) for kind, (priority, names) in kinds.items()}
+        self.workers = workers
+        self.throttle_errors = tuple(throttle_errors)
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._inflight = {}
+        self._pool = None
+        self._thread = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.executed = 0
+        self.throttled = 0
+        self._waits = {kind: [0, 0.0, 0.0] for kind in kinds}  # число, сумма, максимум
+
+    def submit(self, kind, func, *args, key=None, **kwargs):
+        return self._submit(kind, func, args, kwargs, key, None)
+
+    def _submit(self, kind, func, args, kwargs, key, loop):
+        priority, buckets = self.kinds[kind]
+        with self._cond:
+            self.submitted += 1
+            if key is not None:
+                job = self._inflight.get(key)
+                if job is not None:
+                    self.coalesced += 1
+                    return job.future
+            job = _Job(kind, priority, buckets, func, args, kwargs, key, loop)
+            if key is not None:
+                self._inflight[key] = job
+            self._push(job)
+            if self._thread is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="requests")
+                self._thread = threading.Thread(target=self._loop, name="request-scheduler", daemon=True)
+                self._thread.start()
+        return job.future
+
+    def call(self, kind, func, *args, key=None, **kwargs):
+        return self.submit(kind, func, *args, key=key, **kwargs).result()
+
+    async def acall(self, kind, func, *args, key=None, **kwargs):
+        """await func(*args, **kwargs) через очередь; func - функция, возвращающая корутину"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.wrap_future(self._submit(kind, func, args, kwargs, key, loop), loop=loop)
+
+    def metrics(self):
+        with self._cond:
+            depth = {kind: 0 for kind in self.kinds}
+            for _, _, job in self._heap:
+                depth[job.kind] += 1
+            return {
+                "queue_depth": depth,
+                "inflight": len(self._inflight),
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "executed": self.executed,
+                "throttled": self.throttled,
+                "wait": {
+                    kind: {"count": n, "mean": total / n if n else 0.0, "max": longest}
+                    for kind, (n, total, longest) in self._waits.items()
+                },
+            }
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        self._cond.notify()
+
+    def _loop(self):
+        with self._cond:
+            while True:
+                while not self._heap:
+                    self._cond.wait()
+                job = self._heap[0][2]
+                now = time.monotonic()
+                wait = max((bucket.wait_time(now) for bucket in job.buckets), default=0.0)
+                if wait > 0:
+                    # новый запрос с большим приоритетом разбудит раньше
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                for bucket in job.buckets:
+                    bucket.take(now)
+                stats = self._waits[job.kind]
+                waited = now - job.enqueued
+                stats[0] += 1
+                stats[1] += waited
+                stats[2] = max(stats[2], waited)
+                if job.loop is None:
+                    self._pool.submit(self._execute, job)
+                else:
+                    job.loop.call_soon_threadsafe(self._start, job)
+
+    def _execute(self, job):
+        try:
+            result = job.context.run(job.func, *job.args, **job.kwargs)
+        except BaseException as e:
+            self._complete(job, error=e)
+        else:
+            self._complete(job, result)
+
+    def _start(self, job):
+        """В потоке event loop: корутина запроса - задача с контекстом вызывающего"""
+        try:
+            task = job.context.run(lambda: job.loop.create_task(job.func(*job.args, **job.kwargs)))
+        except BaseException as e:
+            self._complete(job, error=e)
+            return
+
+        def done(task):
+            if task.cancelled():
+                self._complete(job, error=asyncio.CancelledError())
+            elif task.exception() is not None:
+                self._complete(job, error=task.exception())
+            else:
+                self._complete(job, task.result())
+        task.add_done_callback(done)
+
+    def _complete(self, job, result=None, error=None):
+        if isinstance(error, self.throttle_errors):
+            with self._cond:
+                self.throttled += 1
+                now = time.monotonic()
+                for bucket in job.buckets:
+                    bucket.pause(self.THROTTLE_PAUSE, now)
+                if job.retries < self.MAX_RETRIES:
+                    job.retries += 1
+                    self._push(job)
+                    return
+        self._finish(job)
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def _finish(self, job):
+        with self._cond:
+            self.executed += 1
+            if job.key is not None and self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
@@ -0,0 +1,86 @@
+import numpy
+from connectors.ohlcv_cache import OHLCVCache, to_records, to_rows
+
+TF_MS = 60000
+
+
+def _rows(start, end):
+    return [[ts, 1.0, 2.0, 0.5, ts / TF_MS, 10.0] for ts in range(start, end, TF_MS)]
+
+
+class _Fetcher:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbol, tf, since, until):
+        self.calls.append((since, until))
+        return _rows(since, until)
+
+
+def test_fetch_downloads_only_missing_ranges(tmp_path):
+    cache = OHLCVCache(str(tmp_path), "bitmex")
+    fetcher = _Fetcher()
+    first = cache.fetch("BTC/USD", "1m", 100 * TF_MS, 200 * TF_MS, TF_MS, fetcher)
+    assert len(first) == 100
+    again = cache.fetch("BTC/USD", "1m", 150 * TF_MS, 200 * TF_MS, TF_MS, fetcher)
+    assert len(fetcher.calls) == 1
+    assert numpy.array_equal(again, first[50:])
+    wider = cache.fetch("BTC/USD", "1m", 50 * TF_MS, 260 * TF_MS, TF_MS, fetcher)
+    assert fetcher.calls[1:] == [(50 * TF_MS, 100 * TF_MS), (200 * TF_MS, 260 * TF_MS)]
+    assert list(wider["timestamp"]) == list(range(50 * TF_MS, 260 * TF_MS, TF_MS))
+    assert cache.bounds("BTC/USD", "1m") == (50 * TF_MS, 259 * TF_MS)
+
+
+def test_records_are_fixed_width_on_disk(tmp_path):
+    cache = OHLCVCache(str(tmp_path), "bitmex")
+    cache.write("BTC/USD", "5m", _rows(0, 10 * TF_MS))
+    path = cache.path("BTC/USD", "5m")
+    assert (tmp_path / "bitmex" / "BTC_USD" / "5m.ohlcv").exists()
+    with open(path, "rb") as f:
+        assert len(f.read()) == 10 * 48
+    assert to_records(_rows(0, TF_MS))[0]["close"] == 0.0
+
+
+def test_stale_cache_is_replaced_by_requested_window(tmp_path):
+    cache = OHLCVCache(str(tmp_path), "bitmex")
+    fetcher = _Fetcher()
+    cache.fetch("BTC/USD", "1m", 0, 100 * TF_MS, TF_MS, fetcher)
+    # кэш отстал на 10000 свечей, а нужно 30: разрыв не скачивается
+    start, end = 10100 * TF_MS, 10130 * TF_MS
+    assert cache.stale("BTC/USD", "1m", start, end, TF_MS)
+    rows = cache.fetch("BTC/USD", "1m", start, end, TF_MS, fetcher)
+    assert fetcher.calls[1:] == [(start, end)]
+    assert len(rows) == 30
+    assert cache.bounds("BTC/USD", "1m") == (start, end - TF_MS)
+    # небольшой разрыв по-прежнему догружается и файл остаётся непрерывным
+    cache.fetch("BTC/USD", "1m", start + 40 * TF_MS, end + 40 * TF_MS, TF_MS, fetcher)
+    assert fetcher.calls[2:] == [(end, end + 40 * TF_MS)]
+    assert cache.bounds("BTC/USD", "1m") == (start, end + 39 * TF_MS)
+
+
+def test_to_rows_matches_uncached_shape():
+    rows = _rows(0, 3 * TF_MS)
+    converted = to_rows(to_records(rows))
+    assert converted == rows
+    assert all(type(row) is list and type(row[0]) is int for row in converted)
+
+
+def test_range_before_listing_is_fetched_once(tmp_path):
+    cache = OHLCVCache(str(tmp_path), "bitmex")
+    listed = 100 * TF_MS
+
+    def fetcher(symbol, tf, since, until):
+        calls.append((since, until))
+        return _rows(max(since, listed), until)
+
+    calls = []
+    rows = cache.fetch("BTC/USD", "1m", 50 * TF_MS, 150 * TF_MS, TF_MS, fetcher)
+    assert len(rows) == 50
+    assert cache.missing("BTC/USD", "1m", 50 * TF_MS, 150 * TF_MS, TF_MS) == []
+    cache.fetch("BTC/USD", "1m", 60 * TF_MS, 150 * TF_MS, TF_MS, fetcher)
+    assert calls == [(50 * TF_MS, 150 * TF_MS)]
+    # совсем без свечей: пустой кусок тоже запоминается
+    empty = OHLCVCache(str(tmp_path), "other")
+    assert not len(empty.fetch("BTC/USD", "1m", 0, 50 * TF_MS, TF_MS, fetcher))
+    assert empty.missing("BTC/USD", "1m", 10 * TF_MS, 50 * TF_MS, TF_MS) == []
+    assert len(calls) == 2
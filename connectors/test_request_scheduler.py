@@ -0,0 +1,89 @@
+import asyncio
+import contextvars
+import threading
+import time
+from connectors.request_scheduler import RequestScheduler, TokenBucket
+
+
+class _Throttled(Exception):
+    pass
+
+
+def _scheduler(rate=1000, capacity=1):
+    return RequestScheduler(
+        buckets={"rest": TokenBucket(rate, capacity)},
+        kinds={"order": (0, ("rest",)), "read": (1, ("rest",))},
+        workers=1,
+        throttle_errors=(_Throttled,),
+    )
+
+
+def test_orders_jump_ahead_of_queued_reads():
+    scheduler = _scheduler(rate=20)
+    order = []
+    gate = threading.Event()
+    first = scheduler.submit("read", gate.wait)
+    reads = [scheduler.submit("read", order.append, "read%s" % i) for i in range(3)]
+    placed = scheduler.submit("order", order.append, "order")
+    gate.set()
+    for future in [first, placed] + reads:
+        future.result(timeout=5)
+    assert order[0] == "order"
+    metrics = scheduler.metrics()
+    assert metrics["executed"] == 5 and metrics["queue_depth"] == {"order": 0, "read": 0}
+    assert metrics["wait"]["read"]["max"] > 0.05
+
+
+def test_identical_reads_are_coalesced():
+    scheduler = _scheduler()
+    calls = []
+    gate = threading.Event()
+
+    def fetch():
+        gate.wait()
+        calls.append(1)
+        return [1, 2]
+
+    futures = [scheduler.submit("read", fetch, key=("ohlcv", "XBTUSD", "1m", 0)) for _ in range(5)]
+    gate.set()
+    assert all(f.result(timeout=5) == [1, 2] for f in futures)
+    assert calls == [1] and scheduler.coalesced == 4
+
+
+def test_throttled_request_is_retried_after_pause():
+    scheduler = _scheduler()
+    scheduler.THROTTLE_PAUSE = 0.05
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise _Throttled()
+        return "ok"
+
+    assert scheduler.call("order", flaky) == "ok"
+    assert attempts[1] - attempts[0] >= 0.04 and scheduler.throttled == 1
+
+
+def test_coroutines_share_the_queue_and_run_on_the_callers_loop():
+    scheduler = _scheduler()
+    scheduler.THROTTLE_PAUSE = 0.01
+    trace = contextvars.ContextVar("trace", default=None)
+    attempts = []
+
+    async def fetch(value):
+        attempts.append((threading.get_ident(), trace.get()))
+        await asyncio.sleep(0)
+        if len(attempts) == 1:
+            raise _Throttled()
+        return value
+
+    async def main():
+        trace.set("order-1")
+        same = await asyncio.gather(*(scheduler.acall("read", fetch, 7, key=("x",)) for _ in range(3)))
+        return threading.get_ident(), same
+
+    loop_thread, same = asyncio.run(main())
+    assert same == [7, 7, 7]
+    assert attempts == [(loop_thread, "order-1")] * 2
+    assert scheduler.throttled == 1 and scheduler.coalesced == 2
@@ -0,0 +1,66 @@
+import queue
+from collections import namedtuple
+
+
+# ордер создан/отменён коннектором (из notify_call_handlers)
+OrderEvent = namedtuple("OrderEvent", "time method params result")
+# снимок данных executor для графика
+ChartEvent = namedtuple("ChartEvent", "data")
+
+
+class EventBus:
+    """
+    Передача событий из потоков executor и коннекторов в поток Tk.
+
+    publish() из любого потока только кладёт событие в queue.SimpleQueue
+    (без блокировок на стороне вызывающего), обработчики вызываются в потоке
+    Tk, который забирает очередь пачками (drain, по таймеру after из attach).
+    Для типов из COALESCE в пачке обрабатывается только последнее событие.
+    """
+
+    COALESCE = (ChartEvent,)
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._handlers = {}
+        self.published = 0
+        self.dispatched = 0
+        self.coalesced = 0
+
+    def subscribe(self, event_type, handler):
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def publish(self, event):
+        self.published += 1
+        self._queue.put(event)
+
+    def drain(self, max_events=1000):
+        """Обрабатывает до max_events событий из очереди; возвращает число обработанных"""
+        batch = []
+        latest = {}
+        while len(batch) < max_events:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(event, self.COALESCE):
+                if type(event) in latest:
+                    self.coalesced += 1
+                latest[type(event)] = len(batch)
+            batch.append(event)
+        for i, event in enumerate(batch):
+            if isinstance(event, self.COALESCE) and latest[type(event)] != i:
+                continue
+            for handler in self._handlers.get(type(event), ()):
+                handler(event)
+            self.dispatched += 1
+        return len(batch)
+
+    def attach(self, widget, interval_ms=50):
+        """Забирать очередь в потоке Tk каждые interval_ms"""
+        def loop():
+            try:
+                self.drain()
+            finally:
+                widget.after(interval_ms, loop)
+        widget.after(interval_ms, loop)
@@ -1,32 +1,18 @@
 import os
 import time
-from datetime import datetime
 import logging
-from collections import deque
 import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter.filedialog import askopenfilename
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib import dates, ticker
-from mpl_finance import candlestick_ohlc
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from PIL import ImageTk, Image
-from strategies.base import StrategyParameter
-import utils
-from plyer import notification
-
-
-TIMEFRAMES = {
-    "1m": [lambda x: x.second % 60 == 0, 1],
-    "5m": [lambda x: x.minute % 5 == 0 and x.second % 60 == 0, 5],
-    "15m": [lambda x: x.minute % 15 == 0, 15],
-    "30m": [lambda x: x.minute % 30 == 0, 30],
-    "1h": [lambda x: x.minute % 60 == 0, 60],
-    "4h": [lambda x: x.hour % 4 == 0 and x.minute % 60 == 0, 240],
-}
-
-plt.rc('font', size=8)
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from strategies.base import get_parameters
+from events import EventBus, OrderEvent, ChartEvent
+from notifier import Notifier
+
+# matplotlib, PIL, plyer, numpy и коннекторы бирж импортируются при первом
+# использовании, чтобы окно появлялось без ожидания их загрузки
+
 
 def _get_logger(name):
     logger = logging.getLogger(name)
@@ -51,27 +37,6 @@ def get_available_exchanges():
     return [name for name in os.listdir(path) if os.path.isdir(path + name)]
 
 
-class IndicatorsHandler:
-
-    def __init__(self, config):
-        self.candles = None
-        self._cache = {}
-        self._INDICATORS = {}
-        for k, v in config.items():
-            self._cache[k] = []
-            self._INDICATORS[k] = (getattr(__import__("indicators."+v[0], fromlist=[v[0]]), v[0]), v[1:])
-
-    def update_candles(self, candles):
-        self.candles = candles
-        for k, v in self._INDICATORS.items():
-            self._cache[k].append(self.get(k))
-        return self._cache
-
-    def get(self, key):
-        indi = self._INDICATORS[key]
-        return indi[0](self.candles, *indi[1])
-
-
 class ScrollableFrame(tk.Frame):
     def __init__(self, parent, minimal_canvas_size, *args, **kw):
         tk.Frame.__init__(self, parent, *args, **kw)
@@ -103,61 +68,40 @@ class ScrollableFrame(tk.Frame):
         interior.bind('<Configure>', _configure_interior)
 
 
-class Executor:
-
-    def __init__(self, tk_app, strategy, exchange_api, symbol):
-        self.tk_app = tk_app
-        self.strategy = strategy
-        self.exchange_api = exchange_api
-        self.symbol = symbol
-
-    def warm_up(self):
-        pass
-
-    def _run(self):
-        data = {
-            "symbol": self.symbol
-        }
-        indicators_handler = IndicatorsHandler(self.strategy.INDICATORS)
-        next_candle_time = self.exchange_api.fetch_last_candles(self.symbol, self.strategy.TIMEFRAME, 1)[0][0] / 1000 + TIMEFRAMES[self.strategy.TIMEFRAME][1] * 60
-
-        while not self.tk_app.is_stopped:
-            if time.time() > next_candle_time:
-                now = datetime.now()
-                print(f"{now} {self.strategy.state}")
-                data["candles"] = deque(
-                    self.exchange_api.fetch_last_candles(data["symbol"], self.strategy.TIMEFRAME,
-                                                         self.strategy.WINDOW_LENGTH), self.strategy.WINDOW_LENGTH
-                )
-                data["indicators"] = indicators_handler.update_candles(data["candles"])
-                self.strategy.handle_data_candle(self.exchange_api, data, indicators_handler)
-                self.tk_app._update_chart_data = data
-                time.sleep(0.1)
-                next_candle_time += TIMEFRAMES[self.strategy.TIMEFRAME][1] * 60
-            self.strategy.handle_data_tick(self.exchange_api, data, indicators_handler)
-            time.sleep(0.2)
-
-    @utils.threaded
-    def run(self, *args, **kwargs):
-        self._run(*args, **kwargs)
-
-
 class Application(tk.Frame):
 
+    # свечей 5m на графике до запуска стратегии (график сам укрупняет их под ширину)
+    CHART_HISTORY = 10000
+    # как часто поток Tk забирает готовый кадр графика
+    CHART_POLL_MS = 50
+    BACKGROUND_POLL_MS = 50
+    EVENTS_POLL_MS = 50
+    # True - стратегии запускаются на общем Runtime (ряд свечей грузится один раз на бар)
+    SHARED_RUNTIME = False
+
     def __init__(self, master=None):
         super().__init__(master)
         self.master = master
         self.grid()
+        self._background = ThreadPoolExecutor(1, thread_name_prefix="ui-background")
         self.init_UI()
 
         self.is_stopped = False
         self.is_status_hidden = False
-        self._update_chart_data = None
+
+        # события из потоков executor обрабатываются только в потоке Tk
+        self.events = EventBus()
+        self.events.subscribe(OrderEvent, self.on_order_event)
+        self.events.subscribe(ChartEvent, self.on_chart_event)
+        self.events.attach(self.master, self.EVENTS_POLL_MS)
+        self.notifier = Notifier()
 
         self.v_strategy_cls = None
         self.v_executor = None
+        self.v_runtime = None
         self.v_exchange_api = None
         self.v_symbol = None
+        self.loop_draw_chart()
 
     def init_UI(self):
         self.master.title("АТС")
@@ -211,7 +155,13 @@ class Application(tk.Frame):
 
         self.chart_area = tk.Frame(self.info_frame, width=500, height=400, background="#ffffff")
         self.chart_area.pack()
-        self.chart_img = None
+        self.chart = None
+        self.chart_photo = None
+        self.chart_label = tk.Label(self.chart_area, background="#ffffff")
+        self.chart_label.pack()
+        self.chart_label.bind("<MouseWheel>", lambda e: self.chart and self.chart.zoom(e.delta > 0))
+        self.chart_label.bind("<Button-4>", lambda e: self.chart and self.chart.zoom(True))
+        self.chart_label.bind("<Button-5>", lambda e: self.chart and self.chart.zoom(False))
 
         self.table_area = ttk.Treeview(self.info_frame)
         self.table_area.pack()
@@ -255,56 +205,110 @@ class Application(tk.Frame):
         self.btn_start = tk.Button(self.menu_left_lower, text="Старт", bg="#008CBA", fg="white", font=("Verdana", 9), command=self.handle_btn_start)
         self.btn_start.grid(row=2, column=1, pady=3, sticky=tk.W+tk.E)
 
+    def in_background(self, func, callback, *args):
+        """func(*args) в фоновом потоке, затем callback(future) в потоке Tk"""
+        future = self._background.submit(func, *args)
+
+        def check():
+            if future.done():
+                callback(future)
+            else:
+                self.master.after(self.BACKGROUND_POLL_MS, check)
+        check()
+
     def on_exchange_change(self, event):
         exchange_api_name = self.exchange_combobox.get()
+        self.v_exchange_api = None
+        self.v_symbol = None
+        self.symbol_entry.set("")
+        self.symbol_entry.state(["disabled"])
+        self.status.config(text="Загрузка списка пар...")
+        self.in_background(self._load_exchange, self._on_exchange_loaded, exchange_api_name)
+
+    @staticmethod
+    def _load_exchange(exchange_api_name):
         exchange_api_class_name = exchange_api_name.capitalize()
-        self.v_exchange_api = getattr(__import__(f"connectors.{exchange_api_name}.{exchange_api_name}", fromlist=[exchange_api_class_name]), exchange_api_class_name)()
-        self.symbol_entry.config(values=self.v_exchange_api.fetch_markets())
+        exchange_api = getattr(__import__(f"connectors.{exchange_api_name}.{exchange_api_name}", fromlist=[exchange_api_class_name]), exchange_api_class_name)()
+        return exchange_api, exchange_api.fetch_markets()
+
+    def _on_exchange_loaded(self, future):
+        try:
+            self.v_exchange_api, markets = future.result()
+        except Exception as e:
+            self.status.config(text=f"Не удалось загрузить биржу: {e}")
+            return
+        self.symbol_entry.config(values=markets)
         self.symbol_entry.state(["!disabled"])
+        self.status.config(text="Ожидание запуска.")
 
     def on_symbol_change(self, event):
         self.v_symbol = self.symbol_entry.get()
-        self.master.after(1, self.draw_chart, {"symbol": self.v_symbol, "candles": deque(self.v_exchange_api.fetch_last_candles(self.v_symbol, "5m", 288), 288), "indicators": {}})
+        self.status.config(text="Загрузка свечей...")
+        self.in_background(self._load_candles, self._on_candles_loaded, self.v_exchange_api, self.v_symbol)
+
+    def _load_candles(self, exchange_api, symbol):
+        from candles import CandleBuffer
+        candles = CandleBuffer(self.CHART_HISTORY)
+        candles.extend(exchange_api.fetch_last_candles(symbol, "5m", self.CHART_HISTORY))
+        return symbol, candles
+
+    def _on_candles_loaded(self, future):
+        try:
+            symbol, candles = future.result()
+        except Exception as e:
+            self.status.config(text=f"Не удалось загрузить свечи: {e}")
+            return
+        self.status.config(text="Ожидание запуска.")
+        if symbol == self.v_symbol:
+            self.draw_chart({"symbol": symbol, "candles": candles, "indicators": {}})
 
     def loop_draw_chart(self):
-        if not self.is_stopped:
-            if self._update_chart_data:
-                self.draw_chart(self._update_chart_data)
-                self._update_chart_data = None
-            self.master.after(1000, self.loop_draw_chart)
+        frame = self.chart.take_frame() if self.chart else None
+        if frame:
+            from PIL import ImageTk, Image
+            # кадр уже отрисован в фоне, здесь только копирование в PhotoImage
+            width, height, rgba = frame
+            image = Image.frombuffer("RGBA", (width, height), rgba, "raw", "RGBA", 0, 1)
+            if self.chart_photo is None or (self.chart_photo.width(), self.chart_photo.height()) != (width, height):
+                self.chart_photo = ImageTk.PhotoImage(image)
+                self.chart_label.config(image=self.chart_photo)
+            else:
+                self.chart_photo.paste(image)
+        self.master.after(self.CHART_POLL_MS, self.loop_draw_chart)
 
     def draw_chart(self, data):
-        ohlc_data = [(dates.date2num(datetime.fromtimestamp(row[0]/1e3)), np.float64(row[1]), np.float64(row[2]), np.float64(row[3]), np.float64(row[4])) for row in data["candles"]]
-        y_data = np.array(list(map(lambda x: x[0], ohlc_data)))
-        figure = plt.Figure(figsize=(6, 4), dpi=100)
-        ax = figure.add_subplot(111)
-        candlestick_ohlc(ax, ohlc_data, width=0.5 / (24 * 60), colorup='g', colordown='r', alpha=0.8)
-        for k, v in data["indicators"].items():
-            if len(v) > 1:
-                ax.plot(y_data[-len(v):], np.array(v), label=k)
-        ax.xaxis.set_major_formatter(dates.DateFormatter('%H:%M'))
-        ax.xaxis.set_major_locator(ticker.MaxNLocator(8))
-        ax.set_title('Текущая котировка')
-        ax.legend()
-        plt.xticks(rotation=30)
-        plt.grid()
-        plt.xlabel('Date')
-        plt.ylabel('Price')
-        plt.title('Historical Data EURUSD')
-        plt.tight_layout()
-        if self.chart_img: self.chart_img.get_tk_widget().destroy()
-        self.chart_img = FigureCanvasTkAgg(figure, self.chart_area)
-        self.chart_img.get_tk_widget().pack()
+        if self.chart is None:
+            import matplotlib
+            from chart import ChartRenderer
+            matplotlib.rc('font', size=8)
+            self.chart = ChartRenderer()
+        self.chart.submit(data)
+
+    def on_candles(self, data):
+        """Sink executor (поток executor)"""
+        # окно свечей executor переиспользует между барами, графику отдаём снимок
+        candles = data["candles"].copy()
+        visible = len(candles)
+        self.events.publish(ChartEvent(dict(
+            data,
+            candles=candles,
+            # копия видимого хвоста: график рисуется в другом потоке, пока executor дописывает значения
+            indicators={k: list(islice(v, max(0, len(v) - visible), None)) for k, v in data["indicators"].items()},
+        )))
+
+    def on_chart_event(self, event):
+        if not self.is_stopped:
+            self.draw_chart(event.data)
 
     def api_call_handler(self, method_name, params, result):
-        if method_name == "create_order":
-            self.table_area.insert("", 0, text=time.strftime("%d.%m %H:%M:%S", time.localtime()), values=(params["side"], result["price"], params["amount"]))
-            notification.notify(
-                title="Создан ордер",
-                message=f'Тип: {params["side"]} Цена: {result["price"]}',
-                app_name='АТС',
-                app_icon='notification.ico'
-            )
+        """Вызывается коннектором в потоке, создавшем ордер: только публикация события"""
+        self.events.publish(OrderEvent(time.time(), method_name, params, result))
+
+    def on_order_event(self, event):
+        if event.method == "create_order":
+            params, result = event.params, event.result
+            self.table_area.insert("", 0, text=time.strftime("%d.%m %H:%M:%S", time.localtime(event.time)), values=(params["side"], result["price"], params["amount"]))
+            self.notifier.notify("Создан ордер", f'Тип: {params["side"]} Цена: {result["price"]}')
 
     def say_hi(self):
         print("hi there, everyone!")
@@ -317,18 +321,18 @@ class Application(tk.Frame):
         last_row = 0
         for child in self.menu_left_upper.winfo_children()[1:]:
             child.destroy()
-        for k, v in vars(self.v_strategy_cls).items():
-            if isinstance(v, StrategyParameter):
-                row_frame = tk.Frame(self.menu_left_upper)
-                tk.Label(row_frame, text=v.verbose_name).pack(side="left")
-                var = {"int": tk.IntVar, "string": tk.StringVar}[v.value_type]()
-                tk.Entry(row_frame, textvariable=var, width=14).pack(side="right")
-                var.set(v.default)
-                self.STRAT_PARAMS_ENTRY[k] = var
-                row_frame.pack(fill=tk.X, ipadx=3, ipady=3, padx=3)
-                last_row += 1
+        for k, v in get_parameters(self.v_strategy_cls).items():
+            row_frame = tk.Frame(self.menu_left_upper)
+            tk.Label(row_frame, text=v.verbose_name).pack(side="left")
+            var = {"int": tk.IntVar, "string": tk.StringVar}[v.value_type]()
+            tk.Entry(row_frame, textvariable=var, width=14).pack(side="right")
+            var.set(v.default)
+            self.STRAT_PARAMS_ENTRY[k] = var
+            row_frame.pack(fill=tk.X, ipadx=3, ipady=3, padx=3)
+            last_row += 1
 
     def handle_show_docs(self):
+        from PIL import ImageTk, Image
         img = ImageTk.PhotoImage(Image.open("docs.png"))
 
         window = tk.Toplevel(self.master)
@@ -364,6 +368,7 @@ class Application(tk.Frame):
             self.btn_start.config(text="Старт", bg="#008CBA")
             self.status.config(text="Стратегия остановлена.")
             self.filemenu.entryconfig("Открыть", state="normal")
+            self.v_executor.stop()
             self.v_executor = None
         else:
             if not self.v_strategy_cls:
@@ -379,9 +384,12 @@ class Application(tk.Frame):
                 self.filemenu.entryconfig("Открыть", state="disabled")
                 self.v_exchange_api.register_call_handler(self.api_call_handler)
                 strategy = self.v_strategy_cls({k: v.get() for k, v in self.STRAT_PARAMS_ENTRY.items()})
-                self.v_executor = Executor(self, strategy, self.v_exchange_api, self.v_symbol)
+                from executor import Executor
+                if self.SHARED_RUNTIME and self.v_runtime is None:
+                    from runtime import Runtime
+                    self.v_runtime = Runtime()
+                self.v_executor = Executor(strategy, self.v_exchange_api, self.v_symbol, sink=self, runtime=self.v_runtime)
                 self.v_executor.run()
-                self.loop_draw_chart()
 
 
 if __name__ == "__main__":
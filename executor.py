@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from indicators.base import IndicatorsHandler
+from candles import CandleFeed
+from scheduler import default_scheduler
+from order_pipeline import ORDER_METHODS, OrderPipeline
+import metrics
+import utils
+
+logger = logging.getLogger(__name__)
+
+
+TIMEFRAMES = {
+    "1m": [lambda x: x.second % 60 == 0, 1],
+    "5m": [lambda x: x.minute % 5 == 0 and x.second % 60 == 0, 5],
+    "15m": [lambda x: x.minute % 15 == 0, 15],
+    "30m": [lambda x: x.minute % 30 == 0, 30],
+    "1h": [lambda x: x.minute % 60 == 0, 60],
+    "4h": [lambda x: x.hour % 4 == 0 and x.minute % 60 == 0, 240],
+}
+
+
+class Sink:
+    """
+    Получатель результатов Executor (окно графика, журнал, ...).
+    on_candles вызывается в потоке executor после обработки каждого бара.
+    """
+
+    def on_candles(self, data):
+        pass
+
+
+class _TimedOrders:
+    """Коннектор (или OrderPipeline) для стратегии: ордера проходят через span этапа orders"""
+
+    def __init__(self, api, histogram, orders, errors):
+        self._api = api
+        self._histogram = histogram
+        self._orders = orders
+        self._errors = errors
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if name not in ORDER_METHODS:
+            return attr
+
+        def timed(*args, **kwargs):
+            self._orders.inc()
+            try:
+                with self._histogram.time():
+                    return attr(*args, **kwargs)
+            except Exception:
+                self._errors.inc()
+                raise
+        return timed
+
+
+class Executor:
+    """
+    Стратегия на одном символе. Сама по себе синхронизирует свечи по своему
+    CandleFeed на общем планировщике; при runtime свечи приходят из общего
+    Runtime, который загружает каждый ряд (символ, таймфрейм) один раз на бар.
+
+    Не зависит от GUI: остановка - через stop_event, результаты каждого бара
+    уходят в sink (Sink).
+
+    Стратегии с ASYNC_ORDERS получают вместо коннектора OrderPipeline:
+    ордера возвращают Future и не задерживают обработку бара.
+
+    Этапы бара (sync, indicators, strategy, orders, sink) замеряются в
+    гистограммы registry (metrics.Registry) с метками symbol и strategy,
+    рядом - счётчики баров, тиков и ордеров; экспорт - metrics.serve или
+    metrics.write_textfile.
+    """
+
+    STAGES = ("sync", "indicators", "strategy", "orders", "sink")
+
+    def __init__(self, strategy, exchange_api, symbol, sink=None, stop_event=None, delta_sync=True,
+                 scheduler=None, runtime=None, registry=None):
+        self.strategy = strategy
+        self.exchange_api = exchange_api
+        self.symbol = symbol
+        registry = registry or metrics.REGISTRY
+        labels = {"symbol": symbol, "strategy": type(strategy).__module__.rsplit(".", 1)[-1]}
+        self.stages = {
+            stage: registry.histogram("executor_stage_seconds", "Время этапа обработки бара", stage=stage, **labels)
+            for stage in self.STAGES
+        }
+        self.bar_delay = registry.histogram("executor_bar_delay_seconds", "От закрытия бара до стратегии", **labels)
+        self.bars = registry.counter("executor_bars_total", "Обработанные бары", **labels)
+        self.bars_not_ready = registry.counter("executor_bars_not_ready_total", "Бар ещё не закрыт на бирже", **labels)
+        self.ticks = registry.counter("executor_ticks_total", "Вызовы handle_data_tick", **labels)
+        self.errors = registry.counter("executor_order_errors_total", "Ордера с ошибкой", **labels)
+        self.pipeline = None
+        api = exchange_api
+        if getattr(strategy, "ASYNC_ORDERS", False):
+            api = self.pipeline = OrderPipeline(exchange_api, {
+                stage: registry.histogram("order_stage_seconds", "Этапы асинхронной отправки ордера", stage=stage, **labels)
+                for stage in OrderPipeline.STAGES
+            })
+        # через что стратегия выставляет ордера
+        self.orders = _TimedOrders(api, self.stages["orders"],
+                                   registry.counter("executor_orders_total", "Ордера стратегии", **labels), self.errors)
+        self.sink = sink or Sink()
+        self.stop_event = stop_event or threading.Event()
+        self.runtime = runtime
+        self.feed = CandleFeed(exchange_api, symbol, strategy.TIMEFRAME, strategy.WINDOW_LENGTH, delta_sync)
+        self.scheduler = scheduler or (runtime.scheduler if runtime else default_scheduler())
+        self.tf_seconds = TIMEFRAMES[strategy.TIMEFRAME][1] * 60
+        self.clock_offset = 0.0
+        # задержка от закрытия бара (по часам биржи) до вызова handle_data_candle, сек
+        self.last_bar_delay = None
+        self.data = {
+            "symbol": self.symbol,
+            "candles": self.feed.candles,
+        }
+        # история значений индикаторов - по окну свечей, иначе растёт всё время работы
+        self.indicators_handler = IndicatorsHandler(self.strategy.INDICATORS, history=strategy.WINDOW_LENGTH)
+        self._subscriptions = []
+
+    def warm_up(self):
+        pass
+
+    def _run(self):
+        if self.runtime:
+            self.runtime.add(self)
+        else:
+            self.clock_offset = self.exchange_api.fetch_time_offset()
+            now = time.time() + self.clock_offset
+            self._on_bar(now - now % self.tf_seconds)
+            self._subscriptions.append(self.scheduler.subscribe_bars(self.tf_seconds, self._on_bar, self.clock_offset))
+        if self.strategy.TICK_INTERVAL:
+            self._subscriptions.append(self.scheduler.subscribe_interval(self.strategy.TICK_INTERVAL, self._on_tick))
+
+    def stop(self):
+        self.stop_event.set()
+        for sub in self._subscriptions:
+            self.scheduler.unsubscribe(sub)
+        self._subscriptions = []
+        if self.runtime:
+            self.runtime.remove(self)
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def is_ready(self, candles, bar_close):
+        last = candles.last_timestamp
+        return last is not None and last / 1000 >= bar_close - self.tf_seconds
+
+    def _on_bar(self, bar_close):
+        """bar_close - время закрытия бара по часам биржи, сек; False - свеча ещё не готова"""
+        if self.stop_event.is_set():
+            self.stop()
+            return
+        with self.stages["sync"].time():
+            self.feed.sync()
+        if not self.is_ready(self.feed.candles, bar_close):
+            self.bars_not_ready.inc()
+            return False
+        self.handle_candles(None, bar_close, self.feed.last_fetched)
+
+    def handle_candles(self, candles, bar_close, fetched):
+        """candles - снимок общего ряда из Runtime (None - окно уже обновлено своим feed)"""
+        if self.stop_event.is_set():
+            self.stop()
+            return
+        data = self.data
+        if candles is not None:
+            data["candles"].update(candles.rows(self.strategy.WINDOW_LENGTH))
+        self.last_bar_delay = time.time() + self.clock_offset - bar_close
+        self.bar_delay.record(self.last_bar_delay)
+        self.bars.inc()
+        logger.info("%s %s fetched candles: %s bar delay: %.3fs", self.symbol, self.strategy.state, fetched, self.last_bar_delay)
+        stages = self.stages
+        with stages["indicators"].time():
+            data["indicators"] = self.indicators_handler.update_candles(data["candles"])
+        with stages["strategy"].time():
+            self.strategy.handle_data_candle(self.orders, data, self.indicators_handler)
+        with stages["sink"].time():
+            self.sink.on_candles(data)
+
+    def _on_tick(self, now):
+        if self.stop_event.is_set():
+            self.stop()
+            return
+        self.ticks.inc()
+        self.strategy.handle_data_tick(self.orders, self.data, self.indicators_handler)
+
+    @utils.threaded
+    def run(self, *args, **kwargs):
+        self._run(*args, **kwargs)
@@ -0,0 +1,135 @@
+"""
+Запуск стратегии без GUI (на сервере): по процессу на стратегию.
+
+    python headless.py config.json
+
+config.json:
+
+    {
+        "strategy": "strat1",
+        "exchange": "bitmex",
+        "symbol": "XBTUSD",
+        "params": {"MA1": 10, "MA2": 27},
+        "delta_sync": true,
+        "metrics": {"port": 9108}
+    }
+
+Несколько стратегий в одном процессе - список "strategies" с записями
+{"strategy", "symbol", "params"} вместо ключей strategy/symbol/params.
+"async": true - асинхронный коннектор (BitmexSync поверх AsyncBitmex).
+"runtime": true - общий Runtime: каждый ряд (символ, таймфрейм) загружается
+один раз на бар для всех стратегий на нём.
+
+metrics - экспорт metrics.REGISTRY в формате Prometheus: "port" - HTTP
+на 127.0.0.1 (/metrics), "textfile" - файл для textfile collector
+node_exporter, перезаписывается каждые "interval" секунд.
+
+Не импортирует tkinter, matplotlib, PIL и plyer.
+"""
+import argparse
+import json
+import logging
+import signal
+import threading
+from executor import Executor, Sink
+from runtime import Runtime
+import metrics
+from strategies.base import default_params
+
+
+logger = logging.getLogger("headless")
+
+
+class LogSink(Sink):
+    """Пишет в журнал последнюю свечу и значения индикаторов каждого бара"""
+
+    def on_candles(self, data):
+        if logger.isEnabledFor(logging.INFO):
+            indicators = {k: v[-1] for k, v in data["indicators"].items() if len(v)}
+            logger.info("%s %s %s", data["symbol"], data["candles"][-1].tolist(), indicators)
+
+
+def load_config(path):
+    with open(path) as f:
+        config = json.load(f)
+    if "exchange" not in config:
+        raise ValueError("%s: missing 'exchange'" % path)
+    for entry in strategy_entries(config):
+        for key in ("strategy", "symbol"):
+            if key not in entry:
+                raise ValueError("%s: missing %r" % (path, key))
+    return config
+
+
+def strategy_entries(config):
+    """Записи стратегий: список strategies или сам конфиг с одной стратегией"""
+    return config.get("strategies") or [config]
+
+
+def create_exchange(name, use_async=False):
+    """Коннектор биржи; use_async - асинхронный коннектор за синхронным фасадом ({Name}Sync)"""
+    class_name = name.capitalize()
+    if use_async:
+        class_name += "Sync"
+        return getattr(__import__(f"connectors.{name}.{name}_async", fromlist=[class_name]), class_name)()
+    return getattr(__import__(f"connectors.{name}.{name}", fromlist=[class_name]), class_name)()
+
+
+def api_call_handler(method_name, params, result):
+    if method_name == "create_order":
+        logger.info("order %s %s at %s", params["side"], params["amount"], result.get("price"))
+
+
+def export_metrics(conf, stop_event):
+    """Запускает экспорт метрик по разделу metrics конфига; возвращает HTTP-сервер или None"""
+    server = None
+    if conf.get("port"):
+        server = metrics.serve(conf["port"], conf.get("host", "127.0.0.1"))
+        logger.info("metrics on http://%s:%d/metrics", *server.server_address[:2])
+    if conf.get("textfile"):
+        def loop():
+            while not stop_event.wait(conf.get("interval", 15)):
+                metrics.write_textfile(conf["textfile"])
+            metrics.write_textfile(conf["textfile"])
+        threading.Thread(target=loop, name="metrics-textfile", daemon=True).start()
+    return server
+
+
+def run(config, stop_event=None, sink=None):
+    """Запускает стратегии из config и ждёт stop_event"""
+    stop_event = stop_event or threading.Event()
+    delta_sync = config.get("delta_sync", True)
+    exchange_api = create_exchange(config["exchange"], config.get("async", False))
+    exchange_api.register_call_handler(api_call_handler)
+    runtime = Runtime(delta_sync=delta_sync) if config.get("runtime") else None
+    executors = []
+    for entry in strategy_entries(config):
+        strategy_cls = __import__("strategies." + entry["strategy"], fromlist=["Strategy"]).Strategy
+        params = dict(default_params(strategy_cls), **entry.get("params", {}))
+        executors.append(Executor(strategy_cls(params), exchange_api, entry["symbol"], sink=sink or LogSink(),
+                                  stop_event=stop_event, delta_sync=delta_sync, runtime=runtime))
+        logger.info("starting %s on %s %s with %s", entry["strategy"], config["exchange"], entry["symbol"], params)
+    server = export_metrics(config.get("metrics", {}), stop_event)
+    for executor in executors:
+        executor._run()
+    stop_event.wait()
+    for executor in executors:
+        executor.stop()
+    if runtime is not None:
+        runtime.shutdown()
+    if server is not None:
+        server.shutdown()
+    logger.info("stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Запуск стратегии без GUI")
+    parser.add_argument("config", help="JSON: exchange, strategy, symbol, params (или strategies), delta_sync, async, runtime, metrics")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    run(load_config(args.config), stop)
@@ -0,0 +1,153 @@
+import abc
+from collections import deque
+import numpy
+from candles import CandleBuffer
+
+
+def _stream_class_name(indicator_name):
+    """sma -> Sma, bollinger_bands -> BollingerBands"""
+    return "".join(part.capitalize() for part in indicator_name.split("_"))
+
+
+class StreamingIndicator(abc.ABC):
+    """
+    Потоковый индикатор: хранит своё состояние и обновляется за O(1)
+    на каждую новую закрытую свечу, не пересчитывая всё окно.
+
+    Состояние копится по всем свечам, а не по окну стратегии: если
+    period + offset больше WINDOW_LENGTH, потоковое значение считается по
+    полному периоду, а пакетная функция - только по свечам окна (меньше period),
+    и значения расходятся. Стратегии должны держать период в пределах окна.
+
+    Если последнюю учтённую свечу исправили на месте (CandleBuffer.replace_last,
+    незакрытый бар), вызывается revise(candle) - пересчёт без сдвига окна.
+    """
+
+    def __init__(self, *params):
+        self.params = params
+        self.value = None
+
+    @abc.abstractmethod
+    def update(self, candle):
+        """Учесть новую закрытую свечу; возвращает self.value"""
+
+    @abc.abstractmethod
+    def revise(self, candle):
+        """Заменить последнюю учтённую свечу на candle; возвращает self.value"""
+
+    def reset(self):
+        self.__init__(*self.params)
+
+
+class IndicatorsHandler:
+    """
+    Для индикаторов, у которых есть потоковая реализация (класс с именем
+    индикатора в CamelCase рядом с функцией), в индикатор передаются только
+    новые свечи. Остальные индикаторы считаются пакетной функцией по всему окну.
+
+    history - сколько последних значений каждого индикатора хранить (None - все).
+    Из CandleBuffer новые свечи читаются по колонкам среза окна, без копии всего окна.
+    """
+
+    def __init__(self, config, history=None):
+        self.candles = None
+        self._cache = {}
+        self._INDICATORS = {}
+        self._streams = {}
+        self._last_ts = None
+        # последняя учтённая свеча: её исправление на месте передаётся в revise
+        self._last_row = None
+        for k, v in config.items():
+            module = __import__("indicators." + v[0], fromlist=[v[0]])
+            self._cache[k] = [] if history is None else deque(maxlen=history)
+            self._INDICATORS[k] = (getattr(module, v[0]), v[1:])
+            stream_cls = getattr(module, _stream_class_name(v[0]), None)
+            if stream_cls is not None:
+                self._streams[k] = stream_cls(*v[1:])
+        self._stream_list = list(self._streams.values())
+
+    def _revised(self, row):
+        """row, если это исправленная последняя учтённая свеча, иначе None"""
+        if row[0] == self._last_ts and tuple(row[:6]) != self._last_row:
+            return row
+        return None
+
+    def _new_candles(self, candles):
+        """(исправленная последняя учтённая свеча или None, новые свечи)"""
+        if isinstance(candles, CandleBuffer):
+            # колонки среза -> строки-кортежи float, без транспонирования окна
+            window = candles.window()
+            if self._last_ts is None:
+                return None, list(zip(*window.tolist()))
+            ts, last = window[0], self._last_ts
+            n = len(ts)
+            # обычный случай - ни одной или одна новая свеча: без поиска
+            if n and ts[n - 1] == last:
+                start = n
+            elif n > 1 and ts[n - 2] == last:
+                start = n - 1
+            else:
+                start = int(numpy.searchsorted(ts, last, side="right"))
+            revised = self._revised(window[:, start - 1].tolist()) if start else None
+            return revised, list(zip(*window[:, start:].tolist()))
+        if self._last_ts is None:
+            return None, candles
+        if len(candles) and candles[0][0] > self._last_ts:
+            return None, candles
+        new = []
+        revised = None
+        for row in reversed(candles):
+            if row[0] <= self._last_ts:
+                revised = self._revised(row)
+                break
+            new.append(row)
+        new.reverse()
+        return revised, new
+
+    def update_candles(self, candles):
+        if self._last_ts is not None and len(candles) and candles[-1][0] < self._last_ts:
+            # окно сменилось (другой символ / история), начинаем заново
+            self.reset()
+        revised, new = self._new_candles(candles)
+        if revised is not None:
+            for stream in self._stream_list:
+                stream.revise(revised)
+            self._last_row = tuple(revised[:6])
+        for row in new:
+            for stream in self._stream_list:
+                stream.update(row)
+        if len(new):
+            self._last_ts = new[-1][0]
+            self._last_row = tuple(new[-1][:6])
+        self.candles = candles
+        for k in self._INDICATORS:
+            self._cache[k].append(self.get(k))
+        return self._cache
+
+    def push(self, candles, row):
+        """
+        Быстрый путь для одной новой свечи row, уже лежащей последней в окне candles
+        (бэктест): без поиска новых свечей в окне.
+        """
+        for stream in self._stream_list:
+            stream.update(row)
+        self._last_ts = row[0]
+        self._last_row = tuple(row[:6])
+        self.candles = candles
+        for k, cache in self._cache.items():
+            stream = self._streams.get(k)
+            cache.append(stream.value if stream is not None else self.get(k))
+        return self._cache
+
+    def reset(self):
+        self._last_ts = None
+        self._last_row = None
+        for stream in self._streams.values():
+            stream.reset()
+
+    def get(self, key):
+        stream = self._streams.get(key)
+        if stream is not None:
+            return stream.value
+        indi = self._INDICATORS[key]
+        return indi[0](self.candles, *indi[1])
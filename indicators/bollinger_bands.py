@@ -1,8 +1,59 @@
+import math
+from collections import deque
 import numpy
+from candles import closes
+from .base import StreamingIndicator
 
 
 def bollinger_bands(data, period, devs):
-    data = list(map(lambda x: x[4], data))[-period:]
+    data = closes(data)[-period:]
     ma = numpy.mean(data)
     st_dev = numpy.std(data)
     return [ma - st_dev * devs, ma, ma + st_dev * devs]
+
+
+class BollingerBands(StreamingIndicator):
+    """Потоковые полосы Боллинджера: среднее и дисперсия по скользящему окну (метод Уэлфорда)"""
+
+    def __init__(self, period, devs):
+        super().__init__(period, devs)
+        self.period = period
+        self.devs = devs
+        self.value = [math.nan, math.nan, math.nan]
+        self._window = deque()
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, candle):
+        x = candle[4]
+        window = self._window
+        window.append(x)
+        n = len(window)
+        if n > self.period:
+            y = window.popleft()
+            n -= 1
+            old_mean = self._mean
+            self._mean += (x - y) / n
+            self._m2 += (x - y) * (x - self._mean + y - old_mean)
+        else:
+            delta = x - self._mean
+            self._mean += delta / n
+            self._m2 += delta * (x - self._mean)
+        return self._set_value(n)
+
+    def revise(self, candle):
+        window = self._window
+        if not window:
+            return self.update(candle)
+        x = candle[4]
+        y, window[-1] = window[-1], x
+        n = len(window)
+        old_mean = self._mean
+        self._mean += (x - y) / n
+        self._m2 += (x - y) * (x - self._mean + y - old_mean)
+        return self._set_value(n)
+
+    def _set_value(self, n):
+        st_dev = math.sqrt(max(self._m2, 0.0) / n)
+        self.value = [self._mean - st_dev * self.devs, self._mean, self._mean + st_dev * self.devs]
+        return self.value
@@ -1,9 +1,59 @@
+import math
+from collections import deque
+from itertools import islice
 import numpy
+from candles import closes
+from .base import StreamingIndicator
 
 
 def sma(data, period, offset=0):
-    data = list(map(lambda x: x[4], data))
+    data = closes(data)
     if offset > 0:
         return numpy.mean(data[-period-offset:-offset])
     else:
         return numpy.mean(data[-period:])
+
+
+class Sma(StreamingIndicator):
+    """Потоковая SMA: скользящая сумма по окну из period свечей, сдвинутому на offset назад"""
+
+    # раз в столько обновлений сумма пересчитывается заново, чтобы не копилась ошибка округления
+    RESYNC_EVERY = 4096
+
+    def __init__(self, period, offset=0):
+        super().__init__(period, offset)
+        self.period = period
+        self.offset = offset
+        self.value = math.nan
+        self._window = deque()
+        self._sum = 0.0
+        self._count = 0
+        self._updates = 0
+
+    def update(self, candle):
+        window = self._window
+        window.append(candle[4])
+        offset = self.offset
+        if len(window) > offset:
+            self._sum += window[-offset - 1]
+            if self._count < self.period:
+                self._count += 1
+            else:
+                self._sum -= window.popleft()
+        self._updates += 1
+        if self._updates == self.RESYNC_EVERY:
+            self._updates = 0
+            self._sum = math.fsum(islice(window, self._count))
+        self.value = self._sum / self._count if self._count else math.nan
+        return self.value
+
+    def revise(self, candle):
+        window = self._window
+        if not window:
+            return self.update(candle)
+        old, window[-1] = window[-1], candle[4]
+        # без смещения последняя свеча входит в сумму, со смещением - ещё нет
+        if not self.offset and self._count:
+            self._sum += window[-1] - old
+        self.value = self._sum / self._count if self._count else math.nan
+        return self.value
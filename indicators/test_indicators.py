@@ -0,0 +1,107 @@
+import random
+import pytest
+from indicators.sma import sma, Sma
+from indicators.bollinger_bands import bollinger_bands, BollingerBands
+from indicators.base import IndicatorsHandler
+from candles import CandleBuffer
+
+
+def _candles(n, seed=1):
+    rnd = random.Random(seed)
+    price = 10000.0
+    rows = []
+    for i in range(n):
+        price += rnd.uniform(-25, 25)
+        rows.append([i * 60000, price, price + 5, price - 5, price, rnd.uniform(1, 100)])
+    return rows
+
+
+@pytest.mark.parametrize("period,offset", [(10, 0), (27, 1), (5, 3)])
+def test_streaming_sma_matches_batch(period, offset):
+    candles = _candles(500)
+    stream = Sma(period, offset)
+    for i, row in enumerate(candles):
+        stream.update(row)
+        if i >= period + offset:
+            assert stream.value == pytest.approx(sma(candles[:i + 1], period, offset))
+
+
+def test_streaming_sma_resync():
+    candles = _candles(3 * Sma.RESYNC_EVERY)
+    stream = Sma(20)
+    for row in candles:
+        stream.update(row)
+    assert stream.value == pytest.approx(sma(candles, 20), rel=1e-12)
+
+
+def test_streaming_bollinger_bands_matches_batch():
+    candles = _candles(500)
+    stream = BollingerBands(20, 2)
+    for i, row in enumerate(candles):
+        stream.update(row)
+        assert stream.value == pytest.approx(bollinger_bands(candles[:i + 1], 20, 2))
+
+
+def test_handler_feeds_only_new_candles():
+    candles = _candles(200)
+    handler = IndicatorsHandler({"sma1": ("sma", 10), "sma1_prev": ("sma", 10, 1), "bb": ("bollinger_bands", 20, 2)})
+    for end in range(30, 201):
+        window = candles[end - 30:end]
+        handler.update_candles(window)
+        assert handler.get("sma1") == pytest.approx(sma(window, 10))
+        assert handler.get("sma1_prev") == pytest.approx(sma(window, 10, 1))
+        assert handler.get("bb") == pytest.approx(bollinger_bands(window, 20, 2))
+    assert len(handler._cache["sma1"]) == 171
+
+
+def test_handler_accepts_candle_buffer():
+    candles = _candles(100)
+    buf = CandleBuffer(30)
+    handler = IndicatorsHandler({"sma2": ("sma", 27), "bb": ("bollinger_bands", 20, 2)})
+    for row in candles:
+        buf.append(row)
+        handler.update_candles(buf)
+    assert handler.get("sma2") == pytest.approx(sma(buf, 27))
+    assert handler.get("bb") == pytest.approx(bollinger_bands(candles, 20, 2))
+
+
+def test_streaming_period_beyond_window_uses_full_history():
+    # MA2 = 40 при окне 30: пакетная sma видит только 30 свечей, потоковая - все 40
+    candles = _candles(100)
+    handler = IndicatorsHandler({"sma2": ("sma", 40)})
+    for end in range(30, 101):
+        window = candles[end - 30:end]
+        handler.update_candles(window)
+    assert handler.get("sma2") == pytest.approx(sma(candles, 40))
+    assert handler.get("sma2") != pytest.approx(sma(window, 40))
+
+
+def test_streaming_indicator_requires_update():
+    from indicators.base import StreamingIndicator
+
+    class _NoUpdate(StreamingIndicator):
+        pass
+
+    with pytest.raises(TypeError):
+        _NoUpdate()
+
+
+@pytest.mark.parametrize("as_buffer", [True, False])
+def test_revised_last_candle_is_reapplied(as_buffer):
+    candles = _candles(80)
+    config = {"sma": ("sma", 10), "sma_prev": ("sma", 10, 1), "bb": ("bollinger_bands", 20, 2)}
+    handler = IndicatorsHandler(config)
+    buf = CandleBuffer(30)
+    for i, row in enumerate(candles):
+        buf.append(row)
+        handler.update_candles(buf if as_buffer else buf.rows().tolist())
+        # незакрытый бар исправлен на месте дважды
+        for shift in (3.0, -7.0):
+            revised = list(row)
+            revised[4] += shift
+            buf.replace_last(revised)
+            handler.update_candles(buf if as_buffer else buf.rows().tolist())
+        if i >= 30:
+            assert handler.get("sma") == pytest.approx(sma(buf, 10))
+            assert handler.get("sma_prev") == pytest.approx(sma(buf, 10, 1))
+            assert handler.get("bb") == pytest.approx(bollinger_bands(buf, 20, 2))
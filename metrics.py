@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+
+
+class Histogram:
+    """
+    Гистограмма задержек с лог-линейными корзинами, как в HdrHistogram:
+    значения хранятся в микросекундах, каждая степень двойки делится на
+    HALF корзин, поэтому относительная погрешность не больше 1 / HALF
+    на всём диапазоне, а запись - O(1) без выделения памяти.
+    """
+
+    SUB_BITS = 5
+    HALF = 1 << (SUB_BITS - 1)
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def index(cls, us):
+        shift = us.bit_length() - cls.SUB_BITS
+        if shift <= 0:
+            return us
+        return shift * cls.HALF + (us >> shift)
+
+    @classmethod
+    def upper_bound(cls, index):
+        """Верхняя граница корзины index, мкс"""
+        if index < 2 * cls.HALF:
+            return index + 1
+        shift, top = divmod(index, cls.HALF)
+        shift -= 1
+        return (top + cls.HALF + 1) << shift
+
+    def record(self, seconds):
+        us = int(seconds * 1e6) if seconds > 0 else 0
+        i = self.index(us)
+        with self._lock:
+            counts = self.counts
+            if i >= len(counts):
+                counts.extend([0] * (i + 1 - len(counts)))
+            counts[i] += 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q):
+        """Значение (сек), не меньше которого доля q записей, с точностью корзины"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, q * self.count)
+            seen = 0
+            for i, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank:
+                    return min(self.upper_bound(i) / 1e6, self.max)
+
+    def buckets(self):
+        """[(верхняя граница, сек; накопленное число записей)] по непустым корзинам"""
+        with self._lock:
+            result = []
+            seen = 0
+            for i, n in enumerate(self.counts):
+                if n:
+                    seen += n
+                    result.append((self.upper_bound(i) / 1e6, seen))
+            return result
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+    def cumulative(self, bounds):
+        """Накопленное число записей не больше каждой границы bounds (сек, по возрастанию)"""
+        with self._lock:
+            result = []
+            seen = 0
+            i = 0
+            counts = self.counts
+            for bound in bounds:
+                while i < len(counts) and self.upper_bound(i) <= bound * 1e6:
+                    seen += counts[i]
+                    i += 1
+                result.append(seen)
+            return result
+
+    def time(self):
+        """with histogram.time(): ... - записать длительность блока"""
+        return Span(self)
+
+
+class Span:
+    """Интервал по монотонным часам; при выходе длительность пишется в гистограмму"""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.started)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, _escape(v)) for k, v in pairs) + "}"
+
+
+class Registry:
+    """
+    Именованные счётчики и гистограммы с метками (символ, стратегия, этап).
+    Один и тот же набор меток возвращает один и тот же объект, поэтому его
+    стоит получить заранее и держать ссылку - запись тогда не ищет по словарю.
+    exposition() - текстовый формат Prometheus.
+    """
+
+    # границы бакетов гистограмм при экспорте, сек
+    EXPORT_BOUNDS = (
+        1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+        0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+    )
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, factory, name, help, labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._metrics.get(name)
+            if family is None:
+                family = self._metrics[name] = (kind, help, {})
+            elif family[0] != kind:
+                raise ValueError("%s is already registered as %s" % (name, family[0]))
+            series = family[2]
+            if key not in series:
+                series[key] = factory()
+            return series[key]
+
+    def counter(self, name, help="", **labels):
+        return self._get("counter", Counter, name, help, labels)
+
+    def histogram(self, name, help="", **labels):
+        return self._get("histogram", Histogram, name, help, labels)
+
+    def exposition(self):
+        with self._lock:
+            families = [(name, kind, help, list(series.items())) for name, (kind, help, series) in sorted(self._metrics.items())]
+        lines = []
+        for name, kind, help, series in families:
+            if help:
+                lines.append("# HELP %s %s" % (name, help))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for labels, metric in series:
+                if kind == "counter":
+                    lines.append("%s%s %d" % (name, _labels(labels), metric.value))
+                    continue
+                counts = metric.cumulative(self.EXPORT_BOUNDS)
+                for bound, n in zip(self.EXPORT_BOUNDS, counts):
+                    lines.append("%s_bucket%s %d" % (name, _labels(labels, [("le", repr(bound))]), n))
+                lines.append("%s_bucket%s %d" % (name, _labels(labels, [("le", "+Inf")]), metric.count))
+                lines.append("%s_sum%s %r" % (name, _labels(labels), metric.total))
+                lines.append("%s_count%s %d" % (name, _labels(labels), metric.count))
+        return "\n".join(lines) + "\n"
+
+
+# общий реестр процесса
+REGISTRY = Registry()
+
+
+def write_textfile(path, registry=REGISTRY):
+    """Записать exposition() в файл для textfile collector node_exporter (атомарно)"""
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "w") as f:
+        f.write(registry.exposition())
+    os.replace(tmp, path)
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """HTTP-эндпоинт /metrics в фоновом потоке; возвращает сервер (shutdown() - остановить)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.exposition().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
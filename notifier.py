@@ -0,0 +1,74 @@
+import logging
+import queue
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+def desktop_notify(title, message):
+    from plyer import notification
+    notification.notify(title=title, message=message, app_name="АТС", app_icon="notification.ico")
+
+
+class Notifier:
+    """
+    Уведомления рабочего стола в отдельном фоновом потоке.
+
+    notify() не ждёт показа. Поток, получив уведомление, ещё COALESCE_DELAY
+    секунд собирает следующие и показывает их одним уведомлением, чтобы серия
+    ордеров не превращалась в серию всплывающих окон.
+    """
+
+    COALESCE_DELAY = 1.0
+    MAX_LINES = 5
+
+    def __init__(self, send=desktop_notify):
+        self.send = send
+        self.sent = 0
+        self.coalesced = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._loop, name="notifier", daemon=True)
+        self._thread.start()
+
+    def notify(self, title, message):
+        self._queue.put((title, message))
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.COALESCE_DELAY
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._send(batch)
+                    return
+                batch.append(item)
+            self._send(batch)
+
+    def _send(self, batch):
+        if len(batch) == 1:
+            title, message = batch[0]
+        else:
+            title = "%s (%s)" % (batch[-1][0], len(batch))
+            message = "\n".join(m for _, m in batch[-self.MAX_LINES:])
+            self.coalesced += len(batch) - 1
+        try:
+            self.send(title, message)
+            self.sent += 1
+        except Exception:
+            logger.exception("notification failed")
@@ -0,0 +1,144 @@
+import argparse
+import bisect
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy
+from backtest import Backtest, load_history
+from candles import as_rows
+from strategies.base import get_parameters
+
+
+def build_space(strategy_cls, overrides=None):
+    """
+    Пространство перебора из StrategyParameter стратегии: {имя: список значений}.
+    Параметры без space фиксируются на default; overrides заменяет space отдельных параметров.
+    """
+    overrides = overrides or {}
+    space = {}
+    for k, v in get_parameters(strategy_cls).items():
+        values = overrides.get(k, v.space)
+        space[k] = list(values) if values is not None else [v.default]
+    return space
+
+
+def grid(space):
+    names = list(space)
+    for values in itertools.product(*(space[k] for k in names)):
+        yield dict(zip(names, values))
+
+
+def random_search(space, n, seed=None):
+    rnd = random.Random(seed)
+    for _ in range(n):
+        yield {k: rnd.choice(v) for k, v in space.items()}
+
+
+# история свечей в процессе-воркере: view на общую память, заполняется в _init_worker
+_worker = {}
+
+
+def _init_worker(shm_name, shape, strategy_cls, backtest_kwargs):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["shm"] = shm
+    # в общей памяти колонки (6, n), Backtest получает их транспонированными без копирования
+    _worker["history"] = numpy.ndarray(shape, dtype=numpy.float64, buffer=shm.buf).T
+    _worker["strategy_cls"] = strategy_cls
+    _worker["backtest_kwargs"] = backtest_kwargs
+
+
+def _run_batch(param_sets):
+    results = []
+    for params in param_sets:
+        backtest = Backtest(_worker["strategy_cls"], _worker["history"], params, **_worker["backtest_kwargs"])
+        results.append((params, backtest.run().summary()))
+    return results
+
+
+class Optimizer:
+    """
+    Перебор параметров стратегии бэктестами в пуле процессов.
+
+    История свечей один раз кладётся в shared memory, воркеры читают её напрямую,
+    на каждую задачу передаются только наборы параметров. Результаты отдаются
+    по мере готовности, self.leaderboard всегда отсортирован по metric от лучшего:
+    по убыванию, а для метрик из MINIMIZE (или maximize=False) - по возрастанию.
+    """
+
+    # метрики, у которых меньше - лучше
+    MINIMIZE = {"max_drawdown", "elapsed"}
+
+    def __init__(self, strategy_cls, candles, metric="pnl", processes=None, maximize=None, **backtest_kwargs):
+        self.strategy_cls = strategy_cls
+        self.candles = candles
+        self.metric = metric
+        self.maximize = metric not in self.MINIMIZE if maximize is None else maximize
+        self.processes = processes or os.cpu_count()
+        self.backtest_kwargs = backtest_kwargs
+        self.leaderboard = []
+        self._scores = []
+
+    def _rank(self, params, summary):
+        score = -summary[self.metric] if self.maximize else summary[self.metric]
+        pos = bisect.bisect_right(self._scores, score)
+        self._scores.insert(pos, score)
+        self.leaderboard.insert(pos, (params, summary))
+        return pos + 1
+
+    def run(self, param_sets, batch_size=None):
+        """Генератор (место в рейтинге, параметры, итоги бэктеста) в порядке готовности"""
+        param_sets = list(param_sets)
+        if batch_size is None:
+            batch_size = max(1, len(param_sets) // (self.processes * 8))
+        columns = as_rows(self.candles).T
+        shm = shared_memory.SharedMemory(create=True, size=max(columns.nbytes, 1))
+        try:
+            numpy.ndarray(columns.shape, dtype=numpy.float64, buffer=shm.buf)[:] = columns
+            initargs = (shm.name, columns.shape, self.strategy_cls, self.backtest_kwargs)
+            with ProcessPoolExecutor(self.processes, initializer=_init_worker, initargs=initargs) as pool:
+                futures = [
+                    pool.submit(_run_batch, param_sets[i:i + batch_size])
+                    for i in range(0, len(param_sets), batch_size)
+                ]
+                for future in as_completed(futures):
+                    for params, summary in future.result():
+                        yield self._rank(params, summary), params, summary
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+def _parse_space(pairs):
+    overrides = {}
+    for pair in pairs:
+        k, v = pair.split("=", 1)
+        overrides[k] = range(*map(int, v.split(":")))
+    return overrides
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перебор параметров стратегии по кэшу свечей")
+    parser.add_argument("strategy", help="модуль в strategies/, например strat1")
+    parser.add_argument("symbol", help="символ как в кэше, например BTC/USD")
+    parser.add_argument("--exchange", default=None, help="каталог кэша биржи (по умолчанию как у коннектора)")
+    parser.add_argument("--space", action="append", default=[], help="NAME=start:stop[:step]")
+    parser.add_argument("--random", type=int, default=None, help="число случайных наборов вместо полной сетки")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--metric", default="pnl")
+    parser.add_argument("--minimize", action="store_true", default=None,
+                        help="меньше metric - лучше (для max_drawdown и elapsed по умолчанию)")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    strategy_cls = __import__("strategies." + args.strategy, fromlist=["Strategy"]).Strategy
+    history = load_history(args.symbol, strategy_cls.TIMEFRAME, exchange=args.exchange)
+    space = build_space(strategy_cls, _parse_space(args.space))
+    param_sets = grid(space) if args.random is None else random_search(space, args.random)
+    maximize = None if args.minimize is None else not args.minimize
+    optimizer = Optimizer(strategy_cls, history, args.metric, args.processes, maximize, symbol=args.symbol)
+    for rank, params, summary in optimizer.run(param_sets):
+        print(rank, params, summary[args.metric])
+    for params, summary in optimizer.leaderboard[:args.top]:
+        print(params, summary)
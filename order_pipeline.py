@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# методы коннектора, которые через конвейер выполняются асинхронно
+ORDER_METHODS = frozenset((
+    "create_order", "create_market_order", "create_limit_order", "create_stoplimit_order",
+    "create_takeprofitlimit_order", "create_stop_order", "create_orders",
+    "cancel_order", "cancel_orders", "cancel_all",
+))
+
+# время подписи и сети текущего ордера; через contextvars доходит до потока,
+# в котором ccxt выполняет запрос (RequestScheduler, цикл asyncio)
+_trace = contextvars.ContextVar("order_trace", default=None)
+
+
+def _timed(func, stage):
+    """Обёртка метода ccxt: время вызова добавляется в trace[stage] текущего ордера"""
+    if asyncio.iscoroutinefunction(func):
+        async def wrapper(*args, **kwargs):
+            trace = _trace.get()
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                if trace is not None:
+                    trace[stage] += time.perf_counter() - started
+    else:
+        def wrapper(*args, **kwargs):
+            trace = _trace.get()
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if trace is not None:
+                    trace[stage] += time.perf_counter() - started
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def instrument(api):
+    """Засекать sign (подпись запроса) и fetch (HTTP) у объекта ccxt; повторный вызов ничего не меняет"""
+    for method, stage in (("sign", "sign"), ("fetch", "network")):
+        func = getattr(api, method, None)
+        if func is not None and not hasattr(func, "__wrapped__"):
+            setattr(api, method, _timed(func, stage))
+
+
+class _Intent:
+    __slots__ = ("method", "args", "kwargs", "future", "submitted")
+
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class OrderPipeline:
+    """
+    Асинхронная отправка ордеров: стратегия передаёт намерение и сразу
+    получает concurrent.futures.Future, запросы к бирже выполняет отдельный
+    поток-отправитель по порядку поступления.
+
+    Вместо коннектора передаётся в handle_data_candle: методы из ORDER_METHODS
+    возвращают Future с результатом метода коннектора, остальные атрибуты
+    берутся у коннектора как есть. Реакция на исполнение без ожидания -
+    future.add_done_callback (вызывается в потоке-отправителе).
+
+    Время каждого ордера по этапам пишется в histograms (Histogram, можно
+    передать свои - из metrics.Registry):
+    queue - от submit до начала отправки, sign - подпись запроса в ccxt,
+    network - HTTP-запрос, ack - остальное: разбор ответа, очередь лимитов
+    запросов и обработчики коннектора (register_call_handler). Без объекта
+    ccxt (SimulatedExchange) sign и network не пишутся.
+    """
+
+    STAGES = ("queue", "sign", "network", "ack")
+
+    def __init__(self, exchange_api, histograms=None):
+        self.exchange_api = exchange_api
+        self.histograms = histograms or {stage: Histogram() for stage in self.STAGES}
+        self._traced = getattr(exchange_api, "api", None) is not None
+        if self._traced:
+            instrument(exchange_api.api)
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.failed = 0
+
+    def submit(self, method, *args, **kwargs):
+        """exchange_api.method(*args, **kwargs) в потоке-отправителе; возвращает Future"""
+        intent = _Intent(method, args, kwargs)
+        with self._lock:
+            self.submitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="order-sender", daemon=True)
+                self._thread.start()
+        self._queue.put(intent)
+        return intent.future
+
+    def __getattr__(self, name):
+        if name in ORDER_METHODS:
+            return lambda *args, **kwargs: self.submit(name, *args, **kwargs)
+        return getattr(self.exchange_api, name)
+
+    def stop(self, timeout=None):
+        """Отправляет уже принятые ордера и останавливает поток"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def summary(self):
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def _loop(self):
+        while True:
+            intent = self._queue.get()
+            if intent is None:
+                return
+            self._send(intent)
+
+    def _send(self, intent):
+        started = time.perf_counter()
+        self.histograms["queue"].record(started - intent.submitted)
+        if not intent.future.set_running_or_notify_cancel():
+            return
+        trace = {"sign": 0.0, "network": 0.0}
+        token = _trace.set(trace)
+        try:
+            result = getattr(self.exchange_api, intent.method)(*intent.args, **intent.kwargs)
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        finally:
+            _trace.reset(token)
+        total = time.perf_counter() - started
+        if self._traced:
+            self.histograms["sign"].record(trace["sign"])
+            self.histograms["network"].record(trace["network"])
+        self.histograms["ack"].record(max(0.0, total - trace["sign"] - trace["network"]))
+        if error is not None:
+            self.failed += 1
+            logger.warning("%s failed: %r", intent.method, error)
+            intent.future.set_exception(error)
+        else:
+            intent.future.set_result(result)
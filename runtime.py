@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from candles import CandleFeed
+from scheduler import BarScheduler
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Series:
+    """Один ряд свечей (биржа, символ, таймфрейм) и стратегии, подписанные на него"""
+
+    def __init__(self, exchange_api, symbol, timeframe, window_length, delta_sync):
+        self.feed = CandleFeed(exchange_api, symbol, timeframe, window_length, delta_sync)
+        self.sync_time = metrics.REGISTRY.histogram("runtime_sync_seconds", "Загрузка ряда свечей на баре",
+                                                    symbol=symbol, timeframe=timeframe)
+        self.subscribers = []
+        self.delivered = None
+        self.lock = threading.Lock()
+
+    def resize(self, window_length):
+        # под lock: _sync в потоке пула может в это время загружать ряд
+        with self.lock:
+            if window_length > self.feed.window_length:
+                feed = self.feed
+                self.feed = CandleFeed(feed.exchange_api, feed.symbol, feed.timeframe, window_length, feed.delta_sync)
+                self.delivered = None
+
+
+class Runtime:
+    """
+    Общая среда для многих подписок (стратегия, символ, таймфрейм).
+
+    На каждый таймфрейм - одна подписка в планировщике. На границе бара каждый
+    различный ряд (биржа, символ, таймфрейм) загружается один раз, параллельно
+    в пуле из max_workers потоков, и снимок окна раздаётся всем стратегиям ряда.
+    Число запросов к бирже растёт с числом рядов, а не стратегий:
+    last_bar_requests - сколько рядов синхронизировано на последнем баре.
+    """
+
+    def __init__(self, max_workers=8, delta_sync=True, scheduler=None):
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="Runtime")
+        self.scheduler = scheduler or BarScheduler()
+        self.delta_sync = delta_sync
+        self.last_bar_requests = 0
+        self._series = {}
+        self._timeframes = {}
+        self._clock_offsets = {}
+        self._busy = {}
+        self._lock = threading.Lock()
+
+    def add(self, executor):
+        key = (executor.exchange_api, executor.symbol, executor.strategy.TIMEFRAME)
+        window_length = executor.strategy.WINDOW_LENGTH
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Series(*key, window_length, self.delta_sync)
+            series.resize(window_length)
+            series.subscribers.append(executor)
+            self._busy[executor] = threading.Lock()
+        offset = self._clock_offsets.get(executor.exchange_api)
+        if offset is None:
+            offset = self._clock_offsets[executor.exchange_api] = executor.exchange_api.fetch_time_offset()
+        executor.clock_offset = offset
+        tf = executor.strategy.TIMEFRAME
+        with self._lock:
+            if tf not in self._timeframes:
+                self._timeframes[tf] = self.scheduler.subscribe_bars(
+                    executor.tf_seconds, lambda bar_close: self._on_bar(tf, bar_close), offset
+                )
+        # первый прогон сразу, как у самостоятельного Executor
+        now = time.time() + offset
+        bar_close = now - now % executor.tf_seconds
+        with series.lock:
+            delivered = series.delivered == bar_close
+        if delivered:
+            self.pool.submit(self._deliver, executor, series.feed.candles.copy(), bar_close, 0)
+        else:
+            self._on_bar(tf, bar_close)
+
+    def remove(self, executor):
+        with self._lock:
+            for key, series in list(self._series.items()):
+                if executor in series.subscribers:
+                    series.subscribers.remove(executor)
+                if not series.subscribers:
+                    del self._series[key]
+            self._busy.pop(executor, None)
+
+    def _on_bar(self, tf, bar_close):
+        with self._lock:
+            pending = [
+                s for s in self._series.values()
+                if s.feed.timeframe == tf and s.subscribers and s.delivered != bar_close
+            ]
+        futures = [self.pool.submit(self._sync, series, bar_close) for series in pending]
+        wait(futures)
+        self.last_bar_requests = len(futures)
+        return all(future.result() for future in futures)
+
+    def _sync(self, series, bar_close):
+        """Загружает ряд и раздаёт снимок окна подписчикам; False - бар ещё не готов"""
+        with series.lock:
+            if series.delivered == bar_close:
+                return True
+            try:
+                with series.sync_time.time():
+                    series.feed.sync()
+            except Exception:
+                logger.exception("%s %s sync error", series.feed.symbol, series.feed.timeframe)
+                return False
+            subscribers = list(series.subscribers)
+            if not subscribers or not subscribers[0].is_ready(series.feed.candles, bar_close):
+                return False
+            series.delivered = bar_close
+            snapshot = series.feed.candles.copy()
+        for executor in subscribers:
+            self.pool.submit(self._deliver, executor, snapshot, bar_close, series.feed.last_fetched)
+        return True
+
+    def _deliver(self, executor, candles, bar_close, fetched):
+        lock = self._busy.get(executor)
+        if lock is None:
+            return
+        with lock:
+            try:
+                executor.handle_candles(candles, bar_close, fetched)
+            except Exception:
+                logger.exception("%s strategy error", executor.symbol)
+
+    def shutdown(self):
+        for sub in self._timeframes.values():
+            self.scheduler.unsubscribe(sub)
+        self.pool.shutdown(wait=False)
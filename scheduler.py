@@ -0,0 +1,145 @@
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+
+    def __init__(self, callback, period, aligned, clock_offset):
+        self.callback = callback
+        self.period = period
+        self.aligned = aligned
+        self.clock_offset = clock_offset
+        self.active = True
+        # время события (закрытие бара по часам биржи) и номер попытки
+        self.event_time = None
+        self.attempt = 0
+        self.last_delay = None
+        self.missed = 0
+
+
+class BarScheduler:
+    """
+    Один поток-таймер на все подписки: поток спит до ближайшего события
+    (Condition.wait с точным таймаутом) вместо опроса раз в 0.2 с.
+
+    Для баров событие - граница свечи по часам биржи (локальное время + clock_offset).
+    Колбэк получает время закрытия бара (сек, часы биржи) и возвращает False,
+    если закрытая свеча ещё не доступна: тогда он повторяется через RETRY_DELAY,
+    не более MAX_RETRIES раз. last_delay подписки - задержка от закрытия бара
+    до успешного вызова колбэка.
+
+    Колбэки выполняются в пуле из WORKERS потоков (или в переданном executor),
+    поэтому медленная загрузка одного символа не задерживает бары остальных;
+    одна подписка вызывается не чаще одного раза одновременно - следующее её
+    событие ставится в очередь только после завершения колбэка.
+    """
+
+    RETRY_DELAY = 0.5
+    MAX_RETRIES = 20
+    WORKERS = 4
+
+    def __init__(self, clock_offset=0.0, executor=None):
+        self.clock_offset = clock_offset
+        # concurrent.futures.Executor для колбэков; None - свой пул на WORKERS потоков
+        self.executor = executor
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def subscribe_bars(self, period, callback, clock_offset=None):
+        """Колбэк на каждую границу свечи длиной period секунд"""
+        offset = self.clock_offset if clock_offset is None else clock_offset
+        sub = Subscription(callback, period, True, offset)
+        server_now = time.time() + offset
+        sub.event_time = (math.floor(server_now / period) + 1) * period
+        self._push(sub, sub.event_time - offset)
+        return sub
+
+    def subscribe_interval(self, period, callback):
+        """Колбэк каждые period секунд без привязки к свечам (тики)"""
+        sub = Subscription(callback, period, False, 0.0)
+        sub.event_time = time.time() + period
+        self._push(sub, sub.event_time)
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.active = False
+
+    def _push(self, sub, due):
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._seq), sub))
+            if self._thread is None:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(self.WORKERS, thread_name_prefix="BarScheduler-worker")
+                self._thread = threading.Thread(target=self._loop, name="BarScheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    while self._heap and not self._heap[0][2].active:
+                        heapq.heappop(self._heap)
+                    if self._heap:
+                        timeout = self._heap[0][0] - time.time()
+                        if timeout <= 0:
+                            break
+                        self._cond.wait(timeout)
+                    else:
+                        self._cond.wait()
+                _, _, sub = heapq.heappop(self._heap)
+            self.executor.submit(self._dispatch, sub)
+
+    def _dispatch(self, sub):
+        if not sub.active:
+            return
+        delay = time.time() + sub.clock_offset - sub.event_time
+        try:
+            done = sub.callback(sub.event_time) is not False
+        except Exception:
+            logger.exception("scheduler callback error")
+            done = True
+        if not sub.active:
+            return
+        if not done and sub.attempt < self.MAX_RETRIES:
+            sub.attempt += 1
+            self._push(sub, time.time() + self.RETRY_DELAY)
+            return
+        if done:
+            sub.last_delay = delay
+        sub.attempt = 0
+        if sub.aligned:
+            # если колбэк не успел до следующих границ, пропущенные бары не догоняем
+            server_now = time.time() + sub.clock_offset
+            next_time = sub.event_time + sub.period
+            if next_time <= server_now:
+                skipped = math.floor((server_now - next_time) / sub.period) + 1
+                sub.missed += skipped
+                next_time += skipped * sub.period
+            sub.event_time = next_time
+            self._push(sub, next_time - sub.clock_offset)
+        else:
+            sub.event_time = max(sub.event_time + sub.period, time.time())
+            self._push(sub, sub.event_time)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """Общий планировщик процесса"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = BarScheduler()
+        return _default
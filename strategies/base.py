@@ -1,16 +1,25 @@
 
 
 class StrategyParameter:
+    """
+    space - значения параметра для перебора в оптимизаторе (например range(5, 50)),
+    None - параметр не перебирается и берётся default.
+    """
 
-    def __init__(self, verbose_name, value_type, default):
+    def __init__(self, verbose_name, value_type, default, space=None):
         self.verbose_name = verbose_name
         self.value_type = value_type
         self.default = default
+        self.space = space
 
 
 class BaseStrategy:
 
     VERBOSE_NAME = "Базовая стратегия"
+    # период вызова handle_data_tick, сек; None - тики не нужны
+    TICK_INTERVAL = None
+    # True - api в handle_data_* это OrderPipeline: ордера возвращают Future
+    ASYNC_ORDERS = False
 
     def __init(self, strat_params):
         self.state = None
@@ -22,3 +31,12 @@ class BaseStrategy:
 
     def handle_data_tick(self, api, data, indicators):
         pass
+
+
+def get_parameters(strategy_cls):
+    """Настраиваемые параметры стратегии: {имя атрибута: StrategyParameter}"""
+    return {k: v for k, v in vars(strategy_cls).items() if isinstance(v, StrategyParameter)}
+
+
+def default_params(strategy_cls):
+    return {k: v.default for k, v in get_parameters(strategy_cls).items()}
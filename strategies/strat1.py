@@ -9,8 +9,9 @@ class Strategy(BaseStrategy):
     VERBOSE_NAME = "Персечение двух SMA"
     WINDOW_LENGTH = 30
     TIMEFRAME = "1m"
-    MA1 = StrategyParameter("Период MA1", "int", 10)
-    MA2 = StrategyParameter("Период MA2", "int", 27)
+    # sma*_prev смещены на свечу: период + 1 должен помещаться в окно
+    MA1 = StrategyParameter("Период MA1", "int", 10, space=range(3, WINDOW_LENGTH))
+    MA2 = StrategyParameter("Период MA2", "int", 27, space=range(10, WINDOW_LENGTH))
     BALANCE = StrategyParameter("Баланс для торговли", "int", 5)
 
     def __init__(self, strat_params):
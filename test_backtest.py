@@ -0,0 +1,144 @@
+import numpy
+import pytest
+from backtest import Backtest, SimulatedExchange, load_history
+from strategies.base import BaseStrategy, StrategyParameter
+
+
+class _FlipStrategy(BaseStrategy):
+    WINDOW_LENGTH = 3
+    TIMEFRAME = "1m"
+    AMOUNT = StrategyParameter("Объём", "int", 2)
+
+    def __init__(self, strat_params):
+        self.state = None
+        self.strat_params = strat_params
+        self.INDICATORS = {"sma": ("sma", 2)}
+        self.calls = 0
+
+    def handle_data_candle(self, api, data, indi):
+        self.calls += 1
+        assert len(data["candles"]) == 3
+        assert indi.get("sma") == pytest.approx(numpy.mean(data["candles"].closes(2)))
+        if self.state is None:
+            api.create_market_order(data["symbol"], "buy", self.strat_params["AMOUNT"])
+            self.state = "long"
+        elif self.state == "long" and data["candles"][-1][4] >= 104:
+            api.create_market_order(data["symbol"], "sell", self.strat_params["AMOUNT"])
+            self.state = "flat"
+
+
+def _history(closes):
+    n = len(closes)
+    closes = numpy.asarray(closes, dtype=float)
+    return numpy.column_stack((numpy.arange(n) * 60000.0, closes, closes + 1, closes - 1, closes, numpy.ones(n)))
+
+
+def test_backtest_trades_and_equity():
+    result = Backtest(_FlipStrategy, _history([100, 101, 102, 103, 104, 105]), fee=0.0, initial_cash=1000.0).run()
+    assert list(result.trades["bar"]) == [2, 4]
+    assert list(result.trades["side"]) == [1, -1]
+    assert list(result.equity) == [1000.0, 1000.0, 1000.0, 1002.0, 1004.0, 1004.0]
+    assert result.pnl == 4.0
+
+
+class _AsyncFlipStrategy(_FlipStrategy):
+    ASYNC_ORDERS = True
+
+    def handle_data_candle(self, api, data, indi):
+        if self.state is None:
+            order = api.create_market_order(data["symbol"], "buy", self.strat_params["AMOUNT"])
+            assert order.done() and order.result()["status"] == "closed"
+        super().handle_data_candle(api, data, indi)
+
+
+def test_backtest_async_orders_get_resolved_futures():
+    result = Backtest(_AsyncFlipStrategy, _history([100, 101, 102, 103, 104, 105]), {"AMOUNT": 2},
+                      fee=0.0, initial_cash=1000.0).run()
+    assert list(result.trades["bar"]) == [2, 2, 4]
+
+
+def test_backtest_runs_strat1_unchanged():
+    from strategies.strat1 import Strategy
+    rng = numpy.random.default_rng(0)
+    result = Backtest(Strategy, _history(10000 + numpy.cumsum(rng.normal(0, 5, 2000)))).run()
+    assert result.summary()["bars"] == 2000
+    assert len(result.trades) > 0
+
+
+def test_simulated_limit_orders_rest_until_filled_or_canceled():
+    exchange = SimulatedExchange(fee=0.0, initial_cash=1000.0)
+    notified = []
+    exchange.register_call_handler(lambda method, params, result: notified.append((method, result["status"])))
+    exchange._set_bar([0, 100, 101, 99, 100, 1], 0)
+    low = exchange.create_limit_order("XBTUSD", "buy", 1, 95)
+    far = exchange.create_limit_order("XBTUSD", "buy", 1, 90)
+    other = exchange.create_limit_order("ETHUSD", "buy", 1, 90)
+    assert low["status"] == "open" and set(exchange.orders) == {low["id"], far["id"], other["id"]}
+    market = exchange.create_market_order("XBTUSD", "buy", 2)
+    exchange._set_bar([60000, 100, 100, 94, 96, 1], 1)
+    assert exchange.check_filled(low["id"], "XBTUSD") == {"status": "closed", "filled": 1, "remaining": 0.0}
+    assert exchange.check_filled(market["id"], "XBTUSD") == {"status": "closed", "filled": 2, "remaining": 0.0}
+    assert list(exchange.trades["bar"]) == [0, 1] and exchange.position == 3
+    assert [o["id"] for o in exchange.cancel_all("XBTUSD")] == [far["id"]]
+    assert exchange.cancel_order(far["id"], "XBTUSD") is None
+    assert [o["id"] for o in exchange.cancel_orders([other["id"]])] == [other["id"]]
+    assert exchange.check_filled(far["id"], "XBTUSD") == {"status": "canceled", "filled": 0.0, "remaining": 1}
+    assert exchange.check_filled("unknown", "XBTUSD") is None
+    assert notified[4:] == [("cancel_order", "canceled"), ("cancel_order", "canceled")]
+
+
+def test_simulated_limit_orders_have_no_lookahead():
+    exchange = SimulatedExchange(fee=0.0, initial_cash=1000.0)
+    exchange._set_bar([0, 100, 105, 95, 100, 1], 0)
+    # 97 внутри диапазона уже закрытой свечи: исполнится только на следующей
+    inside = exchange.create_limit_order("XBTUSD", "buy", 1, 97)
+    assert inside["status"] == "open" and not len(exchange.trades)
+    # ордер лучше закрытия исполняется сразу по закрытию
+    marketable = exchange.create_limit_order("XBTUSD", "buy", 1, 110)
+    assert marketable["status"] == "closed" and marketable["average"] == 100
+    sell = exchange.create_limit_order("XBTUSD", "sell", 1, 90)
+    assert sell["status"] == "closed" and sell["average"] == 100
+    # следующая свеча открылась ниже лимита: исполнение по открытию
+    exchange._set_bar([60000, 94, 96, 93, 95, 1], 1)
+    assert exchange.orders[inside["id"]]["average"] == 94
+    assert list(exchange.trades["price"]) == [100, 100, 94]
+    assert list(exchange.trades["bar"]) == [0, 0, 1]
+
+
+def test_strat1_space_fits_window():
+    from strategies.strat1 import Strategy
+    for name in ("MA1", "MA2"):
+        assert max(getattr(Strategy, name).space) + 1 <= Strategy.WINDOW_LENGTH
+
+
+def test_optimizer_ranks_grid_results():
+    from optimizer import Optimizer, build_space, grid
+    from strategies.strat1 import Strategy
+    space = build_space(Strategy, {"MA1": [5, 10], "MA2": [20, 27]})
+    assert space["BALANCE"] == [5]
+    rng = numpy.random.default_rng(0)
+    optimizer = Optimizer(Strategy, _history(10000 + numpy.cumsum(rng.normal(0, 5, 500))), processes=2)
+    ranked = list(optimizer.run(grid(space)))
+    assert len(ranked) == len(optimizer.leaderboard) == 4
+    scores = [summary["pnl"] for _, summary in optimizer.leaderboard]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_optimizer_ranks_lower_is_better_metric_ascending():
+    from optimizer import Optimizer
+    from strategies.strat1 import Strategy
+    optimizer = Optimizer(Strategy, _history(numpy.full(10, 100.0)), metric="max_drawdown")
+    assert not optimizer.maximize
+    ranks = [optimizer._rank({"n": i}, {"max_drawdown": dd}) for i, dd in enumerate((5.0, 1.0, 3.0))]
+    assert ranks == [1, 1, 2]
+    assert [summary["max_drawdown"] for _, summary in optimizer.leaderboard] == [1.0, 3.0, 5.0]
+    assert Optimizer(Strategy, None, metric="max_drawdown", maximize=True).maximize
+
+
+def test_load_history_uses_connector_cache_and_rejects_empty(tmp_path):
+    from connectors.bitmex.bitmex import Bitmex
+    from connectors.ohlcv_cache import OHLCVCache
+    OHLCVCache(str(tmp_path), Bitmex.CACHE_NAME).write("BTC/USD", "1m", _history([100, 101]).tolist())
+    assert len(load_history("BTC/USD", "1m", cache_dir=str(tmp_path))) == 2
+    with pytest.raises(ValueError):
+        load_history("BTC/USD", "5m", cache_dir=str(tmp_path))
@@ -0,0 +1,87 @@
+import numpy
+from candles import CandleBuffer, CandleFeed, closes
+
+
+def _rows(n, start=0):
+    return [[(start + i) * 60000, i + 1.0, i + 2.0, i + 0.5, i + 1.5, 10.0] for i in range(n)]
+
+
+def test_ring_buffer_keeps_last_rows_contiguous():
+    buf = CandleBuffer(5)
+    for row in _rows(12):
+        buf.append(row)
+    assert len(buf) == 5
+    assert buf.close.flags["C_CONTIGUOUS"]
+    assert list(buf.close) == [r[4] for r in _rows(12)[-5:]]
+    assert buf[-1][4] == 12.5
+    assert list(buf.closes(2)) == [11.5, 12.5]
+    assert buf.close.base is not None  # view, not a copy
+
+
+def test_extend_wraps_and_matches_appends():
+    a, b = CandleBuffer(7), CandleBuffer(7)
+    rows = _rows(20)
+    for row in rows:
+        a.append(row)
+    b.extend(rows[:3])
+    b.extend(rows[3:11])
+    b.extend(rows[11:15])
+    b.extend(rows[15:])
+    assert numpy.array_equal(a.rows(), b.rows())
+
+
+def test_update_merges_overlapping_window():
+    buf = CandleBuffer(10)
+    assert buf.update(_rows(10)) == 10
+    window = _rows(10, start=1)
+    window[-2][4] = 99.0
+    assert buf.update(window) == 1
+    assert buf.timestamp[0] == 60000
+    assert buf.close[-2] == 99.0
+
+
+def test_closes_accepts_rows_and_buffer():
+    buf = CandleBuffer(3)
+    buf.extend(_rows(3))
+    assert list(closes(buf)) == list(closes(_rows(3))) == [1.5, 2.5, 3.5]
+
+
+class _FakeExchange:
+    timeframes = {"1m": [None, 1]}
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def fetch_last_candles(self, symbol, tf, count):
+        self.calls.append(("last", count))
+        return self.rows[-count:]
+
+    def fetch_candles_since(self, symbol, tf, since):
+        self.calls.append(("since", since))
+        return [r for r in self.rows if r[0] >= since]
+
+
+def test_feed_fetches_only_new_candles(monkeypatch):
+    rows = _rows(50, start=1000)
+    exchange = _FakeExchange(rows[:40])
+    feed = CandleFeed(exchange, "XBTUSD", "1m", 30)
+    monkeypatch.setattr("time.time", lambda: rows[-1][0] / 1000 + 60)
+    assert feed.sync() == 30 and feed.last_fetched == 30
+    exchange.rows = rows[:42]
+    assert feed.sync() == 2 and feed.last_fetched == 2
+    assert exchange.calls[-1] == ("since", rows[40][0])
+    assert feed.candles.last_timestamp == rows[41][0]
+    assert feed.full_refetches == 0
+
+
+def test_feed_refetches_window_on_gap(monkeypatch):
+    rows = _rows(50, start=1000)
+    exchange = _FakeExchange(rows[:40])
+    feed = CandleFeed(exchange, "XBTUSD", "1m", 30)
+    monkeypatch.setattr("time.time", lambda: rows[-1][0] / 1000 + 60)
+    feed.sync()
+    exchange.rows = rows[:40] + rows[45:]
+    feed.sync()
+    assert feed.full_refetches == 1
+    assert list(feed.candles.timestamp) == [r[0] for r in exchange.rows[-30:]]
@@ -0,0 +1,56 @@
+import time
+import numpy as np
+from candles import CandleBuffer
+from chart import Chart, ChartRenderer
+
+TF_MS = 60000
+
+
+def _data(rows, symbol="XBTUSD"):
+    candles = CandleBuffer(len(rows))
+    candles.extend(rows)
+    closes = [row[4] for row in rows]
+    return {"symbol": symbol, "candles": candles, "indicators": {"close": closes}}
+
+
+def _rows(count):
+    return [[i * TF_MS, 100.0 + i, 102.0 + i, 99.0 + i, 101.0 + i, 1.0] for i in range(count)]
+
+
+def test_last_bar_change_is_blitted():
+    chart = Chart()
+    rows = _rows(50)
+    chart.update(_data(rows))
+    assert (chart.full_draws, chart.blits) == (1, 0)
+    rows[-1] = rows[-1][:4] + [100.5, 2.0]
+    chart.update(_data(rows))
+    assert (chart.full_draws, chart.blits) == (1, 1)
+
+
+def test_older_bar_change_forces_full_draw():
+    chart = Chart()
+    rows = _rows(50)
+    chart.update(_data(rows))
+    # исправление закрытой свечи (например, после догрузки истории) не входит в blit
+    rows[-5] = rows[-5][:4] + [100.0, 1.0]
+    chart.update(_data(rows))
+    assert (chart.full_draws, chart.blits) == (2, 0)
+    low, high = chart._bars[-5][0].get_ydata()
+    assert (low, high) == (rows[-5][3], rows[-5][2])
+
+
+def test_renderer_produces_agg_frames():
+    renderer = ChartRenderer()
+    try:
+        renderer.submit(_data(_rows(50)))
+        deadline = time.time() + 10
+        frame = None
+        while frame is None and time.time() < deadline:
+            frame = renderer.take_frame()
+            time.sleep(0.01)
+        assert frame is not None
+        width, height, pixels = frame
+        assert len(pixels) == width * height * 4
+        assert np.frombuffer(pixels, dtype=np.uint8).any()
+    finally:
+        renderer.stop()
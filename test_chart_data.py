@@ -0,0 +1,20 @@
+import numpy as np
+from chart_data import aggregate, bucket_size, bucket_starts, decimate, indicator_columns
+
+
+def test_aggregate_buckets_aligned_to_time():
+    ts = np.arange(1, 8) * 60000.0
+    ohlc = np.column_stack((np.arange(7), np.arange(7) + 10, np.arange(7) - 10, np.arange(7) + 0.5))
+    bucket_ts, result, starts = aggregate(ts, ohlc, 3 * 60000)
+    assert list(starts) == [0, 2, 5]
+    assert list(bucket_ts) == [0, 180000, 360000]
+    assert result.tolist() == [[0, 11, -10, 1.5], [2, 14, -8, 4.5], [5, 16, -5, 6.5]]
+    assert bucket_size(50000, 400) == 125
+
+
+def test_decimate_keeps_extremes_of_each_bucket():
+    y = np.array([1, 5, 3, 2, np.nan, 0, 9, 4])
+    keep = decimate(y, bucket_starts(np.arange(8), 4))
+    assert list(keep) == [0, 1, 5, 6]
+    assert indicator_columns([None, [1, 2, 3]]).shape == (2, 3)
+    assert np.isnan(indicator_columns([None, 1.0])[0, 0])
@@ -0,0 +1,33 @@
+import threading
+from events import EventBus, OrderEvent, ChartEvent
+from notifier import Notifier
+
+
+def test_drain_keeps_orders_and_latest_chart():
+    bus = EventBus()
+    seen = []
+    bus.subscribe(OrderEvent, lambda e: seen.append(("order", e.params)))
+    bus.subscribe(ChartEvent, lambda e: seen.append(("chart", e.data)))
+    threads = [threading.Thread(target=bus.publish, args=(OrderEvent(0, "create_order", i, None),)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    bus.publish(ChartEvent(1))
+    bus.publish(ChartEvent(2))
+    assert bus.drain() == 5
+    assert sorted(p for kind, p in seen if kind == "order") == [0, 1, 2]
+    assert [d for kind, d in seen if kind == "chart"] == [2]
+    assert bus.coalesced == 1 and bus.drain() == 0
+
+
+def test_notifier_coalesces_bursts():
+    sent = []
+    done = threading.Event()
+    notifier = Notifier(lambda title, message: (sent.append((title, message)), done.set()))
+    notifier.COALESCE_DELAY = 0.2
+    for i in range(3):
+        notifier.notify("Создан ордер", "order %s" % i)
+    assert done.wait(2)
+    notifier.stop()
+    assert sent == [("Создан ордер (3)", "order 0\norder 1\norder 2")]
@@ -0,0 +1,57 @@
+import subprocess
+import sys
+import threading
+import headless
+from executor import Sink
+
+
+def test_headless_does_not_import_gui():
+    code = "import sys, headless; print(sorted(m for m in ('tkinter', 'matplotlib', 'mpl_finance', 'PIL', 'plyer') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
+
+
+class _Sink(Sink):
+    def __init__(self, stop_event):
+        self.stop_event = stop_event
+        self.bars = []
+
+    def on_candles(self, data):
+        self.bars.append(data["candles"].last_timestamp)
+        self.stop_event.set()
+
+
+def test_run_from_config(monkeypatch, fake_exchange):
+    exchange = fake_exchange
+    monkeypatch.setattr(headless, "create_exchange", lambda name, use_async=False: exchange)
+    stop = threading.Event()
+    sink = _Sink(stop)
+    # не зависнуть, если бар так и не будет готов
+    timeout = threading.Timer(10, stop.set)
+    timeout.start()
+    headless.run({"strategy": "strat1", "exchange": "fake", "symbol": "XBTUSD"}, stop, sink)
+    timeout.cancel()
+    assert sink.bars == [exchange.rows[-1][0]]
+    assert exchange.orders == [("XBTUSD", "buy", 5)]
+
+
+def test_strategies_share_runtime(monkeypatch, fake_exchange):
+    monkeypatch.setattr(headless, "create_exchange", lambda name, use_async=False: fake_exchange)
+    stop = threading.Event()
+    bars = []
+
+    class Sink2(Sink):
+        def on_candles(self, data):
+            bars.append(data["symbol"])
+            if len(bars) == 2:
+                stop.set()
+
+    timeout = threading.Timer(10, stop.set)
+    timeout.start()
+    headless.run({"exchange": "fake", "runtime": True, "strategies": [
+        {"strategy": "strat1", "symbol": "XBTUSD"},
+        {"strategy": "strat1", "symbol": "XBTUSD", "params": {"MA1": 5}},
+    ]}, stop, Sink2())
+    timeout.cancel()
+    assert bars == ["XBTUSD", "XBTUSD"]
+    assert fake_exchange.fetches == 1
@@ -0,0 +1,81 @@
+import urllib.request
+import metrics
+from executor import Executor
+
+
+class _Strategy:
+    TIMEFRAME = "1m"
+    WINDOW_LENGTH = 30
+    TICK_INTERVAL = None
+    INDICATORS = {"sma": ("sma", 5)}
+
+    def __init__(self):
+        self.state = None
+
+    def handle_data_candle(self, api, data, indicators):
+        api.create_market_order(data["symbol"], "buy", 1)
+
+
+def test_exposition_format():
+    registry = metrics.Registry()
+    registry.counter("bars_total", "Bars", symbol="XBTUSD").inc(3)
+    histogram = registry.histogram("stage_seconds", symbol='X"1', stage="sync")
+    for seconds in (0.0005, 0.002, 0.2):
+        histogram.record(seconds)
+    text = registry.exposition()
+    assert "# HELP bars_total Bars\n# TYPE bars_total counter\nbars_total{symbol=\"XBTUSD\"} 3\n" in text
+    assert '# TYPE stage_seconds histogram' in text
+    assert 'stage_seconds_bucket{stage="sync",symbol="X\\"1",le="0.001"} 1\n' in text
+    assert 'stage_seconds_bucket{stage="sync",symbol="X\\"1",le="0.25"} 3\n' in text
+    assert 'stage_seconds_bucket{stage="sync",symbol="X\\"1",le="+Inf"} 3\n' in text
+    assert 'stage_seconds_count{stage="sync",symbol="X\\"1"} 3\n' in text
+    assert registry.histogram("stage_seconds", symbol='X"1', stage="sync") is histogram
+
+
+def test_span_records_every_call():
+    # накладные расходы span меряет benchmarks/bench_suite.py (metrics)
+    histogram = metrics.Histogram()
+    n = 20000
+    for _ in range(n):
+        with histogram.time():
+            pass
+    assert histogram.count == n
+    assert 0 <= histogram.percentile(0.5) <= histogram.max
+
+
+def test_executor_records_stages_and_counters(fake_exchange):
+    registry = metrics.Registry()
+    exchange = fake_exchange
+    executor = Executor(_Strategy(), exchange, "XBTUSD", registry=registry)
+    executor._on_bar(exchange.NOW)
+    assert exchange.orders == [("XBTUSD", "buy", 1)]
+    assert executor.bars.value == 1
+    assert all(executor.stages[stage].count == 1 for stage in Executor.STAGES)
+    assert executor.stages["strategy"].total >= executor.stages["orders"].total
+    text = registry.exposition()
+    assert 'executor_orders_total{strategy="test_metrics",symbol="XBTUSD"} 1' in text
+    # история индикаторов ограничена окном стратегии
+    assert executor.data["indicators"]["sma"].maxlen == _Strategy.WINDOW_LENGTH
+    executor.stop()
+
+
+def test_serve_on_localhost():
+    registry = metrics.Registry()
+    registry.counter("up_total").inc()
+    server = metrics.serve(0, registry=registry)
+    try:
+        url = "http://127.0.0.1:%d/metrics" % server.server_address[1]
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "up_total 1" in response.read().decode()
+    finally:
+        server.shutdown()
+
+
+def test_write_textfile(tmp_path):
+    registry = metrics.Registry()
+    registry.counter("up_total").inc()
+    path = tmp_path / "diaper.prom"
+    metrics.write_textfile(str(path), registry)
+    assert path.read_text() == registry.exposition()
+    assert [p.name for p in tmp_path.iterdir()] == ["diaper.prom"]
@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+from connectors.request_scheduler import RequestScheduler, TokenBucket
+from metrics import Histogram
+from order_pipeline import OrderPipeline
+
+
+class FakeCcxt:
+    """sign и fetch как у ccxt: create_order подписывает запрос и отправляет его"""
+
+    def sign(self, order):
+        time.sleep(0.002)
+        return order
+
+    def fetch(self, request):
+        time.sleep(0.01)
+        if request["amount"] <= 0:
+            raise ValueError("bad amount")
+        return dict(request, id=str(request["amount"]))
+
+    def create_order(self, **order):
+        return self.fetch(self.sign(order))
+
+
+class FakeExchange:
+    def __init__(self):
+        self.api = FakeCcxt()
+        self.requests = RequestScheduler({"rest": TokenBucket(100, 100)}, {"order": (0, ("rest",))}, workers=2)
+        self.sent = []
+
+    def create_market_order(self, symbol, side, amount):
+        order = self.requests.call("order", self.api.create_order, symbol=symbol, side=side, amount=amount)
+        self.sent.append(order["id"])
+        return order
+
+    def fetch_balance(self):
+        return {"free": 1}
+
+
+def test_histogram_percentiles_within_bucket_precision():
+    h = Histogram()
+    for us in range(1, 10001):
+        h.record(us / 1e6)
+    assert h.count == 10000
+    assert h.percentile(0.5) == pytest.approx(0.005, rel=1 / Histogram.HALF)
+    assert h.percentile(0.99) == pytest.approx(0.0099, rel=1 / Histogram.HALF)
+    assert h.percentile(1.0) == h.max == 0.01
+    bounds = [bound for bound, _ in h.buckets()]
+    assert bounds == sorted(bounds) and h.buckets()[-1][1] == 10000
+
+
+def test_histogram_bucket_bounds_are_contiguous():
+    for i in range(1, 500):
+        assert Histogram.index(Histogram.upper_bound(i - 1)) == i
+
+
+class GatedCcxt(FakeCcxt):
+    """Отправка ждёт, пока тест не откроет gate"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+
+    def fetch(self, request):
+        assert self.gate.wait(5)
+        return super().fetch(request)
+
+
+def test_orders_return_futures_in_submit_order():
+    exchange = FakeExchange()
+    exchange.api = GatedCcxt()
+    pipeline = OrderPipeline(exchange)
+    # биржа не отвечает, а ордера уже поставлены: вызов не ждёт сети
+    futures = [pipeline.create_market_order("XBTUSD", "buy", amount) for amount in range(1, 6)]
+    assert not any(f.done() for f in futures)
+    exchange.api.gate.set()
+    assert [f.result(1)["id"] for f in futures] == ["1", "2", "3", "4", "5"]
+    assert pipeline.summary()["network"]["count"] == 5
+    assert exchange.sent == ["1", "2", "3", "4", "5"]
+    assert pipeline.fetch_balance() == {"free": 1}
+    pipeline.stop()
+
+
+def test_stage_histograms_follow_call_into_request_threads():
+    pipeline = OrderPipeline(FakeExchange())
+    for amount in range(1, 4):
+        pipeline.create_market_order("XBTUSD", "buy", amount).result(1)
+    stages = pipeline.summary()
+    assert all(stages[stage]["count"] == 3 for stage in OrderPipeline.STAGES)
+    assert stages["sign"]["p50"] == pytest.approx(0.002, abs=0.002)
+    assert stages["network"]["p50"] == pytest.approx(0.01, abs=0.005)
+    assert stages["ack"]["p50"] < 0.005
+    pipeline.stop()
+
+
+def test_errors_and_callbacks_do_not_block_strategy():
+    pipeline = OrderPipeline(FakeExchange())
+    done = threading.Event()
+    results = []
+    failed = pipeline.create_market_order("XBTUSD", "sell", 0)
+    ok = pipeline.create_market_order("XBTUSD", "sell", 7)
+    ok.add_done_callback(lambda f: (results.append(f.result()["id"]), done.set()))
+    assert done.wait(1)
+    with pytest.raises(ValueError):
+        failed.result()
+    assert results == ["7"] and pipeline.failed == 1
+    pipeline.stop()
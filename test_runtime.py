@@ -0,0 +1,127 @@
+import threading
+import time
+from concurrent.futures import wait
+from executor import Executor, Sink
+from runtime import Runtime
+
+
+class _Scheduler:
+    """Бары вызываются тестом вручную"""
+
+    def __init__(self):
+        self.bars = []
+
+    def subscribe_bars(self, period, callback, clock_offset=None):
+        self.bars.append(callback)
+        return callback
+
+    def subscribe_interval(self, period, callback):
+        return callback
+
+    def unsubscribe(self, sub):
+        if sub in self.bars:
+            self.bars.remove(sub)
+
+
+class _Strategy:
+    TIMEFRAME = "1m"
+    TICK_INTERVAL = None
+    INDICATORS = {}
+
+    def __init__(self, window_length=30, delay=0.0):
+        self.WINDOW_LENGTH = window_length
+        self.state = None
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def handle_data_candle(self, api, data, indicators):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+
+
+class _Sink(Sink):
+    def __init__(self):
+        self.bars = []
+        self.cond = threading.Condition()
+
+    def on_candles(self, data):
+        with self.cond:
+            self.bars.append(data["candles"].last_timestamp)
+            self.cond.notify_all()
+
+    def wait(self, count):
+        with self.cond:
+            assert self.cond.wait_for(lambda: len(self.bars) >= count, 5)
+
+
+def test_shared_series_is_fetched_once_per_bar(fake_exchange):
+    runtime = Runtime(scheduler=_Scheduler())
+    sinks = [_Sink(), _Sink()]
+    executors = [Executor(_Strategy(), fake_exchange, "XBTUSD", sink=sink, runtime=runtime) for sink in sinks]
+    for executor in executors:
+        executor._run()
+    for sink in sinks:
+        sink.wait(1)
+    assert fake_exchange.fetches == 1
+
+    # следующий бар: одна дозагрузка на обе стратегии
+    now = fake_exchange.NOW
+    fake_exchange.rows.append([now * 1000, 50.0, 51.0, 49.0, 50.5, 1.0])
+    assert len(runtime.scheduler.bars) == 1
+    assert runtime.scheduler.bars[0](now + 60)
+    for sink in sinks:
+        sink.wait(2)
+        assert sink.bars == [(now - 60) * 1000, now * 1000]
+    assert fake_exchange.fetches == 2 and runtime.last_bar_requests == 1
+    for executor in executors:
+        executor.stop()
+    runtime.shutdown()
+
+
+def test_deliveries_to_one_executor_are_serialized(fake_exchange):
+    runtime = Runtime(scheduler=_Scheduler())
+    strategy = _Strategy(delay=0.02)
+    sink = _Sink()
+    executor = Executor(strategy, fake_exchange, "XBTUSD", sink=sink, runtime=runtime)
+    executor._run()
+    sink.wait(1)
+    candles = executor.data["candles"].copy()
+    futures = [runtime.pool.submit(runtime._deliver, executor, candles, fake_exchange.NOW, 0) for _ in range(4)]
+    wait(futures)
+    assert len(sink.bars) == 5
+    assert strategy.max_active == 1
+    runtime.shutdown()
+
+
+def test_longer_window_resizes_the_shared_feed(fake_exchange):
+    runtime = Runtime(scheduler=_Scheduler())
+    Executor(_Strategy(30), fake_exchange, "XBTUSD", runtime=runtime)._run()
+    Executor(_Strategy(35), fake_exchange, "XBTUSD", runtime=runtime)._run()
+    (series,) = runtime._series.values()
+    assert series.feed.window_length == 35
+    assert len(series.subscribers) == 2
+    runtime.shutdown()
+
+
+class _FailingStrategy(_Strategy):
+    def handle_data_candle(self, api, data, indicators):
+        raise RuntimeError("boom")
+
+
+def test_strategy_error_is_logged_with_traceback(fake_exchange, caplog):
+    runtime = Runtime(scheduler=_Scheduler())
+    executor = Executor(_FailingStrategy(), fake_exchange, "XBTUSD", runtime=runtime)
+    executor._run()
+    candles = executor.data["candles"].copy()
+    with caplog.at_level("ERROR", logger="runtime"):
+        runtime._deliver(executor, candles, fake_exchange.NOW, 0)
+    records = [r for r in caplog.records if r.name == "runtime"]
+    assert records and all(r.getMessage() == "XBTUSD strategy error" for r in records)
+    assert records[-1].exc_info[0] is RuntimeError
+    runtime.shutdown()
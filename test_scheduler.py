@@ -0,0 +1,83 @@
+import threading
+import time
+import pytest
+from scheduler import BarScheduler
+
+PERIOD = 0.2
+
+
+class _Calls:
+    def __init__(self, result=None, delay=0.0):
+        self.times = []
+        self.result = result
+        self.delay = delay
+        self.cond = threading.Condition()
+
+    def __call__(self, event_time):
+        with self.cond:
+            self.times.append((event_time, time.time()))
+            self.cond.notify_all()
+        time.sleep(self.delay)
+        return self.result(len(self.times)) if self.result else None
+
+    def wait(self, count, timeout=3):
+        with self.cond:
+            assert self.cond.wait_for(lambda: len(self.times) >= count, timeout)
+        return self.times[:count]
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = BarScheduler()
+    scheduler.RETRY_DELAY = 0.02
+    return scheduler
+
+
+def test_bars_fire_on_period_boundaries(scheduler):
+    calls = _Calls()
+    sub = scheduler.subscribe_bars(PERIOD, calls)
+    for event_time, called in calls.wait(3):
+        assert event_time / PERIOD == pytest.approx(round(event_time / PERIOD))
+        assert 0 <= called - event_time < 0.1
+    assert [b[0] - a[0] for a, b in zip(calls.times, calls.times[1:3])] == pytest.approx([PERIOD, PERIOD])
+    scheduler.unsubscribe(sub)
+
+
+def test_not_ready_bar_is_retried_with_the_same_close(scheduler):
+    # первые два вызова - свеча ещё не готова
+    calls = _Calls(result=lambda n: n > 2)
+    sub = scheduler.subscribe_bars(PERIOD, calls)
+    times = calls.wait(3)
+    assert len({event_time for event_time, _ in times}) == 1
+    assert times[2][1] - times[0][1] >= 2 * scheduler.RETRY_DELAY
+    scheduler.unsubscribe(sub)
+
+
+def test_missed_bars_are_skipped(scheduler):
+    calls = _Calls(delay=2.5 * PERIOD)
+    sub = scheduler.subscribe_bars(PERIOD, calls)
+    times = calls.wait(2)
+    assert sub.missed >= 2
+    gap = (times[1][0] - times[0][0]) / PERIOD
+    assert gap >= 3 - 1e-6 and gap == pytest.approx(round(gap))
+    scheduler.unsubscribe(sub)
+
+
+def test_unsubscribe_stops_callbacks(scheduler):
+    calls = _Calls()
+    sub = scheduler.subscribe_bars(PERIOD, calls)
+    calls.wait(1)
+    scheduler.unsubscribe(sub)
+    count = len(calls.times)
+    time.sleep(2 * PERIOD)
+    assert len(calls.times) == count
+
+
+def test_slow_subscriber_does_not_delay_others(scheduler):
+    slow = _Calls(delay=0.5)
+    fast = _Calls()
+    subs = [scheduler.subscribe_bars(PERIOD, slow), scheduler.subscribe_bars(PERIOD, fast)]
+    for event_time, called in fast.wait(2):
+        assert called - event_time < 0.1
+    for sub in subs:
+        scheduler.unsubscribe(sub)